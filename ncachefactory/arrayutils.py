@@ -1,3 +1,4 @@
+from bisect import bisect_left
 
 
 def compute_wedging_values(start_value, end_value, iterations):
@@ -19,20 +20,38 @@ def overlap_arrays_from_ranges(arrays, ranges):
     e.g. array1 = (2, 3, 8), range1 = (2, 4), array2 = (True, 'Lio', False),
     range2 = (1, 3).
     result = array1: (None, 2, 3, 8), array2: (True, 'Lio', False, None)
+    The arrays are placed by slices, the frames aren't iterated.
     """
     msg = "this function has to receive the same number of arrays and ranges"
     assert len(arrays) == len(ranges), msg
     ranges = normalize_ranges(ranges)
-    dicts = []
-    for array, range_ in zip(arrays, ranges):
-        dict_ = {i: p for i, p in zip(range(range_[0], range_[1] + 1), array)}
-        dicts.append(dict_)
-    arrays = [[] for _ in range(len(arrays))]
     range_end = max([r[-1] for r in ranges])
-    for i in range(range_end):
-        for j, array in enumerate(arrays):
-            array.append(dicts[j].get(i))
-    return arrays
+    overlapped = []
+    for array, range_ in zip(arrays, ranges):
+        start = range_[0]
+        count = min(len(array), range_[1] - start + 1)
+        first, last = max(start, 0), min(start + count, range_end)
+        overlapped_array = [None] * range_end
+        if last > first:
+            overlapped_array[first:last] = array[first - start:last - start]
+        overlapped.append(overlapped_array)
+    return overlapped
+
+
+def merge_ranges(ranges):
+    """
+    Return the sorted list of [start, end] intervals containing the frames
+    of the ranges. The overlapping and contiguous ranges are merged.
+    """
+    intervals = []
+    for start, end in sorted((r[0], r[-1]) for r in ranges):
+        if end < start:
+            continue
+        if intervals and start <= intervals[-1][1] + 1:
+            intervals[-1][1] = max(intervals[-1][1], end)
+            continue
+        intervals.append([start, end])
+    return intervals
 
 
 def range_ranges(ranges):
@@ -40,8 +59,10 @@ def range_ranges(ranges):
     Return int array generated starting on the smallest range start to the
     highest range end.
     """
-    ranges = [n for r in ranges for n in range(r[0], r[-1] + 1)]
-    return sorted(list(set(ranges)))
+    frames = []
+    for start, end in merge_ranges(ranges):
+        frames.extend(range(start, end + 1))
+    return frames
 
 
 def normalize_ranges(ranges):
@@ -49,17 +70,28 @@ def normalize_ranges(ranges):
     This function compare several ranges and offset the relative start
     to 0. If the ranges has a gap, for example, range1 finish to 50 and
     range2 start at 65. The gap is removed.
+    The gap before a range is found from the maximum end of the ranges
+    sorted by start.
     """
-    offset = sorted(ranges)[0][0]
+    offset = min(r[0] for r in ranges)
     ranges = [[n - offset for n in r] for r in ranges]
+    order = sorted(range(len(ranges)), key=lambda i: ranges[i][0])
+    starts = [ranges[i][0] for i in order]
+    maximum_ends = []
+    for i in order:
+        end = ranges[i][1]
+        if maximum_ends:
+            end = max(maximum_ends[-1], end)
+        maximum_ends.append(end)
     has_gap = []
     # offset all the range to 0 as reference
     for i, range_ in enumerate(ranges):
-        values = [r[1] for r in ranges if r[0] < range_[0]]
-        if not values:
+        # number of ranges starting before this one
+        count = bisect_left(starts, range_[0])
+        if not count:
             continue
-        if max(values) < range_[0]:
-            offset = range_[0] - max(values)
+        if maximum_ends[count - 1] < range_[0]:
+            offset = range_[0] - maximum_ends[count - 1]
             has_gap.append((offset, i))
     # remove the gap between the ranges
     global_offset = 0
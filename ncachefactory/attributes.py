@@ -2,6 +2,7 @@
 import os
 import json
 from maya import cmds
+import maya.api.OpenMaya as om2
 
 
 DYNAMIC_NODES = 'nCloth', 'hairSystem'
@@ -50,6 +51,7 @@ SUPPORTED_TYPES = (
     u'byte',
     u'double',
     u'double3',
+    u'doubleAngle',
     u'doubleArray',
     u'doubleLinear',
     u'enum',
@@ -64,6 +66,50 @@ SUPPORTED_TYPES = (
     u'string',
     u'time',
     u'vectorArray')
+WEDGABLE_TYPES = u'double', u'float'
+# the attribute types are named like the cmds.getAttr(plug, type=True) result
+NUMERIC_TYPES = {
+    om2.MFnNumericData.kBoolean: u'bool',
+    om2.MFnNumericData.kByte: u'byte',
+    om2.MFnNumericData.kChar: u'char',
+    om2.MFnNumericData.kShort: u'short',
+    om2.MFnNumericData.kInt: u'long',
+    om2.MFnNumericData.kFloat: u'float',
+    om2.MFnNumericData.kDouble: u'double',
+    om2.MFnNumericData.k2Float: u'float2',
+    om2.MFnNumericData.k3Float: u'float3',
+    om2.MFnNumericData.k2Double: u'double2',
+    om2.MFnNumericData.k3Double: u'double3',
+    om2.MFnNumericData.k2Int: u'long2',
+    om2.MFnNumericData.k3Int: u'long3'}
+UNIT_TYPES = {
+    om2.MFnUnitAttribute.kDistance: u'doubleLinear',
+    om2.MFnUnitAttribute.kAngle: u'doubleAngle',
+    om2.MFnUnitAttribute.kTime: u'time'}
+TYPED_TYPES = {
+    om2.MFnData.kString: u'string',
+    om2.MFnData.kMatrix: u'matrix',
+    om2.MFnData.kIntArray: u'Int32Array',
+    om2.MFnData.kDoubleArray: u'doubleArray',
+    om2.MFnData.kVectorArray: u'vectorArray'}
+# the types without reader are read with cmds.getAttr
+PLUG_READERS = {
+    u'bool': lambda plug: plug.asBool(),
+    u'byte': lambda plug: plug.asInt(),
+    u'char': lambda plug: plug.asInt(),
+    u'short': lambda plug: plug.asInt(),
+    u'long': lambda plug: plug.asInt(),
+    u'enum': lambda plug: plug.asInt(),
+    u'float': lambda plug: plug.asFloat(),
+    u'double': lambda plug: plug.asDouble(),
+    u'doubleLinear': lambda plug: plug.asMDistance().asUnits(
+        om2.MDistance.uiUnit()),
+    u'doubleAngle': lambda plug: plug.asMAngle().asUnits(
+        om2.MAngle.uiUnit()),
+    u'time': lambda plug: plug.asMTime().asUnits(om2.MTime.uiUnit()),
+    u'string': lambda plug: plug.asString()}
+# static attributes by node type: {node type: [(name, type)]}
+_node_type_attributes = {}
 
 
 def save_pervertex_maps(nodes=None, directory=''):
@@ -107,48 +153,136 @@ def set_pervertex_maps(nodes=None, directory='', maps=None):
 
 
 def clean_namespaces_in_attributes_dict(attributes):
-    for key in attributes:
+    for key in list(attributes):
         attributes[key.split(":")[-1]] = attributes.pop(key)
     return attributes
 
 
 def apply_attibutes_dict(attributes_dict, blend=1.0):
+    plugs = []
     for key, value in attributes_dict.items():
         # find matching plugs in
         found_attributes = cmds.ls([key, "*" + key, "*:" + key, "*:*:" + key])
-        for attribute in found_attributes:
-            try:
-                if blend != 1:
+        plugs.extend((attribute, value) for attribute in found_attributes)
+    reference_values = {}
+    if blend != 1:
+        # the current values are read with one snapshot by node
+        names_by_node = {}
+        for plug, _ in plugs:
+            node, name = plug.split('.', 1)
+            names_by_node.setdefault(node, []).append(name)
+        for node, names in names_by_node.items():
+            reference_values.update(list_node_attributes_values(node, names))
+    for attribute, value in plugs:
+        try:
+            if blend != 1:
+                reference_value = reference_values.get(attribute)
+                if reference_value is None:
                     reference_value = cmds.getAttr(attribute)
-                    value = (reference_value * (1 - blend)) + (value * blend)
-                cmds.setAttr(attribute, value)
-            except RuntimeError:
-                msg = (
-                    attribute + " is locked, connected, invalid or "
-                    "doesn't in current scene. This attribute is skipped")
-                cmds.warning(msg)
+                value = (reference_value * (1 - blend)) + (value * blend)
+            cmds.setAttr(attribute, value)
+        except RuntimeError:
+            msg = (
+                attribute + " is locked, connected, invalid or "
+                "doesn't in current scene. This attribute is skipped")
+            cmds.warning(msg)
+
+
+def get_attribute_type(attribute):
+    ''' Return the type of an attribute MObject like the getAttr command. '''
+    if attribute.hasFn(om2.MFn.kNumericAttribute):
+        return NUMERIC_TYPES.get(
+            om2.MFnNumericAttribute(attribute).numericType())
+    if attribute.hasFn(om2.MFn.kUnitAttribute):
+        return UNIT_TYPES.get(om2.MFnUnitAttribute(attribute).unitType())
+    if attribute.hasFn(om2.MFn.kEnumAttribute):
+        return u'enum'
+    if attribute.hasFn(om2.MFn.kTypedAttribute):
+        return TYPED_TYPES.get(om2.MFnTypedAttribute(attribute).attrType())
+    if attribute.hasFn(om2.MFn.kMatrixAttribute):
+        return u'matrix'
+    if attribute.hasFn(om2.MFn.kMessageAttribute):
+        return u'message'
+    if attribute.hasFn(om2.MFn.kCompoundAttribute):
+        return u'TdataCompound'
+
+
+def describe_attributes(attributes):
+    ''' Return a list of (name, type) for the attributes MObjects. The multi
+    attributes and their children are skipped, they can't be read without
+    index. '''
+    descriptions = []
+    for attribute in attributes:
+        if attribute.isNull():
+            continue
+        fn = om2.MFnAttribute(attribute)
+        parent = fn.parent
+        in_array = fn.array
+        while not parent.isNull() and not in_array:
+            parent_fn = om2.MFnAttribute(parent)
+            in_array = parent_fn.array
+            parent = parent_fn.parent
+        if in_array:
+            continue
+        descriptions.append((fn.name, get_attribute_type(attribute)))
+    return descriptions
+
 
+def list_node_attributes_types(node):
+    ''' Return a list of (name, type) for the attributes of a node.
+    The static attributes are listed once by node type, only the dynamic
+    attributes are listed on the node. '''
+    dependnode = om2.MSelectionList().add(node).getDependNode(0)
+    fn = om2.MFnDependencyNode(dependnode)
+    node_type = fn.typeName
+    if node_type not in _node_type_attributes:
+        attributes = om2.MNodeClass(node_type).getAttributes()
+        _node_type_attributes[node_type] = describe_attributes(attributes)
+    dynamic_attributes = [
+        fn.attribute(name)
+        for name in cmds.listAttr(node, userDefined=True) or []]
+    return (
+        _node_type_attributes[node_type] +
+        describe_attributes(dynamic_attributes))
+
+
+def list_node_attributes_values(
+        node, attributes_names=None, types=SUPPORTED_TYPES):
+    """ Snapshot the attributes values of a node: {plug: value}. The plugs are
+    read through OpenMaya, the types without reader and the attributes not
+    found are read with cmds.getAttr.
+    attributes_names limits the query to the given attributes, all the
+    attributes of the node are listed by default.
+    """
+    dependnode = om2.MSelectionList().add(node).getDependNode(0)
+    fn = om2.MFnDependencyNode(dependnode)
+    descriptions = list_node_attributes_types(node)
+    if attributes_names is not None:
+        names = set(attributes_names)
+        descriptions = [d for d in descriptions if d[0] in names]
+        # the attributes given by path (e.g. parent.child) aren't listed
+        listed = set(d[0] for d in descriptions)
+        descriptions.extend(
+            (name, None) for name in attributes_names
+            if name not in listed)
 
-def list_node_attributes_values(node):
     attributes = {}
-    for attribute in cmds.listAttr(node):
+    for name, attribute_type in descriptions:
+        if attribute_type is not None and attribute_type not in types:
+            continue
+        plug = node + '.' + name
+        reader = PLUG_READERS.get(attribute_type)
         try:
-            plug = node + '.' + attribute
-            attribute_type = cmds.getAttr(plug, type=True)
-            if attribute_type is None or attribute_type not in SUPPORTED_TYPES:
+            if reader is not None:
+                attributes[plug] = reader(fn.findPlug(name, False))
                 continue
-            value = cmds.getAttr(plug)
-            attributes[plug] = value
-        # RuntimeError is not a numerical attribute
-        except RuntimeError:
-            pass
-        # Value Error is a compount or subattribute
-        except ValueError:
-            pass
-        # TypeError this is a WTF bug which happen sometime in maya. My raise
-        # an error on the getAttr(plug, type=True) which says that True is not
-        # a boolean. Ole !
-        except TypeError:
+            if attribute_type is None:
+                attribute_type = cmds.getAttr(plug, type=True)
+                if attribute_type not in types:
+                    continue
+            attributes[plug] = cmds.getAttr(plug)
+        # RuntimeError is not a readable attribute or a compound
+        except (RuntimeError, ValueError, TypeError):
             pass
     return attributes
 
@@ -159,16 +293,32 @@ def ensure_node_has_ncachemanager_tags(node):
             cmds.addAttr(node, **tag)
 
 
+def has_ncachemanager_tag(node, tag):
+    return cmds.attributeQuery(tag, node=node, exists=True)
+
+
+def is_filtered_for_manager(node):
+    ''' The nodes are tagged when they are cached, a node without tag is
+    not filtered. '''
+    if not has_ncachemanager_tag(node, FILTERED_FOR_NCACHEMANAGER):
+        return False
+    return bool(cmds.getAttr(node + '.' + FILTERED_FOR_NCACHEMANAGER))
+
+
+def list_filtered_nodes_for_manager():
+    ''' Return the nodes filtered for the manager. Only the tagged nodes are
+    queried. '''
+    pattern = '*.' + FILTERED_FOR_NCACHEMANAGER
+    nodes = cmds.ls(pattern, recursive=True, objectsOnly=True) or []
+    return [
+        node for node in nodes
+        if cmds.getAttr(node + '.' + FILTERED_FOR_NCACHEMANAGER)]
+
+
 def list_wedgable_attributes(node):
-    attributes = []
-    for attribute in cmds.listAttr(node):
-        plug = node + "." + attribute
-        if plug.count(".") > 1:
-            continue
-        if cmds.getAttr(plug, type=True) not in ["double", "float", "int"]:
-            continue
-        attributes.append(attribute)
-    return sorted(attributes)
+    return sorted(
+        name for name, attribute_type in list_node_attributes_types(node)
+        if attribute_type in WEDGABLE_TYPES)
 
 
 def filter_invisible_nodes_for_manager(nodes):
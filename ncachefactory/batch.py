@@ -1,12 +1,22 @@
 import os
-import subprocess
+import json
 import shutil
 import sys
+import itertools
 
 from maya import cmds
+from ncachefactory.attributes import filter_invisible_nodes_for_manager
 from ncachefactory.environment import get_environment
+from ncachefactory.executors import get_executor
+from ncachefactory.farm import (
+    build_job_description, write_job_description, read_job_description,
+    clean_job_status)
+from ncachefactory.mesh import bake_mesh_to_geo_cache, attach_geo_cache
+from ncachefactory.ncache import DYNAMIC_NODES
 from ncachefactory.optionvars import MAYAPY_PATH_OPTIONVAR
-from ncachefactory.versioning import create_cacheversion
+from ncachefactory.scenestore import (
+    store_scene, link_scene, is_stored_scene, BAKED_INPUTS_SUFFIX)
+from ncachefactory.versioning import create_cacheversion, CacheVersion
 
 
 _CURRENTDIR = os.path.dirname(os.path.realpath(__file__))
@@ -15,61 +25,322 @@ _SCRIPT_FILEPATH = os.path.join(_CURRENTDIR, '..', 'script', _SCRIPT_FILENAME)
 
 BATCHCACHE_NAME = 'batch cache'
 WEDGINGCACHE_NAME = 'wedging cache'
-NCACHESCENE_FILENAME = 'scene.ma'
+NCACHESCENE_FILENAME = 'scene{}'
 TEMPFOLDER_NAME = 'on_queue_scenes'
+# storage formats of the companion caches written by the batch jobs
+BATCH_STORAGE_FORMATS = 'none', 'mcz', 'mcd'
+NO_STORAGE_FORMAT = 'none'
 WEDGINGFOLDER_NAME = 'wedging_scenes'
-BATCHSCENE_NAME = 'batch_scene_{}.ma'
-WEDGINGSCENE_NAME = 'scene_{}.ma'
+BATCHSCENE_NAME = 'batch_scene_{}'
+WEDGINGSCENE_NAME = 'scene_{}'
+SCENE_EXTENSIONS = {'mayaAscii': '.ma', 'mayaBinary': '.mb'}
+BAKED_INPUTS_FILENAME = 'baked_inputs.json'
+SNAPSHOT_EXCLUDED_TYPES = 'time',
+# history node types making a mesh change over time. The anim curves driven
+# by another attribute (animCurveU*) are animated only if their driver is.
+TIME_DEPENDENT_TYPES = (
+    'animCurveTL', 'animCurveTA', 'animCurveTU', 'animCurveTT', 'time',
+    'cacheFile', 'AlembicNode')
+SOLVER_GROUP_SUFFIX = '_solvers{}'
+# node types which make two nucleus dependent if they share them
+SOLVER_MEMBER_TYPES = (
+    'nCloth', 'hairSystem', 'nRigid', 'dynamicConstraint', 'nParticle')
 WEDGING_COMMENT_TEMPLATE = """\
 Wedging Cache:
   attribute {}
   value {}"""
+# This dict keep the last scenes saved for batch per current scene state to
+# avoid to save again a scene which didn't change since the last job sent.
+# {(scene name, scene mtime, snapshot, bake_inputs, frame_range):
+#     scene saved for batch}
+_saved_scenes = {}
 
 
-def build_unique_scene_name(workspace, scenename_template, foldername):
+def build_unique_scene_name(
+        workspace, scenename_template, foldername, extension='.ma'):
     i = 0
-    name = scenename_template.format(str(i).zfill(2))
+    name = scenename_template.format(str(i).zfill(2)) + extension
     while os.path.exists(os.path.join(workspace, foldername, name)):
         i += 1
-        name = scenename_template.format(str(i).zfill(2))
+        name = scenename_template.format(str(i).zfill(2)) + extension
     return name
 
 
-def save_scene_for_batch(workspace, scenename, folder):
-    currentname = cmds.file(query=True, sceneName=True)
-    name = build_unique_scene_name(workspace, scenename, folder)
+def save_scene_for_batch(
+        workspace, scenename, folder, snapshot=False, bake_inputs=False,
+        frame_range=None):
+    ''' Save the scene which will be opened by the batch job. If snapshot is
+    True, only the dynamic network is exported in mayaBinary instead of the
+    full scene in mayaAscii. The scene is way faster to write and to open in
+    mayapy. bake_inputs and frame_range are only used with snapshot, see
+    export_scene_snapshot_for_batch for details.
+    If the current scene isn't modified since a previous save already moved
+    in the scene store, the stored scene is returned and nothing is saved.
+    '''
+    # the baked inputs are only valid for the frame range baked
+    frame_range = tuple(frame_range) if bake_inputs and frame_range else None
+    key = get_current_scene_state() + (snapshot, bake_inputs, frame_range)
+    saved_scene = _saved_scenes.get(key)
+    modified = cmds.file(query=True, modified=True)
+    if not modified and saved_scene and is_stored_scene(saved_scene):
+        if os.path.exists(saved_scene):
+            return saved_scene
+    filetype = 'mayaBinary' if snapshot is True else 'mayaAscii'
+    extension = SCENE_EXTENSIONS[filetype]
+    name = build_unique_scene_name(workspace, scenename, folder, extension)
     folder = os.path.join(workspace, folder)
     filename = os.path.join(folder, name)
     if not os.path.exists(folder):
         os.makedirs(folder)
-    cmds.file(rename=filename)
-    cmds.file(save=True, type="mayaAscii")
-    cmds.file(rename=currentname)
+    if snapshot is True:
+        nodes = filter_invisible_nodes_for_manager(cmds.ls(type=DYNAMIC_NODES))
+        export_scene_snapshot_for_batch(
+            filename, nodes, bake_inputs, frame_range)
+    else:
+        currentname = cmds.file(query=True, sceneName=True)
+        cmds.file(rename=filename)
+        cmds.file(save=True, type=filetype)
+        cmds.file(rename=currentname)
+    # the export modify the scene (selection, bake), the state is only
+    # registered if the scene is clean after the save.
+    if not cmds.file(query=True, modified=True):
+        key = get_current_scene_state() + (snapshot, bake_inputs, frame_range)
+        _saved_scenes[key] = filename
+    return filename
+
+
+def get_current_scene_state():
+    ''' Return the current scene name and the modification time of his file.
+    The time change if the user save the scene himself.
+    '''
+    scenename = cmds.file(query=True, sceneName=True)
+    if not scenename or not os.path.exists(scenename):
+        return scenename, None
+    return scenename, os.path.getmtime(scenename)
+
+
+def store_batch_scene(workspace, scene):
+    ''' Move the scene saved for batch into the workspace scene store and
+    return the stored scene path. See scenestore module.
+    '''
+    stored = store_scene(workspace, scene)
+    for key, value in _saved_scenes.items():
+        if value == scene:
+            _saved_scenes[key] = stored
+    return stored
+
+
+def flash_current_scene(
+        workspace, snapshot=False, bake_inputs=False, frame_range=None):
+    return save_scene_for_batch(
+        workspace, BATCHSCENE_NAME, TEMPFOLDER_NAME, snapshot=snapshot,
+        bake_inputs=bake_inputs, frame_range=frame_range)
+
+
+def export_scene_snapshot_for_batch(
+        filename, nodes, bake_inputs=False, frame_range=None):
+    ''' This function export in mayaBinary only what is needed to simulate
+    the given dynamic nodes: the nucleus, colliders, constraints, inputs and
+    all their upstream history (deformers, rigs, animation).
+    If bake_inputs is True, the animated input meshes are cached as geometry
+    cache on the frame_range (start, end) of the job before the export.
+    Their upstream history is not exported anymore and the batch job attach
+    the geometry caches after the scene opening (see attach_baked_inputs).
+    '''
+    selection = cmds.ls(selection=True)
+    baked_meshes = []
+    if bake_inputs is True:
+        directory = get_baked_inputs_directory(filename)
+        baked_meshes = bake_animated_input_meshes(
+            nodes, directory, frame_range)
+    snapshot_nodes = list_nodes_for_scene_snapshot(nodes, baked_meshes)
+    cmds.select(snapshot_nodes, noExpand=True, replace=True)
+    cmds.file(
+        filename, exportSelected=True, type='mayaBinary', force=True,
+        constructionHistory=False, channels=True, constraints=True,
+        expressions=True, shader=True, preserveReferences=False)
+    cmds.select(selection, replace=True)
     return filename
 
 
-def flash_current_scene(workspace):
-    return save_scene_for_batch(workspace, BATCHSCENE_NAME, TEMPFOLDER_NAME)
+def list_nodes_for_scene_snapshot(nodes, baked_meshes=None):
+    ''' List the dynamic nodes, their nucleus, all nodes plugged to those
+    nucleus (colliders, constraints, fields), the outputs geometries, the
+    cameras and the upstream history of all of them. The history of the
+    baked_meshes is skipped, those meshes are driven by geometry cache.
+    '''
+    baked_meshes = cmds.ls(baked_meshes or [], long=True)
+    nodes = cmds.ls(nodes, long=True)
+    solvers = cmds.ls(cmds.listConnections(nodes, type='nucleus') or [])
+    roots = set(nodes + cmds.ls(solvers, long=True))
+    roots.update(cmds.ls(
+        cmds.listConnections(solvers, shapes=True) or [], long=True))
+    # outputs are needed to connect caches and playblast the simulation
+    roots.update(cmds.ls(
+        cmds.listHistory(nodes, future=True, levels=2) or [],
+        type=('mesh', 'nurbsCurve', 'follicle'), long=True))
+    cameras = [
+        camera for camera in cmds.ls(type='camera', long=True)
+        if not cmds.camera(camera, query=True, startupCamera=True)]
+    roots.update(cameras)
+
+    snapshot_nodes = set()
+    to_process = list(roots)
+    while to_process:
+        node = to_process.pop()
+        if node in snapshot_nodes:
+            continue
+        snapshot_nodes.add(node)
+        if node in baked_meshes:
+            history = []
+        else:
+            history = cmds.ls(cmds.listHistory(node) or [], long=True)
+        # the dag parents aren't part of the dg history but the world space
+        # inputs depend on their animations and constraints.
+        parents = list_dag_ancestors(node)
+        to_process.extend(
+            n for n in history + parents if n not in snapshot_nodes)
+
+    default_nodes = set(cmds.ls(defaultNodes=True, long=True))
+    return sorted(
+        node for node in snapshot_nodes
+        if node not in default_nodes and
+        cmds.nodeType(node) not in SNAPSHOT_EXCLUDED_TYPES)
+
+
+def list_dag_ancestors(node):
+    if not cmds.ls(node, dag=True):
+        return []
+    fullpath = cmds.ls(node, long=True)[0]
+    names = fullpath.split('|')
+    return ['|'.join(names[:i]) for i in range(2, len(names))]
+
+
+def is_mesh_deformation_animated(mesh):
+    ''' Return True if the mesh history contains anim curves or time
+    dependent nodes. A static construction history doesn't need a bake and
+    the animation of the dag parents is kept by the snapshot. '''
+    history = cmds.listHistory(mesh) or []
+    return bool(cmds.ls(history, type=TIME_DEPENDENT_TYPES))
+
+
+def bake_animated_input_meshes(nodes, directory, frame_range=None):
+    ''' This function write a geometry cache for every input meshes of
+    the given nCloth which has an animated deformation. The frame_range
+    (start, end) must cover the jobs range, the animation range is used by
+    default. The nucleus are disabled during the bake to avoid to simulate
+    for nothing. A json containing the baked meshes and their cache
+    description is saved in the directory and the baked meshes are returned.
+    '''
+    meshes = []
+    for node in cmds.ls(nodes, type='nCloth'):
+        inputs = cmds.listConnections(
+            node + '.inputMesh', shapes=True, type='mesh') or []
+        meshes.extend(
+            mesh for mesh in inputs if is_mesh_deformation_animated(mesh))
+    meshes = sorted(set(meshes))
+    if not meshes:
+        return []
+
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    solvers = cmds.ls(type='nucleus')
+    states = {n: cmds.getAttr(n + '.enable') for n in solvers}
+    for solver in solvers:
+        cmds.setAttr(solver + '.enable', False)
+    currenttime = cmds.currentTime(query=True)
+    if frame_range is None:
+        frame_range = (
+            cmds.playbackOptions(query=True, animationStartTime=True),
+            cmds.playbackOptions(query=True, animationEndTime=True))
+    start_frame, end_frame = frame_range
+    baked_inputs = {}
+    try:
+        for mesh in meshes:
+            xml_file = bake_mesh_to_geo_cache(
+                mesh, directory, start_frame, end_frame)
+            baked_inputs[mesh] = os.path.basename(xml_file)
+    finally:
+        for solver, state in states.items():
+            cmds.setAttr(solver + '.enable', state)
+        cmds.currentTime(currenttime, edit=True)
+
+    filename = os.path.join(directory, BAKED_INPUTS_FILENAME)
+    with open(filename, 'w') as f:
+        json.dump(baked_inputs, f, indent=2, sort_keys=True)
+    return meshes
+
+
+def get_baked_inputs_directory(scene):
+    return os.path.splitext(scene)[0] + BAKED_INPUTS_SUFFIX
+
+
+def attach_baked_inputs(scene):
+    ''' This function is made to be called in the batch job after the scene
+    opening. It attach the geometry caches baked by the
+    export_scene_snapshot_for_batch, if there's some.
+    '''
+    directory = get_baked_inputs_directory(scene)
+    filename = os.path.join(directory, BAKED_INPUTS_FILENAME)
+    if not os.path.exists(filename):
+        return []
+    with open(filename, 'r') as f:
+        baked_inputs = json.load(f)
+    for mesh, xml_file in baked_inputs.items():
+        attach_geo_cache(mesh, os.path.join(directory, xml_file))
+    return sorted(baked_inputs)
+
+
+def remove_scene(scene):
+    ''' Remove a scene saved for batch and his baked inputs if exists. The
+    stored scenes are shared by cacheversions and never removed.
+    '''
+    if is_stored_scene(scene):
+        return
+    os.remove(scene)
+    inputs = get_baked_inputs_directory(scene)
+    if os.path.exists(inputs):
+        shutil.rmtree(inputs)
 
 
 def send_batch_ncache_jobs(
         workspace, jobs, start_frame, end_frame, nodes, evaluate_every_frame,
         save_every_evaluation, playblast_viewport_options, timelimit,
-        stretchmax):
+        stretchmax, checkpoint_interval=0, split_solvers=False,
+        storage_format=None):
     ''' this function precreate the python script and the folder where will
     be cached the giver jobs. A job is a dict containing tree key:
     {'name': str, 'comment': str, 'scene': str}
+    and the frame_range (start, end) of his baked inputs if he has some.
+    Return a list of tuple (cacheversion, process), the processes are the
+    executor jobs (see executors module). If split_solvers is True, the
+    independent nucleus of every scene are cached in parallel jobs (see
+    list_independent_solver_groups), a cacheversion has a process by group.
+    If a storage_format is given, the jobs write a compressed companion cache
+    after the record (see cachemanager.STORAGE_FORMATS).
     '''
     processes = []
-    cacheversions = []
     # build the arguments list. The two None values are differents for every
     # job and will be redefine during the loop
     arguments = build_batch_script_arguments(
         start_frame, end_frame, nodes, evaluate_every_frame,
         save_every_evaluation, playblast_viewport_options, timelimit,
-        stretchmax)
+        stretchmax, checkpoint_interval=checkpoint_interval,
+        storage_format=storage_format)
     environment = get_environment()
+    executor = get_executor()
+    groups = [nodes]
+    if split_solvers is True:
+        groups = list_independent_solver_groups(nodes)
+    # the same scene can be used by several jobs
+    stored_scenes = {}
     for job in jobs:
+        frame_range = job.get('frame_range')
+        if frame_range and (
+                frame_range[0] > start_frame or frame_range[1] < end_frame):
+            cmds.warning(
+                'the inputs of {} are baked from {} to {}, they don\'t '
+                'cover the cache range'.format(job['scene'], *frame_range))
         cacheversion = create_cacheversion(
             workspace=workspace,
             name=job['name'],
@@ -77,35 +348,48 @@ def send_batch_ncache_jobs(
             nodes=nodes,
             start_frame=start_frame,
             end_frame=end_frame)
-        cacheversions.append(cacheversion)
-        scene = os.path.join(cacheversion.directory, NCACHESCENE_FILENAME)
-        os.rename(job['scene'], scene)
+        extension = os.path.splitext(job['scene'])[-1]
+        filename = NCACHESCENE_FILENAME.format(extension)
+        if job['scene'] not in stored_scenes:
+            stored = store_batch_scene(workspace, job['scene'])
+            stored_scenes[job['scene']] = stored
+        destination = os.path.join(cacheversion.directory, filename)
+        scene = link_scene(stored_scenes[job['scene']], destination)
         cacheversion.set_scene(scene)
         # replace the two arguments which are different for each jobs
         arguments[2] = cacheversion.directory
         arguments[3] = scene
-        process = subprocess.Popen(
-            arguments,
-            bufsize=-1,
-            env=environment)
-        processes.append(process)
+        processes.extend(
+            (cacheversion, process) for process in submit_cacheversion_jobs(
+                executor, cacheversion.directory, arguments, environment,
+                groups))
 
     clean_batch_temp_folder(workspace)
-    return cacheversions, processes
+    return processes
 
 
 def send_wedging_ncaches_jobs(
         workspace, name, start_frame, end_frame, nodes, evaluate_every_frame,
         save_every_evaluation, playblast_viewport_options, timelimit,
-        stretchmax, attribute, values):
+        stretchmax, attribute, values, snapshot=False, bake_inputs=False,
+        checkpoint_interval=0, split_solvers=False, storage_format=None):
     ''' this function send on a maya batch multiple cache based on a wedging
     attribute test. An attribute is specified and a list of values. The
     launch one maya per value to process to create a cache version.
+    Return a list of tuple (cacheversion, process), see send_batch_ncache_jobs
     '''
     processes = []
-    cacheversions = []
     environment = get_environment()
-    scene = save_scene_for_batch(workspace, WEDGINGSCENE_NAME, WEDGINGFOLDER_NAME)
+    executor = get_executor()
+    groups = [nodes]
+    if split_solvers is True:
+        groups = list_independent_solver_groups(nodes)
+    scene = save_scene_for_batch(
+        workspace, WEDGINGSCENE_NAME, WEDGINGFOLDER_NAME, snapshot=snapshot,
+        bake_inputs=bake_inputs, frame_range=(start_frame, end_frame))
+    stored = store_batch_scene(workspace, scene)
+    extension = os.path.splitext(stored)[-1]
+    filename = NCACHESCENE_FILENAME.format(extension)
     for value in values:
         comment = WEDGING_COMMENT_TEMPLATE.format(attribute, value)
         cacheversion = create_cacheversion(
@@ -114,28 +398,125 @@ def send_wedging_ncaches_jobs(
             comment=comment,
             nodes=nodes,
             start_frame=start_frame,
-            end_frame=end_frame,
-            scene=scene)
-        cacheversions.append(cacheversion)
+            end_frame=end_frame)
+        destination = os.path.join(cacheversion.directory, filename)
+        scene = link_scene(stored, destination)
+        cacheversion.set_scene(scene)
         arguments = build_batch_script_arguments(
             start_frame, end_frame, nodes, evaluate_every_frame,
             save_every_evaluation, playblast_viewport_options,
             timelimit, stretchmax, attribute_override_name=attribute,
             attribute_override_value=value, scene=scene,
-            directory=cacheversion.directory)
-        process = subprocess.Popen(
-            arguments,
-            env=environment,
-            bufsize=-1)
-        processes.append(process)
-    return cacheversions, processes
+            directory=cacheversion.directory,
+            checkpoint_interval=checkpoint_interval,
+            storage_format=storage_format)
+        processes.extend(
+            (cacheversion, process) for process in submit_cacheversion_jobs(
+                executor, cacheversion.directory, arguments, environment,
+                groups))
+    return processes
+
+
+def submit_cacheversion_jobs(
+        executor, directory, arguments, environment, groups):
+    ''' Submit one job per nodes group, all writing in the same cacheversion
+    directory. When there's several groups, every job receive his group
+    index and suffix his infos, status and description files.
+    The job descriptions are written to allow the resume of the jobs.
+    '''
+    processes = []
+    for index, nodes in enumerate(groups):
+        # the arguments are copied, a queued job is launched later
+        arguments = list(arguments)
+        # replace the nodes and solver group arguments
+        arguments[4] = ', '.join(nodes)
+        arguments[-1] = str(index if len(groups) > 1 else -1)
+        suffix = get_solver_group_suffix(int(arguments[-1]))
+        description = build_job_description(
+            directory, arguments, environment, suffix=suffix)
+        write_job_description(directory, description)
+        processes.append(executor.submit(
+            arguments, environment, directory=directory, suffix=suffix))
+    return processes
+
+
+def get_solver_group_suffix(solver_group):
+    if solver_group < 0:
+        return ''
+    return SOLVER_GROUP_SUFFIX.format(str(solver_group).zfill(2))
+
+
+def list_independent_solver_groups(nodes):
+    ''' Split the dynamic nodes by groups which can be simulated in separated
+    processes. Two nucleus are dependent if they share a dynamic node, a
+    collider or a constraint, or if the history of one of their nodes contains
+    a node of the other one (e.g. a collider deformed by a cloth output).
+    The dependent nucleus are merged with an union find.
+    '''
+    nodes = cmds.ls(nodes)
+    solvers = sorted(set(cmds.ls(
+        cmds.listConnections(nodes, type='nucleus') or [])))
+    members = {}
+    histories = {}
+    for solver in solvers:
+        connections = cmds.listConnections(solver, shapes=True) or []
+        members[solver] = set(
+            cmds.ls(connections, type=SOLVER_MEMBER_TYPES, long=True))
+        history = cmds.listHistory(list(members[solver])) or []
+        histories[solver] = set(cmds.ls(history, long=True))
+
+    parents = {solver: solver for solver in solvers}
+
+    def find(solver):
+        while parents[solver] != solver:
+            solver = parents[solver]
+        return solver
+
+    for solver1, solver2 in itertools.combinations(solvers, 2):
+        dependencies = members[solver1] & (
+            members[solver2] | histories[solver2])
+        dependencies |= members[solver2] & histories[solver1]
+        if dependencies:
+            parents[find(solver1)] = find(solver2)
+
+    groups = {}
+    for node in nodes:
+        node_solvers = cmds.listConnections(node, type='nucleus') or []
+        key = find(node_solvers[0]) if node_solvers else node
+        groups.setdefault(key, []).append(node)
+    return sorted(groups.values())
+
+
+def is_batch_job_resumable(cacheversion, suffix=''):
+    ''' A batch job can be resumed if it saved a checkpoint before the end of
+    his range. The infos are read from the disk, the batch process update them
+    during the cache.
+    '''
+    if read_job_description(cacheversion.directory, suffix) is None:
+        return False
+    infos = CacheVersion(cacheversion.directory, partial_suffix=suffix).infos
+    checkpoint = infos.get('checkpoint')
+    return checkpoint is not None and checkpoint < infos['end_frame']
+
+
+def resume_batch_job(cacheversion, suffix=''):
+    ''' Submit again the job which recorded the given cacheversion. The batch
+    script resume the cache from the last checkpoint saved.
+    '''
+    description = read_job_description(cacheversion.directory, suffix)
+    clean_job_status(cacheversion.directory, suffix)
+    return get_executor().submit(
+        description['command'], description['environment'],
+        directory=cacheversion.directory, suffix=suffix,
+        dependencies=description.get('dependencies'))
 
 
 def build_batch_script_arguments(
         start_frame, end_frame, nodes, evaluate_every_frame,
         save_every_evaluation, playblast_viewport_options, timelimit,
         stretchmax, scene=None, directory=None, attribute_override_name="",
-        attribute_override_value=0.0):
+        attribute_override_value=0.0, checkpoint_interval=0,
+        storage_format=None, solver_group=-1):
     arguments = []
     # mayapy executable
     arguments.append(cmds.optionVar(query=MAYAPY_PATH_OPTIONVAR))
@@ -172,12 +553,21 @@ def build_batch_script_arguments(
     arguments.append(attribute_override_name)
     # Attribute overide value
     arguments.append(str(attribute_override_value))
+    # Checkpoint interval
+    arguments.append(str(checkpoint_interval))
+    # Companion cache storage format
+    arguments.append(storage_format or NO_STORAGE_FORMAT)
+    # Solver group, must stay the last argument (see submit_cacheversion_jobs)
+    arguments.append(str(solver_group))
 
     return arguments
 
 
 def clean_batch_temp_folder(workspace):
-    shutil.rmtree(os.path.join(workspace, TEMPFOLDER_NAME))
+    tempfolder = os.path.join(workspace, TEMPFOLDER_NAME)
+    # jobs using an already stored scene doesn't create the temp folder
+    if os.path.exists(tempfolder):
+        shutil.rmtree(tempfolder)
 
 
 def is_temp_folder_empty(workspace):
@@ -190,4 +580,4 @@ def list_temp_multi_scenes(workspace):
     return [
         os.path.join(tempfolder, scene)
         for scene in os.listdir(tempfolder)
-        if scene.endswith('.ma')]
+        if scene.endswith(tuple(SCENE_EXTENSIONS.values()))]
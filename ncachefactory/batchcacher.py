@@ -1,5 +1,4 @@
 
-import os
 from functools import partial
 
 from PySide2 import QtWidgets, QtCore, QtGui
@@ -10,10 +9,14 @@ from ncachefactory.attributes import (
     list_wedgable_attributes, list_channelbox_highlited_plugs)
 from ncachefactory.batch import (
     clean_batch_temp_folder, flash_current_scene, list_temp_multi_scenes,
-    is_temp_folder_empty, BATCHCACHE_NAME, WEDGINGCACHE_NAME)
+    is_temp_folder_empty, remove_scene, BATCHCACHE_NAME, WEDGINGCACHE_NAME,
+    BATCH_STORAGE_FORMATS, NO_STORAGE_FORMAT)
 from ncachefactory.optionvars import (
     EXPLOSION_TOLERENCE_OPTIONVAR, EXPLOSION_DETECTION_OPTIONVAR,
-    TIMELIMIT_ENABLED_OPTIONVAR, TIMELIMIT_OPTIONVAR, ensure_optionvars_exists)
+    TIMELIMIT_ENABLED_OPTIONVAR, TIMELIMIT_OPTIONVAR,
+    BATCH_SNAPSHOT_OPTIONVAR, BATCH_BAKE_INPUTS_OPTIONVAR,
+    BATCH_CHECKPOINT_INTERVAL_OPTIONVAR, BATCH_SPLIT_SOLVERS_OPTIONVAR,
+    BATCH_STORAGE_FORMAT_OPTIONVAR, ensure_optionvars_exists)
 from ncachefactory.arrayutils import compute_wedging_values
 
 
@@ -29,8 +32,11 @@ class BatchCacher(QtWidgets.QWidget):
 
     def __init__(self, parent=None):
         super(BatchCacher, self).__init__(parent)
-        self.setFixedHeight(350)
+        self.setFixedHeight(460)
         self.workspace = None
+        # function returning the cache frame range, the inputs are baked on
+        # this range when the scene is flashed
+        self.frame_range_getter = None
         self.selection_model = None
         self.model = MultiCacheTableModel()
         self.table = MultiCacheTableView()
@@ -124,6 +130,12 @@ class BatchCacher(QtWidgets.QWidget):
         self.tabwidget.addTab(self.multicache, "Multi scenes")
         self.tabwidget.addTab(self.wedging, "Attribute wedging")
 
+        self.scene_options = SceneExportOptions()
+        self.scene_options_layout = QtWidgets.QHBoxLayout()
+        self.scene_options_layout.addWidget(self.scene_options)
+        self.scene_group = QtWidgets.QGroupBox('Batch scene options')
+        self.scene_group.setLayout(self.scene_options_layout)
+
         self.options = SimulationKillerOptions()
         self.options_layout = QtWidgets.QHBoxLayout()
         self.options_layout.addWidget(self.options)
@@ -132,6 +144,7 @@ class BatchCacher(QtWidgets.QWidget):
 
         self.layout = QtWidgets.QVBoxLayout(self)
         self.layout.addWidget(self.tabwidget)
+        self.layout.addWidget(self.scene_group)
         self.layout.addWidget(self.killer_group)
 
     def set_workspace(self, workspace):
@@ -149,6 +162,9 @@ class BatchCacher(QtWidgets.QWidget):
         self.cache_all.setEnabled(bool(self.model.jobs))
         self.cache_selection.setEnabled(bool(self.model.jobs))
 
+    def list_queued_scenes(self):
+        return [job['scene'] for job in self.model.jobs]
+
     def clear(self):
         self.model.clear_jobs()
         self.cache_all.setEnabled(False)
@@ -185,15 +201,25 @@ class BatchCacher(QtWidgets.QWidget):
             return
         for job in jobs:
             self.model.remove_job(job)
-            os.remove(job['scene'])
+            remove_scene(job['scene'])
         self.cache_all.setEnabled(bool(self.model.jobs))
         self.cache_selection.setEnabled(bool(self.model.jobs))
 
     def _call_flash_scene(self):
         if self.workspace is None:
             return
-        scene = flash_current_scene(self.workspace)
+        frame_range = None
+        if self.frame_range_getter is not None:
+            frame_range = self.frame_range_getter()
+        bake_inputs = self.scene_options.bake_inputs
+        scene = flash_current_scene(
+            self.workspace,
+            snapshot=self.scene_options.snapshot,
+            bake_inputs=bake_inputs,
+            frame_range=frame_range)
         job = {'name': BATCHCACHE_NAME, 'comment': '', 'scene': scene}
+        if bake_inputs:
+            job['frame_range'] = frame_range
         self.model.add_job(job)
         self.cache_all.setEnabled(bool(self.model.jobs))
         self.cache_selection.setEnabled(bool(self.model.jobs))
@@ -349,6 +375,105 @@ def get_clean_tempfile_confirmation_dialog():
     return result == QtWidgets.QMessageBox.Yes
 
 
+class SceneExportOptions(QtWidgets.QWidget):
+    def __init__(self, parent=None):
+        super(SceneExportOptions, self).__init__(parent)
+        text = 'export dynamic network only (mayaBinary)'
+        self._snapshot = QtWidgets.QCheckBox(text)
+        self._snapshot.setToolTip(
+            'Export only the nucleus, dynamic nodes, inputs, colliders and '
+            'their history instead of saving the whole scene')
+        self._bake_inputs = QtWidgets.QCheckBox('pre-bake animated inputs')
+        self._bake_inputs.setToolTip(
+            'Cache the deformed input meshes as geometry cache and skip '
+            'their rig in the exported scene')
+        text = 'cache independent solvers in parallel jobs'
+        self._split_solvers = QtWidgets.QCheckBox(text)
+        self._split_solvers.setToolTip(
+            'Nucleus which don\'t share any node are cached by separated '
+            'processes writing in the same cache version')
+        self._checkpoint_interval = QtWidgets.QSpinBox()
+        self._checkpoint_interval.setMaximum(10000)
+        self._checkpoint_interval.setSpecialValueText('disabled')
+        self._checkpoint_interval.setSuffix(' frames')
+        self._checkpoint_interval.setToolTip(
+            'Flush the cache and save a checkpoint every n frames.\n'
+            'A job which dies can be resumed from his last checkpoint.')
+        self._storage_format = QtWidgets.QComboBox()
+        self._storage_format.addItems(BATCH_STORAGE_FORMATS)
+        self._storage_format.setToolTip(
+            'Compressed companion cache written after the record.\n'
+            'mcz: positions quantized on 16 bits, for the previews.\n'
+            'mcd: lossless deltas, for the long caches.')
+
+        self.layout = QtWidgets.QFormLayout(self)
+        self.layout.setSpacing(0)
+        self.layout.addRow("Scene:", self._snapshot)
+        self.layout.addRow("", self._bake_inputs)
+        self.layout.addRow("Solvers:", self._split_solvers)
+        self.layout.addRow("Checkpoint:", self._checkpoint_interval)
+        self.layout.addRow("Companion cache:", self._storage_format)
+
+        self.set_optionvars()
+        self.update_ui_states()
+        self._snapshot.stateChanged.connect(self.save_optionvars)
+        self._snapshot.stateChanged.connect(self.update_ui_states)
+        self._bake_inputs.stateChanged.connect(self.save_optionvars)
+        self._split_solvers.stateChanged.connect(self.save_optionvars)
+        method = self.save_optionvars
+        self._checkpoint_interval.valueChanged.connect(method)
+        self._storage_format.currentIndexChanged.connect(method)
+
+    def update_ui_states(self, *signals_args):
+        self._bake_inputs.setEnabled(self._snapshot.isChecked())
+
+    def set_optionvars(self):
+        ensure_optionvars_exists()
+        value = cmds.optionVar(query=BATCH_SNAPSHOT_OPTIONVAR)
+        self._snapshot.setChecked(value)
+        value = cmds.optionVar(query=BATCH_BAKE_INPUTS_OPTIONVAR)
+        self._bake_inputs.setChecked(value)
+        value = cmds.optionVar(query=BATCH_SPLIT_SOLVERS_OPTIONVAR)
+        self._split_solvers.setChecked(value)
+        value = cmds.optionVar(query=BATCH_CHECKPOINT_INTERVAL_OPTIONVAR)
+        self._checkpoint_interval.setValue(value)
+        value = cmds.optionVar(query=BATCH_STORAGE_FORMAT_OPTIONVAR)
+        self._storage_format.setCurrentIndex(value)
+
+    def save_optionvars(self, *signals_args):
+        value = self._snapshot.isChecked()
+        cmds.optionVar(intValue=[BATCH_SNAPSHOT_OPTIONVAR, value])
+        value = self._bake_inputs.isChecked()
+        cmds.optionVar(intValue=[BATCH_BAKE_INPUTS_OPTIONVAR, value])
+        value = self._split_solvers.isChecked()
+        cmds.optionVar(intValue=[BATCH_SPLIT_SOLVERS_OPTIONVAR, value])
+        value = self._checkpoint_interval.value()
+        cmds.optionVar(intValue=[BATCH_CHECKPOINT_INTERVAL_OPTIONVAR, value])
+        value = self._storage_format.currentIndex()
+        cmds.optionVar(intValue=[BATCH_STORAGE_FORMAT_OPTIONVAR, value])
+
+    @property
+    def snapshot(self):
+        return self._snapshot.isChecked()
+
+    @property
+    def bake_inputs(self):
+        return self._snapshot.isChecked() and self._bake_inputs.isChecked()
+
+    @property
+    def split_solvers(self):
+        return self._split_solvers.isChecked()
+
+    @property
+    def checkpoint_interval(self):
+        return self._checkpoint_interval.value()
+
+    @property
+    def storage_format(self):
+        storage_format = self._storage_format.currentText()
+        return None if storage_format == NO_STORAGE_FORMAT else storage_format
+
+
 class SimulationKillerOptions(QtWidgets.QWidget):
     def __init__(self, parent=None):
         super(SimulationKillerOptions, self).__init__(parent)
@@ -0,0 +1,322 @@
+"""
+This module transcode the maya cache files (.mcc) of a geometry to a single
+compressed companion file (.mcz) and expand it back to mcc files when maya
+needs them.
+The vector channels (positions, velocities) are quantized on 16 bits relative
+to their per frame bounding box. The other channels are kept as raw values.
+Every frame is compressed separately (zstd, lz4 or zlib, depending on the
+modules available) to allow to read a single frame without decompress the
+whole file.
+
+mcz file structure (little endian):
+    MCZ1                magic
+    uint32              metadata size
+    json                metadata (codec, chunks description, mcc headers)
+    uint64 * 2 * n      chunks offsets and sizes
+    chunks              compressed frames
+"""
+
+import os
+import json
+import glob
+import zlib
+import struct
+from array import array
+
+from ncachefactory.mcc import (
+    read_mcc, write_mcc, array_from_bytes, array_to_bytes, VECTOR_TAGS,
+    IS_LITTLE_ENDIAN)
+
+# The fast codecs are optional, zlib is always available.
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+MCZ_EXTENSION = '.mcz'
+MCZ_MAGIC = b'MCZ1'
+QUANTIZATION_MAX = 65535
+RAW_CHANNEL = 0
+QUANTIZED_CHANNEL = 1
+
+
+def list_available_codecs():
+    codecs = []
+    if zstandard is not None:
+        codecs.append('zstd')
+    if lz4 is not None:
+        codecs.append('lz4')
+    codecs.append('zlib')
+    return codecs
+
+
+def compress(data, codec):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor().compress(data)
+    if codec == 'lz4':
+        return lz4.frame.compress(data)
+    return zlib.compress(data, 6)
+
+
+def decompress(data, codec):
+    if codec == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == 'lz4':
+        return lz4.frame.decompress(data)
+    return zlib.decompress(data)
+
+
+def quantize_vectors(values):
+    """ Quantize a flat array of xyz values on 16 bits. Return the bounding
+    box minimums and maximums and the quantized array.
+    """
+    if numpy is not None:
+        vectors = numpy.asarray(values, dtype=numpy.float64).reshape(-1, 3)
+        minimums = vectors.min(axis=0)
+        maximums = vectors.max(axis=0)
+        extents = numpy.where(maximums > minimums, maximums - minimums, 1.0)
+        scales = QUANTIZATION_MAX / extents
+        quantized = numpy.rint((vectors - minimums) * scales)
+        quantized = array_from_bytes(
+            'H', quantized.astype(numpy.uint16).tobytes(), swap=False)
+        return list(minimums), list(maximums), quantized
+    quantized = array('H', [0]) * len(values)
+    minimums, maximums = [], []
+    for axis in range(3):
+        components = values[axis::3]
+        minimum, maximum = min(components), max(components)
+        extent = maximum - minimum
+        scale = QUANTIZATION_MAX / extent if extent > 0 else 0.0
+        quantized[axis::3] = array(
+            'H', [int(round((v - minimum) * scale)) for v in components])
+        minimums.append(minimum)
+        maximums.append(maximum)
+    return minimums, maximums, quantized
+
+
+def dequantize_vectors(minimums, maximums, quantized, typecode='f'):
+    if numpy is not None:
+        vectors = numpy.asarray(quantized, dtype=numpy.float64).reshape(-1, 3)
+        extents = numpy.asarray(maximums) - numpy.asarray(minimums)
+        vectors = vectors * (extents / QUANTIZATION_MAX) + minimums
+        return array_from_bytes(
+            typecode, vectors.astype(typecode).tobytes(), swap=False)
+    values = array(typecode, [0]) * len(quantized)
+    for axis in range(3):
+        minimum = minimums[axis]
+        step = (maximums[axis] - minimum) / QUANTIZATION_MAX
+        values[axis::3] = array(
+            typecode, [minimum + q * step for q in quantized[axis::3]])
+    return values
+
+
+def encode_channels(channels):
+    data = []
+    for _, tag, values in channels:
+        if tag in VECTOR_TAGS and len(values):
+            minimums, maximums, quantized = quantize_vectors(values)
+            data.append(struct.pack('<BI', QUANTIZED_CHANNEL, len(quantized)))
+            data.append(struct.pack('<6d', *(minimums + maximums)))
+            data.append(array_to_bytes(quantized, swap=not IS_LITTLE_ENDIAN))
+        else:
+            data.append(struct.pack('<BI', RAW_CHANNEL, len(values)))
+            data.append(array_to_bytes(values, swap=not IS_LITTLE_ENDIAN))
+    return b''.join(data)
+
+
+def decode_channels(data, descriptions):
+    channels = []
+    offset = 0
+    for name, tag in descriptions:
+        tag = tag.encode('ascii')
+        kind, count = struct.unpack_from('<BI', data, offset)
+        offset += 5
+        typecode = 'd' if tag in (b'DVCA', b'DBLA') else 'f'
+        if kind == QUANTIZED_CHANNEL:
+            bounds = struct.unpack_from('<6d', data, offset)
+            offset += 48
+            content = data[offset:offset + count * 2]
+            offset += count * 2
+            quantized = array_from_bytes(
+                'H', content, swap=not IS_LITTLE_ENDIAN)
+            values = dequantize_vectors(
+                list(bounds[:3]), list(bounds[3:]), quantized, typecode)
+        else:
+            size = count * array(typecode).itemsize
+            content = data[offset:offset + size]
+            offset += size
+            values = array_from_bytes(
+                typecode, content, swap=not IS_LITTLE_ENDIAN)
+        channels.append((name, tag, values))
+    return channels
+
+
+def list_geometry_mcc_files(xml_file):
+    """ List the mcc files described by the given xml. They are named as the
+    xml for OneFile cache, and suffixed by the frame for OneFilePerFrame.
+    """
+    basename = os.path.splitext(xml_file)[0]
+    files = glob.glob(basename + 'Frame*.mcc')
+    if os.path.exists(basename + '.mcc'):
+        files.append(basename + '.mcc')
+    return files
+
+
+def read_mcc_chunks(mcc_files):
+    """ Read the mcc files of a single geometry. Return the headers by file
+    name and the chunks (filename, time, channels) sorted by time.
+    """
+    chunks = []
+    headers = {}
+    for mcc_file in mcc_files:
+        header, blocks = read_mcc(mcc_file)
+        filename = os.path.basename(mcc_file)
+        headers[filename] = header
+        for time, channels in blocks:
+            chunks.append((
+                header['start'] if time is None else time,
+                filename, time, channels))
+    chunks.sort(key=lambda chunk: chunk[0])
+    return headers, [chunk[1:] for chunk in chunks]
+
+
+def describe_chunk(filename, time, channels):
+    return {
+        'file': filename,
+        'time': time,
+        'channels': [[name, tag.decode('ascii')] for name, tag, _ in channels]}
+
+
+def write_chunked_file(output, magic, metadata, data):
+    metadata = json.dumps(metadata).encode('utf-8')
+    offset = 8 + len(metadata) + 16 * len(data)
+    index = []
+    for chunk in data:
+        index.append(struct.pack('<QQ', offset, len(chunk)))
+        offset += len(chunk)
+    with open(output, 'wb') as f:
+        f.write(magic + struct.pack('<I', len(metadata)) + metadata)
+        f.write(b''.join(index))
+        f.write(b''.join(data))
+    return output
+
+
+def compress_mcc_files(mcc_files, output, codec=None):
+    """ Transcode the given mcc files of a single geometry to a mcz file. The
+    chunks are sorted by time.
+    """
+    codec = codec or list_available_codecs()[0]
+    headers, chunks = read_mcc_chunks(mcc_files)
+    metadata = {
+        'codec': codec,
+        'headers': headers,
+        'chunks': [describe_chunk(*chunk) for chunk in chunks]}
+    data = [
+        compress(encode_channels(channels), codec)
+        for _, _, channels in chunks]
+    return write_chunked_file(output, MCZ_MAGIC, metadata, data)
+
+
+class CompressedCacheReader(object):
+    """ Fast reader of the mcz files. Only the metadata and the index are
+    read at the initialization, the frames are read on demand.
+    """
+    magic = MCZ_MAGIC
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            if f.read(4) != self.magic:
+                raise ValueError('Invalid cache file: ' + filename)
+            size = struct.unpack('<I', f.read(4))[0]
+            self.metadata = json.loads(f.read(size).decode('utf-8'))
+            count = len(self.metadata['chunks'])
+            index = f.read(16 * count)
+        self.index = [
+            struct.unpack_from('<QQ', index, i * 16) for i in range(count)]
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def times(self):
+        headers = self.metadata['headers']
+        return [
+            headers[c['file']]['start'] if c['time'] is None else c['time']
+            for c in self.metadata['chunks']]
+
+    def read_data(self, index):
+        offset, size = self.index[index]
+        with open(self.filename, 'rb') as f:
+            f.seek(offset)
+            return decompress(f.read(size), self.metadata['codec'])
+
+    def read_chunk(self, index):
+        descriptions = self.metadata['chunks'][index]['channels']
+        return decode_channels(self.read_data(index), descriptions)
+
+    def iter_chunks(self):
+        for index in range(len(self)):
+            yield self.read_chunk(index)
+
+
+def write_mcc_files(reader, directory):
+    """ Write back the mcc files from a chunked cache reader. """
+    blocks_by_files = {}
+    for index, chunk in enumerate(reader.metadata['chunks']):
+        blocks = blocks_by_files.setdefault(chunk['file'], [])
+        blocks.append((chunk['time'], reader.read_chunk(index)))
+    mcc_files = []
+    for mcc_file, blocks in sorted(blocks_by_files.items()):
+        header = reader.metadata['headers'][mcc_file]
+        mcc_file = os.path.join(directory, mcc_file)
+        write_mcc(mcc_file, header, blocks)
+        mcc_files.append(mcc_file)
+    return mcc_files
+
+
+def expand_mcz_file(filename, directory=None):
+    """ Write back the mcc files from a mcz file. The quantized channels are
+    restored with a loss of precision under 1/65535 of the bounding box.
+    """
+    directory = directory or os.path.dirname(filename)
+    return write_mcc_files(CompressedCacheReader(filename), directory)
+
+
+def get_compressed_filename(xml_file):
+    return os.path.splitext(xml_file)[0] + MCZ_EXTENSION
+
+
+def compress_cache(xml_file, codec=None, remove_sources=False):
+    """ Create the compressed companion of the cache described by the xml. The
+    original mcc files can be removed, they can be restored with expand_cache.
+    """
+    mcc_files = list_geometry_mcc_files(xml_file)
+    if not mcc_files:
+        return None
+    output = compress_mcc_files(
+        mcc_files, get_compressed_filename(xml_file), codec=codec)
+    if remove_sources is True:
+        for mcc_file in mcc_files:
+            os.remove(mcc_file)
+    return output
+
+
+def expand_cache(xml_file):
+    """ Restore the mcc files of a cache if they were removed after the
+    compression. Return True if files were written.
+    """
+    filename = get_compressed_filename(xml_file)
+    if list_geometry_mcc_files(xml_file) or not os.path.exists(filename):
+        return False
+    expand_mcz_file(filename)
+    return True
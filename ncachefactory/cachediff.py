@@ -0,0 +1,254 @@
+"""
+This module compare the geometry of two caches of the same node. For every
+frame cached in both, it computes the RMS and the maximum displacement of
+the vertices, and find the first frame where the caches diverge.
+The mcc frames are memory mapped with numpy, only the pages read by the
+comparison are loaded. The compressed storage formats (mcz, mcd) are
+decoded. The frames are split in contiguous chunks compared in a pool of
+processes. The pool processes are always spawned: forking an interactive
+maya (Qt and his threads) can deadlock and the default spawn executable is
+the maya gui on windows and macos. The executable spawned must be given
+(e.g. mayapy) when the comparison runs in an interactive session.
+Without numpy, the comparison falls back on a pure python implementation
+without multiprocessing.
+"""
+
+import os
+import math
+import multiprocessing
+import xml.etree.ElementTree
+
+from ncachefactory.mcc import index_mcc, array_from_bytes, VECTOR_TAGS
+from ncachefactory.cachecompression import (
+    list_geometry_mcc_files, get_compressed_filename, CompressedCacheReader)
+from ncachefactory.deltacodec import get_delta_filename, DeltaCacheReader
+from ncachefactory.versioning import (
+    find_file_match, split_namespace_nodename, encode_frames_runs)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+DEFAULT_TOLERANCE = 1e-3
+DEFAULT_TIME_PER_FRAME = 250
+MINIMUM_FRAMES_BY_PROCESS = 8
+POSITION_CHANNEL_SUFFIXES = 'positions', 'position'
+READERS = {'mcz': CompressedCacheReader, 'mcd': DeltaCacheReader}
+# readers opened by the current process, kept to decode the frames in order.
+_readers = {}
+
+
+def find_position_channel(channels):
+    ''' channels is a list of tuple starting by the name and the tag '''
+    vectors = [c[0] for c in channels if c[1] in VECTOR_TAGS]
+    for name in vectors:
+        if name.endswith(POSITION_CHANNEL_SUFFIXES):
+            return name
+    return vectors[0] if vectors else None
+
+
+def read_time_per_frame(xml_file):
+    tree = xml.etree.ElementTree.parse(xml_file).getroot()
+    element = tree.find('cacheTimePerFrame')
+    if element is None:
+        return DEFAULT_TIME_PER_FRAME
+    return int(element.get('TimePerFrame'))
+
+
+def list_cache_frames(xml_file):
+    """ Return a dict {time: frame specification} for the positions of every
+    frame of a cache. The specification is a tuple which is light to send to
+    the processes:
+        ('mcc', filename, offset, count, tag)
+        ('mcz' or 'mcd', filename, chunk index, channel name)
+    """
+    frames = {}
+    for mcc_file in list_geometry_mcc_files(xml_file):
+        header, blocks = index_mcc(mcc_file)
+        for time, channels in blocks:
+            name = find_position_channel(channels)
+            if name is None:
+                continue
+            _, tag, offset, count = [c for c in channels if c[0] == name][0]
+            time = header['start'] if time is None else time
+            frames[time] = ('mcc', mcc_file, offset, count, tag)
+    if frames:
+        return frames
+    filenames = (
+        ('mcz', get_compressed_filename(xml_file)),
+        ('mcd', get_delta_filename(xml_file)))
+    for storage_format, filename in filenames:
+        if not os.path.exists(filename):
+            continue
+        reader = READERS[storage_format](filename)
+        for index, time in enumerate(reader.times):
+            channels = reader.metadata['chunks'][index]['channels']
+            name = find_position_channel(
+                [(n, t.encode('ascii')) for n, t in channels])
+            frames[time] = (storage_format, filename, index, name)
+        break
+    return frames
+
+
+def compute_cache_coverage(xml_file):
+    ''' Return the frames cached as runs (see versioning.encode_frames_runs)
+    from the frames index, the positions aren't read. '''
+    time_per_frame = float(read_time_per_frame(xml_file))
+    frames = [time / time_per_frame for time in list_cache_frames(xml_file)]
+    return encode_frames_runs(frames)
+
+
+def get_reader(storage_format, filename):
+    key = storage_format, filename
+    if key not in _readers:
+        _readers[key] = READERS[storage_format](filename)
+    return _readers[key]
+
+
+def load_positions(specification):
+    if specification[0] == 'mcc':
+        _, filename, offset, count, tag = specification
+        typecode = 'd' if tag == b'DVCA' else 'f'
+        if numpy is not None:
+            return numpy.memmap(
+                filename, dtype='>' + typecode, mode='r', offset=offset,
+                shape=(count,))
+        with open(filename, 'rb') as f:
+            f.seek(offset)
+            data = f.read(count * (8 if typecode == 'd' else 4))
+        return array_from_bytes(typecode, data)
+    storage_format, filename, index, name = specification
+    channels = get_reader(storage_format, filename).read_chunk(index)
+    values = [values for n, _, values in channels if n == name][0]
+    if numpy is not None:
+        return numpy.asarray(values)
+    return values
+
+
+def compute_displacement(positions1, positions2):
+    ''' Return the RMS and the maximum of the vertices displacement. NaN
+    values are returned if the topology is different. '''
+    if len(positions1) != len(positions2) or not len(positions1):
+        return float('nan'), float('nan')
+    if numpy is not None:
+        difference = (
+            numpy.asarray(positions1, dtype=numpy.float64) -
+            numpy.asarray(positions2, dtype=numpy.float64))
+        squared = numpy.square(difference).reshape(-1, 3).sum(axis=1)
+        return (
+            float(numpy.sqrt(squared.mean())),
+            float(numpy.sqrt(squared.max())))
+    squared = [
+        (positions1[i] - positions2[i]) ** 2 +
+        (positions1[i + 1] - positions2[i + 1]) ** 2 +
+        (positions1[i + 2] - positions2[i + 2]) ** 2
+        for i in range(0, len(positions1), 3)]
+    return (
+        math.sqrt(sum(squared) / len(squared)), math.sqrt(max(squared)))
+
+
+def compare_frame_pairs(pairs):
+    ''' pairs: list of tuple (specification1, specification2) '''
+    return [
+        compute_displacement(load_positions(s1), load_positions(s2))
+        for s1, s2 in pairs]
+
+
+def split_in_chunks(values, count):
+    size = int(math.ceil(len(values) / float(count)))
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+
+def create_pool(processes, executable=None):
+    ''' executable is the python spawned, the current one by default '''
+    context = multiprocessing.get_context('spawn')
+    if executable:
+        context.set_executable(executable)
+    return context.Pool(processes)
+
+
+class CacheDiff(object):
+    def __init__(self, frames, rms, maximums, tolerance=DEFAULT_TOLERANCE):
+        self.frames = frames
+        self.rms = rms
+        self.maximums = maximums
+        self.tolerance = tolerance
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def first_divergence_frame(self):
+        ''' First frame where a vertex moved more than the tolerance or the
+        topology changed. '''
+        for frame, maximum in zip(self.frames, self.maximums):
+            if math.isnan(maximum) or maximum > self.tolerance:
+                return frame
+
+    @property
+    def max_rms(self):
+        values = [v for v in self.rms if not math.isnan(v)]
+        return max(values) if values else float('nan')
+
+    @property
+    def max_displacement(self):
+        values = [v for v in self.maximums if not math.isnan(v)]
+        return max(values) if values else float('nan')
+
+
+def compare_caches(
+        xml_file1, xml_file2, processes=None, tolerance=DEFAULT_TOLERANCE,
+        executable=None):
+    """ Compare the frames cached in both the caches. processes is the size
+    of the pool, by default the cpu count. Use 1 to compare in the current
+    process. executable is the python spawned by the pool (see create_pool).
+    """
+    frames1 = list_cache_frames(xml_file1)
+    frames2 = list_cache_frames(xml_file2)
+    times = sorted(set(frames1) & set(frames2))
+    pairs = [(frames1[time], frames2[time]) for time in times]
+    processes = processes or multiprocessing.cpu_count()
+    processes = min(processes, len(pairs) // MINIMUM_FRAMES_BY_PROCESS)
+    if numpy is None or processes < 2:
+        results = compare_frame_pairs(pairs)
+    else:
+        pool = create_pool(processes, executable)
+        try:
+            chunks = pool.map(
+                compare_frame_pairs, split_in_chunks(pairs, processes))
+        finally:
+            pool.close()
+            pool.join()
+        results = [result for chunk in chunks for result in chunk]
+    time_per_frame = float(read_time_per_frame(xml_file1))
+    return CacheDiff(
+        frames=[time / time_per_frame for time in times],
+        rms=[result[0] for result in results],
+        maximums=[result[1] for result in results],
+        tolerance=tolerance)
+
+
+def compare_cacheversions(
+        cacheversion1, cacheversion2, nodes=None, processes=None,
+        tolerance=DEFAULT_TOLERANCE, executable=None):
+    """ Compare the caches of the nodes recorded in both cacheversions.
+    Return a dict {nodename: CacheDiff}.
+    """
+    nodes1 = cacheversion1.infos.get('nodes', {})
+    nodes2 = cacheversion2.infos.get('nodes', {})
+    common_nodes = sorted(set(nodes1) & set(nodes2))
+    if nodes is not None:
+        nodenames = [split_namespace_nodename(node)[1] for node in nodes]
+        common_nodes = [node for node in common_nodes if node in nodenames]
+    diffs = {}
+    for node in common_nodes:
+        xml_file1 = find_file_match(node, cacheversion1, extension='xml')
+        xml_file2 = find_file_match(node, cacheversion2, extension='xml')
+        if not xml_file1 or not xml_file2:
+            continue
+        diffs[node] = compare_caches(
+            xml_file1, xml_file2, processes=processes, tolerance=tolerance,
+            executable=executable)
+    return diffs
@@ -17,7 +17,8 @@ import maya.api.OpenMaya as om2
 from ncachefactory.versioning import (
     create_cacheversion, ensure_workspace_folder_exists, find_file_match,
     clear_cacheversion_content, cacheversion_contains_node,
-    move_playblast_to_cacheversion, extract_xml_attributes)
+    move_playblast_to_cacheversion, extract_xml_attributes,
+    list_tmp_jpeg_under_cacheversion, split_namespace_nodename)
 from ncachefactory.mesh import (
     create_mesh_for_geo_cache, attach_geo_cache,
     is_deformed_mesh_too_stretched)
@@ -32,8 +33,12 @@ from ncachefactory.playblast import (
 from ncachefactory.attributes import (
     save_pervertex_maps, list_node_attributes_values,
     clean_namespaces_in_attributes_dict, ORIGINAL_INPUTSHAPE_ATTRIBUTE,
-    filter_invisible_nodes_for_manager)
+    filter_invisible_nodes_for_manager, ensure_node_has_ncachemanager_tags,
+    has_ncachemanager_tag)
 from ncachefactory.optionvars import MEDIAPLAYER_PATH_OPTIONVAR
+from ncachefactory.cachecompression import compress_cache, expand_cache
+from ncachefactory.deltacodec import encode_delta_cache, expand_delta_cache
+from ncachefactory.cachediff import compute_cache_coverage
 
 
 ALTERNATE_INPUTSHAPE_GROUP = "alternative_inputshapes"
@@ -41,12 +46,17 @@ ALTERNATE_RESTSHAPE_GROUP = "alternative_restshapes"
 INPUTSHAPE_SUFFIX = "_alternate_inputshape"
 RESTSHAPE_SUFFIX = "_alternate_restshapes"
 CACHENODENAME_SUFFIX = "_CN000"
+# alternate storage formats: (transcode function, expand function)
+STORAGE_FORMATS = {
+    'mcz': (compress_cache, expand_cache),
+    'mcd': (encode_delta_cache, expand_delta_cache)}
 
 
 def create_and_record_cacheversion(
         workspace, start_frame, end_frame, comment=None, name=None,
         nodes=None, behavior=0, evaluate_every_frame=1.0, save_every_evaluation=1,
-        playblast=False, playblast_viewport_options=None):
+        playblast=False, playblast_viewport_options=None,
+        storage_format=None):
 
     cloth_nodes = cmds.ls(nodes, type="nCloth")
 
@@ -79,8 +89,13 @@ def create_and_record_cacheversion(
     timespent = (end_time - start_time).total_seconds()
     time = cmds.currentTime(query=True)
     cacheversion.set_range(nodes, start_frame=start_frame, end_frame=time)
+    update_coverage(cacheversion, nodes)
     cacheversion.set_timespent(nodes=nodes, seconds=timespent)
 
+    if storage_format is not None:
+        transcode_cacheversion(
+            cacheversion, storage_format=storage_format, nodes=nodes)
+
     if playblast is True:
         temp_path = stop_playblast_record(cacheversion.directory)
         move_playblast_to_cacheversion(temp_path, cacheversion)
@@ -90,8 +105,13 @@ def create_and_record_cacheversion(
 def record_in_existing_cacheversion(
         cacheversion, start_frame, end_frame, nodes=None, behavior=0,
         evaluate_every_frame=1.0, save_every_evaluation=1, playblast=False,
-        playblast_viewport_options=None):
-
+        playblast_viewport_options=None, checkpoint_interval=0,
+        storage_format=None):
+    ''' If a checkpoint_interval is given, the cache is recorded by segments
+    (see record_ncache_segments). If a storage format is given (see
+    STORAGE_FORMATS), a compressed companion cache is written after the
+    record.
+    '''
     if playblast is True:
         start_playblast_record(
             directory=cacheversion.directory,
@@ -102,26 +122,122 @@ def record_in_existing_cacheversion(
     nodes = filter_invisible_nodes_for_manager(nodes)
     save_pervertex_maps(nodes=cloth_nodes, directory=cacheversion.directory)
     start_time = datetime.now()
-    record_ncache(
-        nodes=nodes,
-        start_frame=start_frame,
-        end_frame=end_frame,
-        output=cacheversion.directory,
-        behavior=behavior,
-        evaluate_every_frame=evaluate_every_frame,
-        save_every_evaluation=save_every_evaluation)
+    if checkpoint_interval > 0:
+        record_ncache_segments(
+            cacheversion=cacheversion,
+            nodes=nodes,
+            start_frame=start_frame,
+            end_frame=end_frame,
+            checkpoint_interval=checkpoint_interval,
+            behavior=behavior,
+            evaluate_every_frame=evaluate_every_frame,
+            save_every_evaluation=save_every_evaluation)
+    else:
+        record_ncache(
+            nodes=nodes,
+            start_frame=start_frame,
+            end_frame=end_frame,
+            output=cacheversion.directory,
+            behavior=behavior,
+            evaluate_every_frame=evaluate_every_frame,
+            save_every_evaluation=save_every_evaluation)
     end_time = datetime.now()
     timespent = (end_time - start_time).total_seconds()
     time = cmds.currentTime(query=True)
     cacheversion.set_range(nodes, start_frame=start_frame, end_frame=time)
+    update_coverage(cacheversion, nodes)
     cacheversion.set_timespent(nodes=nodes, seconds=timespent)
     cacheversion.update_modification_time()
+    if storage_format is not None:
+        transcode_cacheversion(
+            cacheversion, storage_format=storage_format, nodes=nodes)
 
     if playblast is True:
         temp_path = stop_playblast_record(cacheversion.directory)
         move_playblast_to_cacheversion(temp_path, cacheversion)
 
 
+def resume_cacheversion(
+        cacheversion, end_frame, nodes=None, evaluate_every_frame=1.0,
+        save_every_evaluation=1, playblast=False,
+        playblast_viewport_options=None, checkpoint_interval=0,
+        storage_format=None):
+    """ Continue a cache recorded by segments from his last checkpoint. The
+    cache is connected to the nodes and the simulation start from the cached
+    state at the checkpoint frame through append_ncache.
+    """
+    checkpoint = cacheversion.infos['checkpoint']
+    if playblast is True:
+        # the frames already rendered by the dead job are kept in the movie
+        start_playblast_record(
+            directory=cacheversion.directory,
+            images=list_tmp_jpeg_under_cacheversion(cacheversion),
+            **playblast_viewport_options)
+
+    nodes = nodes or cmds.ls(type=DYNAMIC_NODES)
+    nodes = filter_invisible_nodes_for_manager(nodes)
+    connect_cacheversion(cacheversion, nodes)
+    start_time = datetime.now()
+    record_ncache_segments(
+        cacheversion=cacheversion,
+        nodes=nodes,
+        start_frame=checkpoint,
+        end_frame=end_frame,
+        checkpoint_interval=checkpoint_interval or end_frame - checkpoint,
+        evaluate_every_frame=evaluate_every_frame,
+        save_every_evaluation=save_every_evaluation,
+        resume=True)
+    end_time = datetime.now()
+    timespent = (end_time - start_time).total_seconds()
+    for node in nodes:
+        _, nodename = split_namespace_nodename(node)
+        seconds = cacheversion.infos['nodes'][nodename]['timespent'] or 0
+        cacheversion.set_timespent(nodes=[node], seconds=seconds + timespent)
+    cacheversion.update_modification_time()
+    if storage_format is not None:
+        transcode_cacheversion(
+            cacheversion, storage_format=storage_format, nodes=nodes)
+
+    if playblast is True:
+        temp_path = stop_playblast_record(cacheversion.directory)
+        move_playblast_to_cacheversion(temp_path, cacheversion)
+
+
+def record_ncache_segments(
+        cacheversion, nodes, start_frame, end_frame, checkpoint_interval,
+        behavior=0, evaluate_every_frame=1.0, save_every_evaluation=1,
+        resume=False):
+    """ Record the cache by segments of checkpoint_interval frames. The first
+    segment is a normal record and the next ones are appended. After every
+    segment, the cache files are flushed and the last frame is saved as
+    checkpoint in the cacheversion infos. If resume is True, the cache must
+    be already connected and every segment is appended.
+    """
+    frame = start_frame
+    while frame < end_frame:
+        segment_end = min(frame + checkpoint_interval, end_frame)
+        if frame == start_frame and resume is False:
+            record_ncache(
+                nodes=nodes,
+                start_frame=frame,
+                end_frame=segment_end,
+                output=cacheversion.directory,
+                behavior=behavior,
+                evaluate_every_frame=evaluate_every_frame,
+                save_every_evaluation=save_every_evaluation)
+        else:
+            cmds.currentTime(frame, edit=True)
+            append_ncache(
+                nodes=nodes,
+                evaluate_every_frame=evaluate_every_frame,
+                save_every_evaluation=save_every_evaluation,
+                end_frame=segment_end)
+        cacheversion.set_range(nodes, end_frame=segment_end)
+        update_coverage(cacheversion, nodes)
+        cacheversion.set_checkpoint(segment_end)
+        frame = segment_end
+
+
 def append_to_cacheversion(
         cacheversion, nodes=None, evaluate_every_frame=1.0,
         save_every_evaluation=1, playblast=False, playblast_viewport_options=None):
@@ -154,12 +270,24 @@ def append_to_cacheversion(
     end_frame = cacheversion.infos.get('nodes')[node]['range'][1]
     if time > end_frame:
         cacheversion.set_range(nodes=nodes, end_frame=time)
+    update_coverage(cacheversion, nodes)
 
     if playblast is True:
         temp_path = stop_playblast_record(cacheversion.directory)
         move_playblast_to_cacheversion(temp_path, cacheversion)
 
 
+def update_coverage(cacheversion, nodes):
+    ''' Save the frames really cached for the nodes, indexed from the cache
+    files. '''
+    coverages = {}
+    for node in nodes:
+        xml_file = find_file_match(node, cacheversion, extension='xml')
+        if xml_file:
+            coverages[node] = compute_cache_coverage(xml_file)
+    cacheversion.set_coverage(coverages)
+
+
 def plug_cacheversion(cacheversion, groupname, suffix, inattr, nodes=None):
     """ This function will plug a ncache to a given attribute.
     Basically, it create a static mesh based on the dynamic node input.
@@ -226,8 +354,51 @@ def connect_cacheversion(cacheversion, nodes=None, behavior=0):
         if not xml_file:
             cmds.warning("no cache to connect for {}".format(xml_file))
             continue
+        # maya can't read the compressed cache, the mcc files are restored
+        # if they were removed after the transcoding.
+        if cacheversion.storage_format in STORAGE_FORMATS:
+            STORAGE_FORMATS[cacheversion.storage_format][1](xml_file)
         cachefile = import_ncache(node, xml_file, behavior=behavior)
         cmds.rename(cachefile, cacheversion.name +CACHENODENAME_SUFFIX)
+    # used by the retention policies to evict the least recently used versions
+    cacheversion.set_last_connection_time()
+
+
+def transcode_cacheversion(
+        cacheversion, codec=None, remove_sources=False, storage_format='mcz',
+        nodes=None, **options):
+    """ Write a compressed companion cache for every cache of the version,
+    or only for the caches of the given nodes.
+    mcz: positions quantized on 16 bits, meant for the previews.
+    mcd: lossless keyframes and deltas, meant for the long hair caches.
+    The extra options are forwarded to the format encoder.
+    """
+    transcode = STORAGE_FORMATS[storage_format][0]
+    if nodes is None:
+        xml_files = cacheversion.get_files('xml')
+    else:
+        xml_files = [
+            find_file_match(node, cacheversion, extension='xml')
+            for node in nodes]
+    filenames = []
+    for xml_file in filter(None, xml_files):
+        filename = transcode(
+            xml_file, codec=codec, remove_sources=remove_sources, **options)
+        if filename:
+            filenames.append(filename)
+    if remove_sources is True:
+        cacheversion.set_storage_format(storage_format)
+    return filenames
+
+
+def expand_cacheversion(cacheversion):
+    """ Restore the mcc files removed after a transcoding """
+    if cacheversion.storage_format not in STORAGE_FORMATS:
+        return []
+    expand = STORAGE_FORMATS[cacheversion.storage_format][1]
+    return [
+        xml_file for xml_file in cacheversion.get_files('xml')
+        if expand(xml_file)]
 
 
 def delete_cacheversion(cacheversion):
@@ -249,12 +420,19 @@ def filter_connected_cacheversions(nodes=None, cacheversions=None):
         if os.path.normpath(cacheversion.directory) in directories]
 
 
-def compare_node_and_version(node, cacheversion):
+def get_node_cached_attributes(node, cacheversion):
+    ''' Return the attributes of the node saved in the cacheversion xml. The
+    namespaces are removed. '''
     filename = find_file_match(node, cacheversion, extension='xml')
     xml_attributes = extract_xml_attributes(filename)
     xml_attributes = clean_namespaces_in_attributes_dict(xml_attributes)
-    node_attributes = list_node_attributes_values(node)
-    node_attributes = clean_namespaces_in_attributes_dict(node_attributes)
+    _, nodename = split_namespace_nodename(node)
+    return {
+        key: value for key, value in xml_attributes.items()
+        if key.split('.')[0] == nodename}
+
+
+def compare_attributes(node_attributes, xml_attributes):
     differences = {}
     for key, value in xml_attributes.items():
         current_value = node_attributes.get(key)
@@ -270,16 +448,27 @@ def compare_node_and_version(node, cacheversion):
     return differences
 
 
+def compare_node_and_version(node, cacheversion):
+    xml_attributes = get_node_cached_attributes(node, cacheversion)
+    # only the attributes saved in the xml are queried on the node
+    names = [key.split('.', 1)[-1] for key in xml_attributes]
+    node_attributes = list_node_attributes_values(node, names)
+    node_attributes = clean_namespaces_in_attributes_dict(node_attributes)
+    return compare_attributes(node_attributes, xml_attributes)
+
+
 def recover_original_inputmesh(nodes):
     """ this function replug the original input in a cloth node if this one as
     an alternate input connected. As an other simulation mesh """
     nodes_to_clean = []
     for node in nodes:
         store_plug = node + '.' + ORIGINAL_INPUTSHAPE_ATTRIBUTE
-        stored_input_plugs = cmds.listConnections(
-            store_plug,
-            plugs=True,
-            connections=True)
+        stored_input_plugs = None
+        if has_ncachemanager_tag(node, ORIGINAL_INPUTSHAPE_ATTRIBUTE):
+            stored_input_plugs = cmds.listConnections(
+                store_plug,
+                plugs=True,
+                connections=True)
         if not stored_input_plugs:
             cmds.warning('no stored input for ' + node)
             continue
@@ -316,6 +505,7 @@ def apply_settings(cacheversion, nodes):
 
 
 def ensure_original_input_is_stored(dynamicnode):
+    ensure_node_has_ncachemanager_tags(dynamicnode)
     store_plug = dynamicnode + '.' + ORIGINAL_INPUTSHAPE_ATTRIBUTE
     if cmds.listConnections(store_plug):
         # original input already saved
@@ -328,6 +518,8 @@ def ensure_original_input_is_stored(dynamicnode):
 
 
 def get_orignial_input_mesh(dynamicnode):
+    if not has_ncachemanager_tag(dynamicnode, ORIGINAL_INPUTSHAPE_ATTRIBUTE):
+        return
     store_plug = dynamicnode + '.' + ORIGINAL_INPUTSHAPE_ATTRIBUTE
     connections = cmds.listConnections(store_plug, shapes=True)
     if connections:
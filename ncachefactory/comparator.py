@@ -1,8 +1,13 @@
 
+import bisect
 import maya.api.OpenMaya as om2
 from maya import cmds
 from PySide2 import QtWidgets, QtCore
-from ncachefactory.cachemanager import compare_node_and_version
+from ncachefactory.attributes import (
+    list_node_attributes_values, clean_namespaces_in_attributes_dict)
+from ncachefactory.cachemanager import (
+    get_node_cached_attributes, compare_attributes)
+from ncachefactory.versioning import split_namespace_nodename
 
 
 WINDOW_TITLE = "Comparator"
@@ -21,6 +26,9 @@ class ComparisonWidget(QtWidgets.QWidget):
         self._callbacks = []
         self.node = None
         self.cacheversion = None
+        # {plug without namespace: value}
+        self.xml_attributes = {}
+        self.node_attributes = {}
 
         self.node_label = QtWidgets.QLabel(NODENAME_LABEL.format('None'))
         text = CACHEVERSION_LABEL.format('None')
@@ -52,20 +60,30 @@ class ComparisonWidget(QtWidgets.QWidget):
         self.unregister_callbacks()
         self.node = node
         self.cacheversion = cacheversion
+        self.xml_attributes = {}
+        self.node_attributes = {}
         if self.node and self.cacheversion:
-            result = compare_node_and_version(self.node, self.cacheversion)
+            self.xml_attributes = get_node_cached_attributes(
+                self.node, self.cacheversion)
+            # only the attributes saved in the xml are queried on the node
+            names = [key.split('.', 1)[-1] for key in self.xml_attributes]
+            node_attributes = list_node_attributes_values(self.node, names)
+            self.node_attributes = clean_namespaces_in_attributes_dict(
+                node_attributes)
             self.node_label.setText(NODENAME_LABEL.format(self.node))
             name = self.cacheversion.name
             self.version_label.setText(CACHEVERSION_LABEL.format(name))
             self.register_callbacks()
         else:
-            result = {}
             self.node_label.setText(NODENAME_LABEL.format('None'))
             self.version_label.setText(CACHEVERSION_LABEL.format('None'))
+        result = compare_attributes(self.node_attributes, self.xml_attributes)
         self.table_model.set_comparison_result(result)
         self.table_view.update_header()
 
     def register_callbacks(self):
+        if self._callbacks or not self.node:
+            return
         node = om2.MSelectionList().add(self.node).getDependNode(0)
         function = self._update_comparison
         cb = om2.MNodeMessage.addAttributeChangedCallback(node, function)
@@ -76,25 +94,33 @@ class ComparisonWidget(QtWidgets.QWidget):
             om2.MMessage.removeCallback(callback)
         self._callbacks = []
 
-    def _update_comparison(self, *unused_callbacks_args):
-        # the callback has to be temporarily disabled to avoid an infinite
-        # loop. Better way should be found, this is a bit ... yeah, ugly
-        self.unregister_callbacks()
-        result = compare_node_and_version(self.node, self.cacheversion)
-        self.table_model.set_comparison_result(result)
-        self.table_view.update_header()
-        self.register_callbacks()
+    def _update_comparison(self, message, plug, *unused_callbacks_args):
+        # only the changed plug is queried and his row updated
+        if not message & om2.MNodeMessage.kAttributeSet:
+            return
+        attribute = plug.partialName(useLongNames=True)
+        self.update_attribute(attribute)
+
+    def update_attribute(self, attribute):
+        _, nodename = split_namespace_nodename(self.node)
+        key = nodename + '.' + attribute
+        if key not in self.xml_attributes:
+            return
+        values = list_node_attributes_values(self.node, [attribute])
+        value = values.get(self.node + '.' + attribute)
+        self.node_attributes[key] = value
+        difference = compare_attributes(
+            {key: value}, {key: self.xml_attributes[key]}).get(key)
+        self.table_model.set_difference(key, difference)
 
     def _call_revert_selected(self):
         self._match_values(self.table_view.selected_attributes)
 
     def _call_revert_all(self):
-        self._match_values(self.table_model.nodes)
+        self._match_values(list(self.table_model.nodes))
 
     def _match_values(self, attributes):
-        # the callback has to be temporarily disabled to avoid an infinite
-        # loop. Better way should be found, this is a bit ... yeah, ugly
-        self.unregister_callbacks()
+        # the rows are updated by the attribute changed callback
         if not attributes:
             return
         namespace = ":".join(self.node.split(":")[:-1])
@@ -106,10 +132,6 @@ class ComparisonWidget(QtWidgets.QWidget):
             except RuntimeError:
                 message = "{} is locked or connected and cannot be modifed"
                 cmds.warning(message.format(plug))
-        result = compare_node_and_version(self.node, self.cacheversion)
-        self.table_model.set_comparison_result(result)
-        self.table_view.update_header()
-        self.register_callbacks()
 
     def show(self):
         super(ComparisonWidget, self).show()
@@ -180,6 +202,25 @@ class ComparisonTableModel(QtCore.QAbstractTableModel):
             self.nodes.append((key, current_value, cached_value))
         self.layoutChanged.emit()
 
+    def set_difference(self, key, difference):
+        ''' Update, add or remove the row of a single attribute. difference
+        is a tuple (current value, cached value) or None. '''
+        keys = [node[0] for node in self.nodes]
+        row = bisect.bisect_left(keys, key)
+        exists = row < len(keys) and keys[row] == key
+        if exists and difference is None:
+            self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+            del self.nodes[row]
+            self.endRemoveRows()
+        elif exists:
+            self.nodes[row] = (key, ) + tuple(difference)
+            self.dataChanged.emit(
+                self.index(row, 0), self.index(row, len(self.HEADERS) - 1))
+        elif difference is not None:
+            self.beginInsertRows(QtCore.QModelIndex(), row, row)
+            self.nodes.insert(row, (key, ) + tuple(difference))
+            self.endInsertRows()
+
     def columnCount(self, _):
         return len(self.HEADERS)
 
@@ -0,0 +1,187 @@
+"""
+This module provide a lossless storage format for the long position caches
+(hairs, cloth) based on the coherence between consecutive frames.
+Every keyframe_interval frames, the vector channels are stored as they are
+(keyframe). Between them, only the XOR of the float bits with the previous
+frame is stored (delta). The consecutive values share their sign, exponent
+and high mantissa bits, the XOR is mostly made of zeros. The bytes are then
+shuffled by significance before the compression to group these zeros.
+A frame is decoded from the previous keyframe, so a random access never
+decode more than keyframe_interval frames.
+
+The mcd file use the same chunked structure than the mcz (see
+cachecompression) with the 'MCD1' magic.
+"""
+
+import os
+import struct
+
+from ncachefactory.mcc import (
+    array_from_bytes, array_to_bytes, VECTOR_TAGS, ARRAY_TYPECODES,
+    IS_LITTLE_ENDIAN)
+from ncachefactory.cachecompression import (
+    compress, list_available_codecs, list_geometry_mcc_files,
+    read_mcc_chunks, describe_chunk, write_chunked_file, write_mcc_files,
+    CompressedCacheReader)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+MCD_EXTENSION = '.mcd'
+MCD_MAGIC = b'MCD1'
+DEFAULT_KEYFRAME_INTERVAL = 25
+RAW_CHANNEL = 0
+KEY_CHANNEL = 1
+DELTA_CHANNEL = 2
+
+
+def xor_bytes(data1, data2):
+    if numpy is not None:
+        array1 = numpy.frombuffer(data1, dtype=numpy.uint8)
+        array2 = numpy.frombuffer(data2, dtype=numpy.uint8)
+        return numpy.bitwise_xor(array1, array2).tobytes()
+    # Ensure compatibility Py2 and Py3
+    if hasattr(int, 'from_bytes'):
+        value = (
+            int.from_bytes(data1, 'little') ^ int.from_bytes(data2, 'little'))
+        return value.to_bytes(len(data1), 'little')
+    return bytes(bytearray(
+        a ^ b for a, b in zip(bytearray(data1), bytearray(data2))))
+
+
+def shuffle_bytes(data, itemsize):
+    ''' Group the bytes by significance: all the first bytes, then all the
+    second bytes, etc. '''
+    return b''.join(data[i::itemsize] for i in range(itemsize))
+
+
+def unshuffle_bytes(data, itemsize):
+    count = len(data) // itemsize
+    result = bytearray(len(data))
+    for i in range(itemsize):
+        result[i::itemsize] = data[i * count:(i + 1) * count]
+    return bytes(result)
+
+
+def encode_chunk(channels, previous, keyframe):
+    """ Encode the channels of a frame. previous is a dict containing the raw
+    bytes of the previous frame vector channels by name, it's updated with
+    the current frame.
+    """
+    data = []
+    for name, tag, values in channels:
+        raw = array_to_bytes(values, swap=not IS_LITTLE_ENDIAN)
+        if tag not in VECTOR_TAGS:
+            kind, content = RAW_CHANNEL, raw
+        else:
+            itemsize = values.itemsize
+            reference = previous.get(name)
+            if keyframe or reference is None or len(reference) != len(raw):
+                kind, content = KEY_CHANNEL, shuffle_bytes(raw, itemsize)
+            else:
+                delta = xor_bytes(raw, reference)
+                kind, content = DELTA_CHANNEL, shuffle_bytes(delta, itemsize)
+            previous[name] = raw
+        data.append(struct.pack('<BI', kind, len(content)))
+        data.append(content)
+    return b''.join(data)
+
+
+def decode_chunk(data, descriptions, previous):
+    channels = []
+    offset = 0
+    for name, tag in descriptions:
+        tag = tag.encode('ascii')
+        typecode = ARRAY_TYPECODES[tag]
+        kind, size = struct.unpack_from('<BI', data, offset)
+        offset += 5
+        content = data[offset:offset + size]
+        offset += size
+        if kind != RAW_CHANNEL:
+            itemsize = 8 if typecode == 'd' else 4
+            content = unshuffle_bytes(content, itemsize)
+            if kind == DELTA_CHANNEL:
+                content = xor_bytes(content, previous[name])
+            previous[name] = content
+        values = array_from_bytes(typecode, content, swap=not IS_LITTLE_ENDIAN)
+        channels.append((name, tag, values))
+    return channels
+
+
+def encode_mcc_files(
+        mcc_files, output, codec=None,
+        keyframe_interval=DEFAULT_KEYFRAME_INTERVAL):
+    codec = codec or list_available_codecs()[0]
+    headers, chunks = read_mcc_chunks(mcc_files)
+    previous = {}
+    data = []
+    for index, (_, _, channels) in enumerate(chunks):
+        keyframe = index % keyframe_interval == 0
+        chunk = encode_chunk(channels, previous, keyframe)
+        data.append(compress(chunk, codec))
+    metadata = {
+        'codec': codec,
+        'keyframe_interval': keyframe_interval,
+        'headers': headers,
+        'chunks': [describe_chunk(*chunk) for chunk in chunks]}
+    return write_chunked_file(output, MCD_MAGIC, metadata, data)
+
+
+class DeltaCacheReader(CompressedCacheReader):
+    """ The last decoded frame is kept, reading the frames in order decode
+    every frame once. A random access decode the frames from the previous
+    keyframe.
+    """
+    magic = MCD_MAGIC
+
+    def __init__(self, filename):
+        super(DeltaCacheReader, self).__init__(filename)
+        self.keyframe_interval = self.metadata['keyframe_interval']
+        self._last_index = None
+        self._previous = {}
+
+    def read_chunk(self, index):
+        keyframe = index - index % self.keyframe_interval
+        last = self._last_index
+        if last is not None and keyframe <= last < index:
+            start = last + 1
+        else:
+            start = keyframe
+            self._previous = {}
+        for i in range(start, index + 1):
+            descriptions = self.metadata['chunks'][i]['channels']
+            channels = decode_chunk(
+                self.read_data(i), descriptions, self._previous)
+        self._last_index = index
+        return channels
+
+
+def get_delta_filename(xml_file):
+    return os.path.splitext(xml_file)[0] + MCD_EXTENSION
+
+
+def encode_delta_cache(
+        xml_file, codec=None, remove_sources=False,
+        keyframe_interval=DEFAULT_KEYFRAME_INTERVAL):
+    mcc_files = list_geometry_mcc_files(xml_file)
+    if not mcc_files:
+        return None
+    output = encode_mcc_files(
+        mcc_files, get_delta_filename(xml_file), codec=codec,
+        keyframe_interval=keyframe_interval)
+    if remove_sources is True:
+        for mcc_file in mcc_files:
+            os.remove(mcc_file)
+    return output
+
+
+def expand_delta_cache(xml_file):
+    filename = get_delta_filename(xml_file)
+    if list_geometry_mcc_files(xml_file) or not os.path.exists(filename):
+        return False
+    reader = DeltaCacheReader(filename)
+    write_mcc_files(reader, os.path.dirname(filename))
+    return True
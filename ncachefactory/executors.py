@@ -0,0 +1,449 @@
+"""
+This module contains the backends used to execute the batch cache jobs.
+A backend (executor) receive the arguments built by the batch module and
+schedule the jobs on the hosts available. It returns a process like object
+(BatchJob) which can be polled and killed by the monitor.
+
+Three executors are available:
+    local: run mayapy on the current workstation (default behavior)
+    ssh: dispatch the jobs on a pool of linux hosts through ssh. The hosts
+        must share the workspace path and have mayapy at the same path.
+    template: run a custom command line built from a template. The
+        template can contains the keys {host} and {command}.
+    farm: write a job description in the cacheversion and send it with a
+        submitter. The job is tracked through the files written by the batch
+        script instead of a process (see farm module). If the jobs are
+        chained, every job depends on the previous one submitted.
+The dependencies given to submit are only used by the farm, the other
+executors launch the jobs in the submission order.
+"""
+
+import shlex
+import subprocess
+from PySide2 import QtWidgets, QtCore
+from maya import cmds
+
+from ncachefactory.farm import (
+    build_job_description, write_job_description, read_job_status,
+    request_kill, parse_resources, is_job_status_stale, write_dead_job_status,
+    QUEUED, RUNNING, FINISHED, FAILED, KILLED)
+from ncachefactory.optionvars import (
+    BATCH_EXECUTOR_OPTIONVAR, BATCH_HOSTS_OPTIONVAR, BATCH_SLOTS_OPTIONVAR,
+    BATCH_COMMAND_TEMPLATE_OPTIONVAR, BATCH_FARM_COMMAND_OPTIONVAR,
+    BATCH_FARM_RESOURCES_OPTIONVAR, BATCH_FARM_CHAINED_OPTIONVAR,
+    ensure_optionvars_exists)
+
+# Ensure compatibility Py2 and Py3
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+
+EXECUTOR_TYPES = 'local', 'ssh', 'template', 'farm'
+LOCALHOST = 'localhost'
+# the tty allocation ensure the remote process is killed with the ssh client
+SSH_COMMAND = 'ssh', '-tt', '-o', 'BatchMode=yes'
+# environment variables forwarded to the remote hosts
+REMOTE_ENVIRONMENT_PREFIXES = 'PYTHONPATH', 'MAYA_', 'XBMLANGPATH'
+
+
+class BatchJob(object):
+    """ Process like object returned by the executors. The process isn't
+    started before the executor find a free slot on a host.
+    """
+    def __init__(
+            self, executor, arguments, environment, directory=None,
+            suffix=''):
+        self.executor = executor
+        self.arguments = arguments
+        self.environment = environment
+        self.directory = directory
+        self.suffix = suffix
+        self.process = None
+        self.host = None
+        self.killed = False
+        self.status_closed = False
+
+    def poll(self):
+        self.executor.schedule()
+        if self.process is None:
+            # a job killed before to be launched is considered as terminated
+            return -1 if self.killed is True else None
+        returncode = self.process.poll()
+        if returncode:
+            self.close_status()
+        return returncode
+
+    def kill(self):
+        self.killed = True
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+        self.close_status()
+
+    def close_status(self):
+        ''' A process killed or crashed can't write his final status, it's
+        written for him (see farm.list_live_jobs). '''
+        if self.directory is None or self.status_closed is True:
+            return
+        self.status_closed = True
+        status = KILLED if self.killed is True else FAILED
+        write_dead_job_status(self.directory, status, self.suffix)
+
+    @property
+    def status(self):
+        if self.killed is True:
+            return KILLED
+        if self.process is None:
+            return QUEUED
+        returncode = self.process.poll()
+        if returncode is None:
+            return RUNNING
+        return FINISHED if returncode == 0 else FAILED
+
+
+class LocalExecutor(object):
+    """ Run the jobs on the local workstation. slots is the number of jobs
+    allowed to run at the same time, 0 means unlimited.
+    """
+    def __init__(self, slots=0):
+        self.hosts = {LOCALHOST: slots}
+        self.jobs = []
+
+    def submit(
+            self, arguments, environment, directory=None, suffix='',
+            dependencies=None):
+        job = BatchJob(self, arguments, environment, directory, suffix)
+        self.jobs.append(job)
+        self.schedule()
+        return job
+
+    def schedule(self):
+        for job in self.jobs:
+            if job.process is not None or job.killed is True:
+                continue
+            host = self.find_free_host()
+            if host is None:
+                return
+            job.host = host
+            job.process = self.launch(job.arguments, job.environment, host)
+
+    def find_free_host(self):
+        running = [job.host for job in self.jobs if job.status == RUNNING]
+        hosts = sorted(self.hosts, key=running.count)
+        for host in hosts:
+            slots = self.hosts[host]
+            if not slots or running.count(host) < slots:
+                return host
+        return None
+
+    def build_command(self, arguments, environment, host):
+        return arguments
+
+    def launch(self, arguments, environment, host):
+        command = self.build_command(arguments, environment, host)
+        return subprocess.Popen(command, env=environment, bufsize=-1)
+
+
+class TemplateExecutor(LocalExecutor):
+    """ Run the jobs through a custom command line. The template is formatted
+    with the host and the command (the quoted mayapy arguments).
+    e.g. 'nice -n 10 {command}'
+    """
+    def __init__(self, template, hosts=None):
+        super(TemplateExecutor, self).__init__()
+        self.template = template
+        self.hosts = hosts or {LOCALHOST: 0}
+
+    def build_command(self, arguments, environment, host):
+        command = ' '.join(quote(argument or '') for argument in arguments)
+        return shlex.split(self.template.format(host=host, command=command))
+
+
+class SshExecutor(LocalExecutor):
+    """ Dispatch the jobs on a hosts pool through ssh. The environment is
+    forwarded to the remote mayapy through an env command. The ssh needs to
+    be configured with keys, no password can be asked.
+    """
+    def __init__(self, hosts):
+        super(SshExecutor, self).__init__()
+        self.hosts = hosts
+
+    def build_command(self, arguments, environment, host):
+        variables = [
+            '{}={}'.format(key, value)
+            for key, value in sorted(environment.items())
+            if key.startswith(REMOTE_ENVIRONMENT_PREFIXES)]
+        arguments = ['env'] + variables + [a or '' for a in arguments]
+        command = ' '.join(quote(argument) for argument in arguments)
+        return list(SSH_COMMAND) + [host, command]
+
+
+class FarmJob(object):
+    """ Process like object tracking a farm job through the status file
+    written by the batch script in the cacheversion directory.
+    """
+    def __init__(self, executor, directory, suffix=''):
+        self.executor = executor
+        self.directory = directory
+        self.suffix = suffix
+        self.killed = False
+
+    def poll(self):
+        status = self.status
+        if status in (QUEUED, RUNNING):
+            return None
+        return {FINISHED: 0, KILLED: -1}.get(status, 1)
+
+    def kill(self):
+        self.killed = True
+        request_kill(self.directory, self.suffix)
+        self.executor.submitter.cancel(self.directory, self.suffix)
+
+    @property
+    def status(self):
+        status = read_job_status(self.directory, self.suffix)
+        submitter = self.executor.submitter
+        live = status is None or status['status'] in (QUEUED, RUNNING)
+        if live and submitter.is_terminated(self.directory, self.suffix):
+            # read again, the process can write his status just before to end
+            status = read_job_status(self.directory, self.suffix)
+            if status is None or status['status'] in (QUEUED, RUNNING):
+                status = KILLED if self.killed is True else FAILED
+                write_dead_job_status(self.directory, status, self.suffix)
+                return status
+        if status is not None:
+            return FAILED if is_job_status_stale(status) else status['status']
+        return KILLED if self.killed is True else QUEUED
+
+    @property
+    def host(self):
+        status = read_job_status(self.directory, self.suffix)
+        return status['host'] if status is not None else None
+
+
+class FarmExecutor(object):
+    """ Write a job description in the cacheversion directory and send it
+    through the given submitter. Resources is the dict of resources required
+    by every job (see farm.DEFAULT_RESOURCES). If chained is True, every job
+    depends on the previous one submitted.
+    """
+    def __init__(self, submitter, resources=None, chained=False):
+        self.submitter = submitter
+        self.resources = resources
+        self.chained = chained
+        self.jobs = []
+        self.last_job_name = None
+
+    def submit(
+            self, arguments, environment, directory=None, suffix='',
+            dependencies=None):
+        dependencies = list(dependencies or [])
+        if self.chained and self.last_job_name is not None:
+            if self.last_job_name not in dependencies:
+                dependencies.append(self.last_job_name)
+        description = build_job_description(
+            directory, arguments, environment, dependencies=dependencies,
+            resources=self.resources, suffix=suffix)
+        filename = write_job_description(directory, description)
+        description['farm_id'] = self.submitter.submit(filename, description)
+        write_job_description(directory, description)
+        self.last_job_name = description['name']
+        job = FarmJob(self, directory, suffix)
+        self.jobs.append(job)
+        return job
+
+
+class LocalSubmitter(object):
+    """ Stub submitter which run the job descriptions on the local machine.
+    It allows to test a farm setup without farm. The dependencies are
+    ignored, the jobs start at their submission.
+    """
+    def __init__(self):
+        self.processes = {}
+
+    def submit(self, filename, description):
+        process = subprocess.Popen(
+            description['command'], env=description['environment'])
+        key = description['directory'], description['suffix']
+        self.processes[key] = process
+        return str(process.pid)
+
+    def is_terminated(self, directory, suffix=''):
+        process = self.processes.get((directory, suffix))
+        return process is not None and process.poll() is not None
+
+    def cancel(self, directory, suffix=''):
+        # the kill request is only read by the batch script between two
+        # frames, the process is killed directly if it's still loading.
+        process = self.processes.get((directory, suffix))
+        if process is not None and process.poll() is None:
+            process.kill()
+
+
+class CommandSubmitter(object):
+    """ Submit the job descriptions through a command line template. The
+    template is formatted with the job.json path as {description} and the
+    job name as {name}. The command output is stored as farm id.
+    e.g. 'farmsubmit --json {description}'
+    """
+    def __init__(self, template):
+        self.template = template
+
+    def submit(self, filename, description):
+        command = self.template.format(
+            description=quote(filename), name=quote(description['name']))
+        output = subprocess.check_output(shlex.split(command))
+        return output.decode('utf-8').strip()
+
+    def cancel(self, directory, suffix=''):
+        # the batch script stop itself when the kill is requested
+        pass
+
+    def is_terminated(self, directory, suffix=''):
+        # the farm isn't queried, a job dead after his start is detected
+        # by his stale status (see farm.is_job_status_stale).
+        return False
+
+
+def parse_hosts(text):
+    """ Convert a text like 'host1:2, host2' to a dict {host: slots}. A host
+    without slots specified accept one job at a time.
+    """
+    hosts = {}
+    for host in text.replace(';', ',').split(','):
+        host = host.strip()
+        if not host:
+            continue
+        name, _, slots = host.partition(':')
+        hosts[name] = int(slots) if slots else 1
+    return hosts
+
+
+_executor = None
+
+
+def get_executor():
+    """ Return the executor defined by the optionvars. The same instance is
+    returned as long as the settings don't change, it allows the scheduling
+    to consider the jobs sent previously.
+    """
+    global _executor
+    ensure_optionvars_exists()
+    settings = (
+        cmds.optionVar(query=BATCH_EXECUTOR_OPTIONVAR),
+        cmds.optionVar(query=BATCH_HOSTS_OPTIONVAR),
+        cmds.optionVar(query=BATCH_SLOTS_OPTIONVAR),
+        cmds.optionVar(query=BATCH_COMMAND_TEMPLATE_OPTIONVAR),
+        cmds.optionVar(query=BATCH_FARM_COMMAND_OPTIONVAR),
+        cmds.optionVar(query=BATCH_FARM_RESOURCES_OPTIONVAR),
+        cmds.optionVar(query=BATCH_FARM_CHAINED_OPTIONVAR))
+    if _executor is not None and _executor.settings == settings:
+        return _executor
+    (executor_type, hosts, slots, template, farm_command, resources,
+     chained) = settings
+    if EXECUTOR_TYPES[executor_type] == 'farm':
+        if farm_command:
+            submitter = CommandSubmitter(farm_command)
+        else:
+            submitter = LocalSubmitter()
+        _executor = FarmExecutor(
+            submitter, parse_resources(resources), chained=bool(chained))
+    elif EXECUTOR_TYPES[executor_type] == 'ssh':
+        _executor = SshExecutor(parse_hosts(hosts))
+    elif EXECUTOR_TYPES[executor_type] == 'template':
+        _executor = TemplateExecutor(template, parse_hosts(hosts) or None)
+    else:
+        _executor = LocalExecutor(slots)
+    _executor.settings = settings
+    return _executor
+
+
+class ExecutorOptions(QtWidgets.QWidget):
+    def __init__(self, parent=None):
+        super(ExecutorOptions, self).__init__(parent, QtCore.Qt.Tool)
+        self.setWindowTitle('Batch Executor Options')
+        self.executor = QtWidgets.QComboBox()
+        self.executor.addItems(EXECUTOR_TYPES)
+        self.slots = QtWidgets.QSpinBox()
+        self.slots.setToolTip('Local jobs running at the same time (0=all)')
+        self.hosts = QtWidgets.QLineEdit()
+        self.hosts.setPlaceholderText('host1:2, host2, host3:4')
+        self.hosts.setToolTip(
+            'Comma separated hosts with their number of slots.\n'
+            'The hosts must share the workspace and the mayapy path.')
+        self.template = QtWidgets.QLineEdit()
+        self.template.setPlaceholderText('nice -n 10 {command}')
+        self.template.setToolTip('Keys available: {host} and {command}')
+        self.farm_command = QtWidgets.QLineEdit()
+        self.farm_command.setPlaceholderText('farmsubmit --json {description}')
+        self.farm_command.setToolTip(
+            'Keys available: {description} (job.json path) and {name}.\n'
+            'Leave empty to run the job descriptions locally.')
+        self.resources = QtWidgets.QLineEdit()
+        self.resources.setPlaceholderText('cpus:1, memory:8192, licenses:maya')
+        self.chained = QtWidgets.QCheckBox('Chain the farm jobs')
+        self.chained.setToolTip(
+            'Every job submitted depends on the previous one.')
+
+        self.layout = QtWidgets.QFormLayout(self)
+        self.layout.addRow('Executor', self.executor)
+        self.layout.addRow('Local slots', self.slots)
+        self.layout.addRow('Hosts', self.hosts)
+        self.layout.addRow('Command template', self.template)
+        self.layout.addRow('Farm submit command', self.farm_command)
+        self.layout.addRow('Farm resources', self.resources)
+        self.layout.addRow('', self.chained)
+
+        self.set_optionvars()
+        self.update_ui_states()
+        self.executor.currentIndexChanged.connect(self.save_optionvars)
+        self.executor.currentIndexChanged.connect(self.update_ui_states)
+        self.slots.valueChanged.connect(self.save_optionvars)
+        self.hosts.textEdited.connect(self.save_optionvars)
+        self.template.textEdited.connect(self.save_optionvars)
+        self.farm_command.textEdited.connect(self.save_optionvars)
+        self.resources.textEdited.connect(self.save_optionvars)
+        self.chained.stateChanged.connect(self.save_optionvars)
+
+    def update_ui_states(self, *signals_args):
+        executor_type = EXECUTOR_TYPES[self.executor.currentIndex()]
+        self.slots.setEnabled(executor_type == 'local')
+        self.hosts.setEnabled(executor_type in ('ssh', 'template'))
+        self.template.setEnabled(executor_type == 'template')
+        self.farm_command.setEnabled(executor_type == 'farm')
+        self.resources.setEnabled(executor_type == 'farm')
+        self.chained.setEnabled(executor_type == 'farm')
+
+    def set_optionvars(self):
+        ensure_optionvars_exists()
+        value = cmds.optionVar(query=BATCH_EXECUTOR_OPTIONVAR)
+        self.executor.setCurrentIndex(value)
+        value = cmds.optionVar(query=BATCH_SLOTS_OPTIONVAR)
+        self.slots.setValue(value)
+        value = cmds.optionVar(query=BATCH_HOSTS_OPTIONVAR)
+        self.hosts.setText(value)
+        value = cmds.optionVar(query=BATCH_COMMAND_TEMPLATE_OPTIONVAR)
+        self.template.setText(value)
+        value = cmds.optionVar(query=BATCH_FARM_COMMAND_OPTIONVAR)
+        self.farm_command.setText(value)
+        value = cmds.optionVar(query=BATCH_FARM_RESOURCES_OPTIONVAR)
+        self.resources.setText(value)
+        value = cmds.optionVar(query=BATCH_FARM_CHAINED_OPTIONVAR)
+        self.chained.setChecked(bool(value))
+
+    def save_optionvars(self, *signals_args):
+        value = self.executor.currentIndex()
+        cmds.optionVar(intValue=[BATCH_EXECUTOR_OPTIONVAR, value])
+        value = self.slots.value()
+        cmds.optionVar(intValue=[BATCH_SLOTS_OPTIONVAR, value])
+        value = self.hosts.text()
+        cmds.optionVar(stringValue=[BATCH_HOSTS_OPTIONVAR, value])
+        value = self.template.text()
+        cmds.optionVar(stringValue=[BATCH_COMMAND_TEMPLATE_OPTIONVAR, value])
+        value = self.farm_command.text()
+        cmds.optionVar(stringValue=[BATCH_FARM_COMMAND_OPTIONVAR, value])
+        value = self.resources.text()
+        cmds.optionVar(stringValue=[BATCH_FARM_RESOURCES_OPTIONVAR, value])
+        value = int(self.chained.isChecked())
+        cmds.optionVar(intValue=[BATCH_FARM_CHAINED_OPTIONVAR, value])
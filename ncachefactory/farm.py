@@ -0,0 +1,225 @@
+"""
+This module manage the render farm job descriptions and the files used to
+track a batch job without process handle.
+Every job sent to a farm write a job description (job.json) in his
+cacheversion directory. This description is generic and contains everything
+a farm manager needs to run the job: the command, the environment, the
+dependencies and the resources required.
+The batch script write his status in the cacheversion directory
+(job_status.json) and check at every frame if a kill was requested by the
+monitor (kill_requested file). It allows to follow jobs running on machines
+which aren't reachable from the workstation. During the cache, the running
+status is rewritten every HEARTBEAT_INTERVAL. A running status older than
+STALE_JOB_DELAY belongs to a dead process, the job is considered failed.
+When a local process is killed or crashes, the monitor writes his final
+status in place of the batch script.
+The dependencies are the names of the jobs which must finish before the job
+starts (e.g. the previous job when the farm jobs are chained).
+When several jobs write in the same cacheversion (one per solver group), the
+job, status and kill request files are suffixed by the job suffix (e.g.
+job_solvers01.json)
+
+example of a job.json structure
+{
+    'name': 'version_004',
+    'directory': 'path to the cacheversion',
+    'command': ['mayapy', 'record_in_cacheversion.py', ...],
+    'command_line': 'mayapy record_in_cacheversion.py ...',
+    'environment': {'PYTHONPATH': '...'},
+    'dependencies': ['version_003'],
+    'resources': {'cpus': 1, 'memory': 8192, 'licenses': ['maya']},
+    'submission_time': 65000,
+    'farm_id': '1234' or None}
+"""
+
+import os
+import glob
+import time
+import socket
+
+from ncachefactory.versioning import load_json, save_json
+
+# Ensure compatibility Py2 and Py3
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+
+JOB_DESCRIPTION_FILENAME = 'job{}.json'
+JOB_STATUS_FILENAME = 'job_status{}.json'
+KILL_REQUEST_FILENAME = 'kill_requested{}'
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+KILLED = 'killed'
+# memory is expressed in megabytes
+DEFAULT_RESOURCES = {'cpus': 1, 'memory': 8192, 'licenses': ['maya']}
+HEARTBEAT_INTERVAL = 60
+# the scene opening doesn't refresh the status, the delay must cover it.
+STALE_JOB_DELAY = 3600
+# a farm can hold a job in his queue for hours before to start it.
+STALE_QUEUED_JOB_DELAY = 24 * 3600
+# last heartbeat written by the batch process by (directory, suffix)
+_heartbeats = {}
+
+
+def build_job_description(
+        directory, arguments, environment, dependencies=None,
+        resources=None, suffix=''):
+    arguments = [argument or '' for argument in arguments]
+    return {
+        'name': os.path.basename(directory) + suffix,
+        'directory': directory,
+        'command': arguments,
+        'command_line': ' '.join(quote(argument) for argument in arguments),
+        'environment': dict(environment),
+        'dependencies': dependencies or [],
+        'resources': resources or dict(DEFAULT_RESOURCES),
+        'submission_time': time.time(),
+        'suffix': suffix,
+        'farm_id': None}
+
+
+def get_job_description_filename(directory, suffix=''):
+    filename = JOB_DESCRIPTION_FILENAME.format(suffix)
+    return os.path.join(directory, filename).replace("\\", "/")
+
+
+def write_job_description(directory, description):
+    filename = get_job_description_filename(
+        directory, description.get('suffix', ''))
+    save_json(filename, description)
+    return filename
+
+
+def read_job_description(directory, suffix=''):
+    filename = get_job_description_filename(directory, suffix)
+    if not os.path.exists(filename):
+        return None
+    return load_json(filename)
+
+
+def write_job_status(directory, status, message=None, suffix=''):
+    ''' Called by the batch script to notify his state to the monitor. '''
+    filename = os.path.join(directory, JOB_STATUS_FILENAME.format(suffix))
+    save_json(filename, {
+        'status': status,
+        'host': socket.gethostname(),
+        'pid': os.getpid(),
+        'time': time.time(),
+        'message': message})
+
+
+def write_job_heartbeat(directory, suffix=''):
+    ''' Called by the batch script at every frame. The running status is
+    rewritten at most every HEARTBEAT_INTERVAL to show the job is alive. '''
+    key = directory, suffix
+    now = time.time()
+    if now - _heartbeats.get(key, 0) < HEARTBEAT_INTERVAL:
+        return
+    _heartbeats[key] = now
+    write_job_status(directory, RUNNING, suffix=suffix)
+
+
+def write_dead_job_status(directory, status, suffix=''):
+    ''' Called by the monitor when a job process ended without writing his
+    final status (killed or crashed). A final status is never replaced. '''
+    current_status = read_job_status(directory, suffix)
+    if current_status is None or current_status['status'] in (QUEUED, RUNNING):
+        message = 'process ended without status'
+        write_job_status(directory, status, message, suffix)
+
+
+def is_job_status_stale(status, delay=STALE_JOB_DELAY):
+    if status['status'] != RUNNING:
+        return False
+    return time.time() - status.get('time', 0) > delay
+
+
+def read_job_status(directory, suffix=''):
+    filename = os.path.join(directory, JOB_STATUS_FILENAME.format(suffix))
+    if not os.path.exists(filename):
+        return None
+    try:
+        return load_json(filename)
+    except ValueError:
+        # the file can be read during his writing by the batch process.
+        return None
+
+
+def request_kill(directory, suffix=''):
+    filename = KILL_REQUEST_FILENAME.format(suffix)
+    with open(os.path.join(directory, filename), 'w'):
+        pass
+
+
+def is_kill_requested(directory, suffix=''):
+    filename = KILL_REQUEST_FILENAME.format(suffix)
+    return os.path.exists(os.path.join(directory, filename))
+
+
+def clean_job_status(directory, suffix=''):
+    ''' Remove the status and the kill request of a job to submit it again '''
+    filenames = (
+        JOB_STATUS_FILENAME.format(suffix),
+        KILL_REQUEST_FILENAME.format(suffix))
+    for filename in filenames:
+        filename = os.path.join(directory, filename)
+        if os.path.exists(filename):
+            os.remove(filename)
+
+
+def is_job_live(directory, description):
+    """ A job is live if his status is queued or running and not stale. A job
+    without status yet is live until STALE_QUEUED_JOB_DELAY after his
+    submission.
+    """
+    suffix = description.get('suffix', '')
+    status = read_job_status(directory, suffix)
+    if status is None:
+        filename = os.path.join(directory, JOB_STATUS_FILENAME.format(suffix))
+        if os.path.exists(filename):
+            # the status is being written
+            return True
+        submission_time = description.get('submission_time') or 0
+        return time.time() - submission_time < STALE_QUEUED_JOB_DELAY
+    if status['status'] not in (QUEUED, RUNNING):
+        return False
+    return not is_job_status_stale(status)
+
+
+def list_live_jobs(directory):
+    ''' Return the job descriptions of the live jobs of a cacheversion
+    directory. '''
+    pattern = JOB_DESCRIPTION_FILENAME.format('*')
+    # the pattern job*.json matches the status files too
+    status_prefix = os.path.splitext(JOB_STATUS_FILENAME.format(''))[0]
+    descriptions = []
+    for filename in glob.glob(os.path.join(directory, pattern)):
+        if os.path.basename(filename).startswith(status_prefix):
+            continue
+        try:
+            description = load_json(filename)
+        except ValueError:
+            continue
+        if is_job_live(directory, description):
+            descriptions.append(description)
+    return descriptions
+
+
+def parse_resources(text):
+    """ Convert a text like 'cpus:4, memory:16000, licenses:maya nucleus' to
+    a resources dict. Unspecified resources use the default values.
+    """
+    resources = dict(DEFAULT_RESOURCES)
+    for resource in text.replace(';', ',').split(','):
+        key, _, value = resource.strip().partition(':')
+        if not key or not value:
+            continue
+        if key == 'licenses':
+            resources[key] = value.split()
+        else:
+            resources[key] = int(value)
+    return resources
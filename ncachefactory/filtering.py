@@ -2,7 +2,8 @@ from PySide2 import QtCore, QtWidgets
 from maya import cmds
 from ncachefactory.ncache import DYNAMIC_NODES
 from ncachefactory.attributes import (
-    FILTERED_FOR_NCACHEMANAGER, filter_invisible_nodes_for_manager)
+    FILTERED_FOR_NCACHEMANAGER, ensure_node_has_ncachemanager_tags,
+    is_filtered_for_manager)
 
 
 WINDOW_TITLE = "Visible for the factory"
@@ -29,7 +30,7 @@ class FilterDialog(QtWidgets.QWidget):
         nodes = cmds.ls(type=DYNAMIC_NODES)
         for node in sorted(nodes):
             name = cmds.listRelatives(node, parent=True)[0]
-            state = not cmds.getAttr(node + '.' + FILTERED_FOR_NCACHEMANAGER)
+            state = not is_filtered_for_manager(node)
             checkstate = QtCore.Qt.Checked if state else QtCore.Qt.Unchecked
             item = QtWidgets.QListWidgetItem(name)
             item.setFlags(flags)
@@ -39,5 +40,6 @@ class FilterDialog(QtWidgets.QWidget):
 
     def item_changed(self, item):
         state = not item.checkState() == QtCore.Qt.Checked
+        ensure_node_has_ncachemanager_tags(item.node)
         cmds.setAttr(item.node + '.' + FILTERED_FOR_NCACHEMANAGER, state)
         self.updateRequested.emit()
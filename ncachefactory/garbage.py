@@ -0,0 +1,291 @@
+"""
+This module find and delete the files left behind by the batch jobs and the
+tools: the temp scenes never sent, the scenes of the store not used anymore,
+the jpegs and movies of the playblasts and the contact sheets exports.
+A file is garbage if no cacheversion infos.json and no live job refers to
+it. A job is live if his status is queued or running and not stale, a
+killed job isn't (see farm.is_job_live).
+The files younger than minimum_age are never collected, they can belong to
+a process currently writing them.
+"""
+
+import os
+import glob
+import time
+import shutil
+import tempfile
+from multiprocessing.pool import ThreadPool
+
+from PySide2 import QtWidgets, QtCore
+
+from ncachefactory.batch import TEMPFOLDER_NAME, WEDGINGFOLDER_NAME
+from ncachefactory.farm import list_live_jobs
+from ncachefactory.playblast import OUTPUT_RENDER_FILENAME
+from ncachefactory.retention import format_size
+from ncachefactory.scenestore import (
+    get_store_directory, BAKED_INPUTS_SUFFIX)
+from ncachefactory.sequencereader import CONTACTSHEET_TEMPFILENAME
+from ncachefactory.versioning import (
+    list_available_cacheversions, list_tmp_jpeg_under_cacheversion)
+
+
+MINIMUM_AGE = 3600
+DELETION_THREADS = 8
+
+
+def normpath(path):
+    return os.path.normcase(os.path.normpath(path))
+
+
+def get_path_size(path):
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    size = 0
+    for root, _, filenames in os.walk(path):
+        for filename in filenames:
+            size += os.path.getsize(os.path.join(root, filename))
+    return size
+
+
+def list_referenced_paths(cacheversions, live_jobs):
+    ''' Return the normalized paths referenced by the cacheversions infos and
+    the command of their live jobs. live_jobs is a dict of job descriptions
+    by cacheversion directory. '''
+    paths = set()
+    for cacheversion in cacheversions:
+        infos = cacheversion.infos
+        if infos.get('scene'):
+            paths.add(normpath(infos['scene']))
+        for playblast in infos.get('playblasts') or []:
+            paths.add(normpath(playblast))
+        for description in live_jobs.get(cacheversion.directory, []):
+            paths.update(
+                normpath(argument) for argument in description['command']
+                if argument and os.path.isabs(argument))
+    return paths
+
+
+def find_temp_scenes(workspace):
+    garbages = []
+    for foldername in (TEMPFOLDER_NAME, WEDGINGFOLDER_NAME):
+        folder = os.path.join(workspace, foldername)
+        if not os.path.exists(folder):
+            continue
+        garbages.extend(
+            (os.path.join(folder, filename), 'temp scene')
+            for filename in os.listdir(folder))
+    return garbages
+
+
+def find_unused_stored_scenes(workspace):
+    ''' The stored scenes are hardlinked in the cacheversions using them. A
+    scene with a single link can only be referenced by path. '''
+    directory = get_store_directory(workspace)
+    if not os.path.exists(directory):
+        return []
+    garbages = []
+    for filename in os.listdir(directory):
+        path = os.path.join(directory, filename)
+        if filename.endswith(BAKED_INPUTS_SUFFIX):
+            # the baked inputs follow their scene
+            continue
+        if os.stat(path).st_nlink > 1:
+            continue
+        garbages.append((path, 'unused stored scene'))
+        inputs = os.path.splitext(path)[0] + BAKED_INPUTS_SUFFIX
+        if os.path.exists(inputs):
+            garbages.append((inputs, 'unused stored scene inputs'))
+    return garbages
+
+
+def find_playblast_leftovers(cacheversion):
+    ''' Return the jpegs rendered by the playblasts and the movies never moved
+    to the cacheversion playblasts. The jpegs are kept if the job can be
+    resumed, they are used to complete the movie. '''
+    garbages = []
+    infos = cacheversion.infos
+    checkpoint = infos.get('checkpoint')
+    resumable = checkpoint is not None and checkpoint < infos.get('end_frame')
+    if not resumable:
+        garbages.extend(
+            (jpeg, 'playblast image')
+            for jpeg in list_tmp_jpeg_under_cacheversion(cacheversion))
+    pattern = os.path.join(cacheversion.directory, OUTPUT_RENDER_FILENAME)
+    garbages.extend(
+        (movie, 'playblast movie not registered')
+        for movie in glob.glob(pattern + '*.mp4'))
+    return garbages
+
+
+def find_contactsheet_leftovers():
+    folder = tempfile.gettempdir()
+    pattern = os.path.join(folder, CONTACTSHEET_TEMPFILENAME.format('*'))
+    # the movie compiled before his move to the export destination
+    movie = CONTACTSHEET_TEMPFILENAME.split('.')[0] + '.mp4'
+    movie = os.path.join(folder, movie)
+    return [
+        (filename, 'contact sheet temp file')
+        for filename in glob.glob(pattern) + glob.glob(movie)]
+
+
+def find_garbage(workspace, protected=None, minimum_age=MINIMUM_AGE):
+    """ Return the garbage of the workspace as list of (path, size, reason).
+    protected is a list of paths to ignore (e.g. the scenes queued in the
+    batch cacher).
+    """
+    cacheversions = list_available_cacheversions(workspace)
+    live_jobs = {
+        cv.directory: list_live_jobs(cv.directory) for cv in cacheversions}
+    referenced = list_referenced_paths(cacheversions, live_jobs)
+    referenced.update(normpath(path) for path in protected or [])
+    # the baked inputs are saved in a folder next to their scene
+    referenced.update([
+        os.path.splitext(path)[0] + BAKED_INPUTS_SUFFIX
+        for path in referenced])
+
+    candidates = find_temp_scenes(workspace)
+    candidates.extend(find_unused_stored_scenes(workspace))
+    for cacheversion in cacheversions:
+        if live_jobs[cacheversion.directory]:
+            continue
+        candidates.extend(find_playblast_leftovers(cacheversion))
+    candidates.extend(find_contactsheet_leftovers())
+
+    limit = time.time() - minimum_age
+    garbages = []
+    for path, reason in candidates:
+        if normpath(path) in referenced:
+            continue
+        try:
+            if os.path.getmtime(path) > limit:
+                continue
+            garbages.append((path, get_path_size(path), reason))
+        except OSError:
+            # deleted by another process during the search
+            continue
+    return garbages
+
+
+class GarbageReport(object):
+    def __init__(self, garbages, dry_run=True):
+        self.garbages = garbages
+        self.dry_run = dry_run
+        self.errors = []
+
+    @property
+    def reclaimed_size(self):
+        failed = {path for path, _ in self.errors}
+        return sum(
+            size for path, size, _ in self.garbages if path not in failed)
+
+    def format(self):
+        verb = 'Reclaimable' if self.dry_run else 'Reclaimed'
+        lines = ['{}: {} in {} files'.format(
+            verb, format_size(self.reclaimed_size), len(self.garbages))]
+        sizes = {}
+        for _, size, reason in self.garbages:
+            sizes[reason] = sizes.get(reason, 0) + size
+        for reason, size in sorted(sizes.items()):
+            lines.append('    {}: {}'.format(reason, format_size(size)))
+        for path, size, reason in self.garbages:
+            lines.append('{} ({}, {})'.format(path, format_size(size), reason))
+        for path, error in self.errors:
+            lines.append('Error: {} {}'.format(path, error))
+        return '\n'.join(lines)
+
+
+def delete_path(path):
+    ''' Return None on success or the error message '''
+    try:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    except OSError as e:
+        return str(e)
+
+
+def collect_garbage(
+        workspace, dry_run=True, protected=None, minimum_age=MINIMUM_AGE,
+        threads=DELETION_THREADS):
+    """ Find and delete the garbage of the workspace. The deletions are done
+    in parallel, they are mostly waiting for the file server.
+    """
+    garbages = find_garbage(workspace, protected, minimum_age)
+    report = GarbageReport(garbages, dry_run=dry_run)
+    if dry_run is True or not garbages:
+        return report
+    paths = [path for path, _, _ in garbages]
+    pool = ThreadPool(min(threads, len(paths)))
+    try:
+        errors = pool.map(delete_path, paths)
+    finally:
+        pool.close()
+        pool.join()
+    report.errors = [
+        (path, error) for path, error in zip(paths, errors) if error]
+    return report
+
+
+class GarbageCollectorWindow(QtWidgets.QWidget):
+    def __init__(self, parent=None):
+        super(GarbageCollectorWindow, self).__init__(parent, QtCore.Qt.Tool)
+        self.setWindowTitle('Workspace Garbage Collector')
+        self.workspace = None
+        # function returning the paths to keep (e.g. batch cacher queue)
+        self.protected_paths_getter = None
+
+        self.minimum_age = QtWidgets.QSpinBox()
+        self.minimum_age.setMaximum(10000)
+        self.minimum_age.setValue(MINIMUM_AGE // 60)
+        self.minimum_age.setSuffix(' minutes')
+        self.minimum_age.setToolTip('The younger files are never collected')
+        self.dry_run = QtWidgets.QPushButton('Dry run')
+        self.dry_run.released.connect(self._call_dry_run)
+        self.collect = QtWidgets.QPushButton('Collect')
+        self.collect.released.connect(self._call_collect)
+        self.report = QtWidgets.QPlainTextEdit()
+        self.report.setReadOnly(True)
+
+        self.buttons_layout = QtWidgets.QHBoxLayout()
+        self.buttons_layout.setContentsMargins(0, 0, 0, 0)
+        self.buttons_layout.addWidget(self.dry_run)
+        self.buttons_layout.addWidget(self.collect)
+        self.form_layout = QtWidgets.QFormLayout()
+        self.form_layout.addRow('Minimum age', self.minimum_age)
+
+        self.layout = QtWidgets.QVBoxLayout(self)
+        self.layout.addLayout(self.form_layout)
+        self.layout.addLayout(self.buttons_layout)
+        self.layout.addWidget(self.report)
+
+    def set_workspace(self, workspace):
+        self.workspace = workspace
+        self.report.clear()
+
+    def run(self, dry_run):
+        if self.workspace is None:
+            return
+        protected = None
+        if self.protected_paths_getter is not None:
+            protected = self.protected_paths_getter()
+        report = collect_garbage(
+            self.workspace, dry_run=dry_run, protected=protected,
+            minimum_age=self.minimum_age.value() * 60)
+        self.report.setPlainText(report.format())
+        return report
+
+    def _call_dry_run(self):
+        self.run(dry_run=True)
+
+    def _call_collect(self):
+        report = self.run(dry_run=True)
+        if not report or not report.garbages:
+            return
+        message = 'Delete {} files ({})?'.format(
+            len(report.garbages), format_size(report.reclaimed_size))
+        result = QtWidgets.QMessageBox.question(
+            self, 'Collect garbage', message,
+            QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No)
+        if result == QtWidgets.QMessageBox.Yes:
+            self.run(dry_run=False)
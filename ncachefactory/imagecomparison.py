@@ -0,0 +1,123 @@
+"""
+This module compare the images of two versions for the review:
+    - difference: absolute difference of the channels, amplified
+    - onion skin: luminance of the first image in red, of the second in
+      cyan. The identical areas are grey.
+    - heatmap: largest channel difference mapped on a color ramp
+The QImage buffers are read as numpy arrays without copy. The images are
+RGB32, their bytes are B, G, R, 255 on little endian, the arrays keep this
+order. Without numpy, only the wipe is available.
+"""
+
+from PySide2 import QtGui
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+WIPE = 'wipe'
+DIFFERENCE = 'difference'
+ONION_SKIN = 'onion skin'
+HEATMAP = 'heatmap'
+COMPARISON_MODES = WIPE, DIFFERENCE, ONION_SKIN, HEATMAP
+DIFFERENCE_GAIN = 4
+# difference reaching the last color of the heatmap
+HEATMAP_SATURATION = 64
+HEATMAP_COLORS = (
+    (0.0, (0, 0, 0)),
+    (0.25, (0, 0, 255)),
+    (0.5, (0, 255, 255)),
+    (0.75, (255, 255, 0)),
+    (1.0, (255, 0, 0)))
+
+
+def list_available_modes():
+    return COMPARISON_MODES if numpy is not None else (WIPE,)
+
+
+def build_heatmap_lut(colors=HEATMAP_COLORS):
+    ''' Return a (256, 3) array of BGR colors interpolated from the
+    (position, RGB color) stops. '''
+    positions = [position * 255 for position, _ in colors]
+    values = numpy.arange(256)
+    channels = [
+        numpy.interp(values, positions, [color[i] for _, color in colors])
+        for i in (2, 1, 0)]
+    return numpy.round(numpy.stack(channels, axis=1)).astype(numpy.uint8)
+
+
+def image_to_array(image):
+    """ Return a (height, width, 4) array sharing the buffer of a RGB32
+    image. The array is valid as long as the image lives. """
+    height, width = image.height(), image.width()
+    buffer_ = numpy.frombuffer(image.constBits(), dtype=numpy.uint8)
+    rows = buffer_[:image.bytesPerLine() * height].reshape(height, -1)
+    return rows[:, :width * 4].reshape(height, width, 4)
+
+
+def array_to_image(array):
+    ''' Build a RGB32 image from a (height, width, 3) BGR array '''
+    height, width = array.shape[:2]
+    bgra = numpy.empty((height, width, 4), dtype=numpy.uint8)
+    bgra[..., :3] = array
+    bgra[..., 3] = 255
+    image = QtGui.QImage(
+        bgra.data, width, height, width * 4, QtGui.QImage.Format_RGB32)
+    # the image doesn't own the array buffer
+    return image.copy()
+
+
+def compute_difference(array1, array2, gain=DIFFERENCE_GAIN):
+    difference = numpy.abs(array1.astype(numpy.int16) - array2)
+    return numpy.minimum(difference * gain, 255).astype(numpy.uint8)
+
+
+def compute_luminance(array):
+    ''' Integer rec. 601 luminance of a BGR array '''
+    weighted = (
+        array[..., 0].astype(numpy.uint16) * 29 +
+        array[..., 1].astype(numpy.uint16) * 150 +
+        array[..., 2].astype(numpy.uint16) * 77)
+    return (weighted >> 8).astype(numpy.uint8)
+
+
+def compute_onion_skin(array1, array2):
+    result = numpy.empty(array1.shape, dtype=numpy.uint8)
+    result[..., 2] = compute_luminance(array1)
+    result[..., 0] = result[..., 1] = compute_luminance(array2)
+    return result
+
+
+def compute_heatmap(array1, array2, saturation=HEATMAP_SATURATION):
+    difference = numpy.abs(array1.astype(numpy.int16) - array2).max(axis=2)
+    # clamped before the scaling to not overflow the int16
+    indexes = numpy.minimum(difference, saturation) * 255 // saturation
+    return HEATMAP_LUT[indexes]
+
+
+def compare_arrays(array1, array2, mode):
+    ''' Compare two BGR arrays of the same shape '''
+    return COMPARATORS[mode](array1, array2)
+
+
+def compare_images(image1, image2, mode):
+    """ Return the comparison of the images as a new QImage. The second
+    image is scaled to the first if their sizes differ. QImage can be used
+    out of the main thread.
+    """
+    image1 = image1.convertToFormat(QtGui.QImage.Format_RGB32)
+    if image2.size() != image1.size():
+        image2 = image2.scaled(image1.size())
+    image2 = image2.convertToFormat(QtGui.QImage.Format_RGB32)
+    array1 = image_to_array(image1)[..., :3]
+    array2 = image_to_array(image2)[..., :3]
+    return array_to_image(compare_arrays(array1, array2, mode))
+
+
+COMPARATORS = {
+    DIFFERENCE: compute_difference,
+    ONION_SKIN: compute_onion_skin,
+    HEATMAP: compute_heatmap}
+HEATMAP_LUT = build_heatmap_lut() if numpy is not None else None
@@ -15,6 +15,7 @@ from ncachefactory.cachemanager import (
 from ncachefactory.optionvars import (
     MEDIAPLAYER_PATH_OPTIONVAR, CACHEVERSION_SORTING_TYPE_OPTIONVAR)
 from ncachefactory.qtutils import get_icon
+from ncachefactory.preview import PreviewStrip
 from ncachefactory.attributessetters import (
     DynamicMapTransferWindow, AttributesTransferWindow)
 
@@ -260,9 +261,13 @@ class CacheversionInfosWidget(QtWidgets.QWidget):
         self.comment.textChanged.connect(self._call_comment_changed)
         self.scene = QtWidgets.QLineEdit('')
         self.scene.setReadOnly(True)
+        self.starred = QtWidgets.QCheckBox('Protected from the eviction')
+        self.starred.setEnabled(False)
+        self.starred.stateChanged.connect(self._call_starred_changed)
         self.nodes_table_model = NodeInfosTableModel()
         self.nodes_table_view = NodeInfosTableView()
         self.nodes_table_view.setModel(self.nodes_table_model)
+        self.preview = PreviewStrip()
 
         self.form_layout = QtWidgets.QFormLayout()
         self.form_layout.setContentsMargins(0, 0, 0, 0)
@@ -271,17 +276,25 @@ class CacheversionInfosWidget(QtWidgets.QWidget):
         self.form_layout.addRow("Name:", self.name)
         self.form_layout.addRow("Comment:", self.comment)
         self.form_layout.addRow("Scene:", self.scene)
+        self.form_layout.addRow("Starred:", self.starred)
 
         self.layout = QtWidgets.QVBoxLayout(self)
         self.layout.addLayout(self.form_layout)
         self.layout.addWidget(self.nodes_table_view)
+        self.layout.addWidget(self.preview)
 
     def set_cacheversion(self, cacheversion):
         self.blockSignals(True)
         self.cacheversion = cacheversion
         self.nodes_table_model.set_cacheversion(cacheversion)
+        self.preview.set_cacheversion(cacheversion)
         self.name.setEnabled(bool(cacheversion))
         self.comment.setEnabled(bool(cacheversion))
+        self.starred.setEnabled(bool(cacheversion))
+        starred = bool(cacheversion and cacheversion.infos.get("starred"))
+        self.starred.blockSignals(True)
+        self.starred.setChecked(starred)
+        self.starred.blockSignals(False)
         if cacheversion is None:
             self.name.setText("")
             self.comment.setText("")
@@ -313,6 +326,11 @@ class CacheversionInfosWidget(QtWidgets.QWidget):
             return
         self.cacheversion.set_comment(self.comment.toHtml())
 
+    def _call_starred_changed(self, state):
+        if self.cacheversion is None:
+            return
+        self.cacheversion.set_starred(bool(state))
+
 
 class NodeInfosTableView(QtWidgets.QTableView):
     def __init__(self, parent=None):
@@ -18,6 +18,8 @@ from ncachefactory.cachemanager import (
     record_in_existing_cacheversion, append_to_cacheversion)
 from ncachefactory.comparator import ComparisonWidget
 from ncachefactory.environment import EnvironmentOptions
+from ncachefactory.executors import ExecutorOptions
+from ncachefactory.garbage import GarbageCollectorWindow
 from ncachefactory.infos import WorkspaceCacheversionsExplorer
 from ncachefactory.optionvars import (
     CACHEOPTIONS_EXP_OPTIONVAR, COMPARISON_EXP_OPTIONVAR,
@@ -29,6 +31,7 @@ from ncachefactory.monitoring import MultiCacheMonitor
 from ncachefactory.ncache import DYNAMIC_NODES
 from ncachefactory.nodetable import DynamicNodesTableWidget
 from ncachefactory.playblastoptions import PlayblastOptions
+from ncachefactory.retention import RetentionWindow
 from ncachefactory.timecallbacks import (
     register_time_callback, add_to_time_callback, unregister_time_callback,
     time_verbose, clear_time_callback_functions)
@@ -54,6 +57,9 @@ class NCacheManager(MayaQWidgetDockableMixin, QtWidgets.QWidget):
 
         self.pathoptions = PathOptions(self)
         self.environmentoptions = EnvironmentOptions(self)
+        self.executoroptions = ExecutorOptions(self)
+        self.retention = RetentionWindow(self)
+        self.garbage_collector = GarbageCollectorWindow(self)
         self.workspace_widget = WorkspaceWidget()
         self.nodetable = DynamicNodesTableWidget()
         self.batch_monitor = MultiCacheMonitor(parent=self)
@@ -76,6 +82,9 @@ class NCacheManager(MayaQWidgetDockableMixin, QtWidgets.QWidget):
         self.cacheoptions_expander = Expander("Options", self.cacheoptions)
         self.cacheoptions_expander.released.connect(self.save_optionvars)
         self.batchcacher = BatchCacher()
+        self.garbage_collector.protected_paths_getter = (
+            self.batchcacher.list_queued_scenes)
+        self.batchcacher.frame_range_getter = self.get_frame_range
         method = partial(self.send_multi_cache, selection=False)
         self.batchcacher.sendMultiCacheRequested.connect(method)
         method = partial(self.send_multi_cache, selection=True)
@@ -142,6 +151,18 @@ class NCacheManager(MayaQWidgetDockableMixin, QtWidgets.QWidget):
         self.environment = QtWidgets.QAction(text, self.menufile)
         self.environment.triggered.connect(self.environmentoptions.show)
         self.menufile.addAction(self.environment)
+        text = 'Batch Executor'
+        self.executor = QtWidgets.QAction(text, self.menufile)
+        self.executor.triggered.connect(self.executoroptions.show)
+        self.menufile.addAction(self.executor)
+        text = 'Disk usage and retention'
+        self.disk_usage = QtWidgets.QAction(text, self.menufile)
+        self.disk_usage.triggered.connect(self.retention.show)
+        self.menufile.addAction(self.disk_usage)
+        text = 'Collect workspace garbage'
+        self.collect_garbage = QtWidgets.QAction(text, self.menufile)
+        self.collect_garbage.triggered.connect(self.garbage_collector.show)
+        self.menufile.addAction(self.collect_garbage)
         self.help = QtWidgets.QAction('Help', self.menufile)
         self.menufile.addAction(self.help)
         self.help.triggered.connect(self._call_help)
@@ -182,6 +203,8 @@ class NCacheManager(MayaQWidgetDockableMixin, QtWidgets.QWidget):
         self.nodetable.set_workspace(workspace)
         self.batchcacher.set_workspace(workspace)
         self.workspace_widget.set_workspace(workspace)
+        self.retention.set_workspace(workspace)
+        self.garbage_collector.set_workspace(workspace)
         self.nodetable.update_layout()
 
     def selection_changed(self):
@@ -237,6 +260,9 @@ class NCacheManager(MayaQWidgetDockableMixin, QtWidgets.QWidget):
     def sizeHint(self):
         return QtCore.QSize(350, 650)
 
+    def get_frame_range(self):
+        return self.cacheoptions.range
+
     def create_cache(self, selection=True):
         register_time_callback()
         if self.cacheoptions.verbose is True:
@@ -375,7 +401,8 @@ class NCacheManager(MayaQWidgetDockableMixin, QtWidgets.QWidget):
             return cmds.warning("no nodes selected")
 
         start_frame, end_frame = self.cacheoptions.range
-        cacheversions, processes = send_batch_ncache_jobs(
+        scene_options = self.batchcacher.scene_options
+        processes = send_batch_ncache_jobs(
             workspace=self.workspace,
             jobs=self.batchcacher.jobs,
             start_frame=start_frame,
@@ -385,9 +412,14 @@ class NCacheManager(MayaQWidgetDockableMixin, QtWidgets.QWidget):
             save_every_evaluation=self.cacheoptions.samples_recorded,
             playblast_viewport_options=self.playblast.viewport_options,
             timelimit=self.batchcacher.options.timelimit,
-            stretchmax=self.batchcacher.options.explosion_detection_tolerance)
-        self.processes.extend(processes)
-        for cacheversion, process in zip(cacheversions, processes):
+            stretchmax=self.batchcacher.options.explosion_detection_tolerance,
+            checkpoint_interval=scene_options.checkpoint_interval,
+            split_solvers=scene_options.split_solvers,
+            storage_format=scene_options.storage_format)
+        # a job panel by process, the solver groups of a cacheversion are
+        # cached by separated processes.
+        for cacheversion, process in processes:
+            self.processes.append(process)
             self.batch_monitor.add_job(cacheversion, process)
         self.batch_monitor.show()
         self.batchcacher.clear()
@@ -412,7 +444,8 @@ class NCacheManager(MayaQWidgetDockableMixin, QtWidgets.QWidget):
             return cmds.warning("no nodes selected")
 
         start_frame, end_frame = self.cacheoptions.range
-        cacheversions, processes = send_wedging_ncaches_jobs(
+        scene_options = self.batchcacher.scene_options
+        processes = send_wedging_ncaches_jobs(
             workspace=self.workspace,
             name=self.batchcacher.wedging_name,
             start_frame=start_frame,
@@ -424,9 +457,16 @@ class NCacheManager(MayaQWidgetDockableMixin, QtWidgets.QWidget):
             timelimit=self.batchcacher.options.timelimit,
             stretchmax=self.batchcacher.options.explosion_detection_tolerance,
             attribute=self.batchcacher.attribute,
-            values=self.batchcacher.wedging_values)
-        self.processes.extend(processes)
-        for cacheversion, process in zip(cacheversions, processes):
+            values=self.batchcacher.wedging_values,
+            snapshot=scene_options.snapshot,
+            bake_inputs=scene_options.bake_inputs,
+            checkpoint_interval=scene_options.checkpoint_interval,
+            split_solvers=scene_options.split_solvers,
+            storage_format=scene_options.storage_format)
+        # a job panel by process, the solver groups of a cacheversion are
+        # cached by separated processes.
+        for cacheversion, process in processes:
+            self.processes.append(process)
             self.batch_monitor.add_job(cacheversion, process)
         self.batch_monitor.show()
         self.nodetable.set_workspace(self.workspace)
@@ -0,0 +1,185 @@
+"""
+This module read and write the maya cache files (.mcc) without maya.
+The format is an IFF (FOR4) file. The sizes are stored in big endian 32 bits
+integers and every chunk is padded on 4 bytes.
+
+FOR4 <size> CACH        header block
+    VRSN <size> "0.1"
+    STIM <size> start time (in ticks)
+    ETIM <size> end time (in ticks)
+FOR4 <size> MYCH        data block (one per time for OneFile cache)
+    TIME <size> time (in ticks, only in OneFile cache)
+    CHNM <size> channel name
+    SIZE <size> elements count
+    FVCA <size> float vectors (or DVCA, FBCA, DBLA)
+    CHNM ...
+
+The module respect a nomenclature:
+    header: dict {'version': str, 'start': int, 'end': int}
+    channel: tuple (name, tag, values) where values is a flat array
+    block: tuple (time, channels), time is None for OneFilePerFrame cache
+"""
+
+import sys
+import mmap
+import struct
+from array import array
+
+
+ARRAY_TYPECODES = {
+    b'FVCA': 'f',
+    b'DVCA': 'd',
+    b'FBCA': 'f',
+    b'DBLA': 'd'}
+VECTOR_TAGS = b'FVCA', b'DVCA'
+IS_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+def padding(size):
+    return (4 - size % 4) % 4
+
+
+def array_from_bytes(typecode, data, swap=IS_LITTLE_ENDIAN):
+    values = array(typecode)
+    # Ensure compatibility Py2 and Py3
+    if hasattr(values, 'frombytes'):
+        values.frombytes(data)
+    else:
+        values.fromstring(data)
+    if swap:
+        values.byteswap()
+    return values
+
+
+def array_to_bytes(values, swap=IS_LITTLE_ENDIAN):
+    if swap:
+        values = array(values.typecode, values)
+        values.byteswap()
+    # Ensure compatibility Py2 and Py3
+    if hasattr(values, 'tobytes'):
+        return values.tobytes()
+    return values.tostring()
+
+
+def iter_chunks(data, offset=0, end=None):
+    end = len(data) if end is None else end
+    while offset < end:
+        tag, size = struct.unpack_from('>4sI', data, offset)
+        start = offset + 8
+        yield tag, start, size
+        offset = start + size + padding(size)
+
+
+def read_mcc(filename):
+    with open(filename, 'rb') as f:
+        data = f.read()
+    header = {}
+    blocks = []
+    for tag, start, size in iter_chunks(data):
+        if tag != b'FOR4':
+            raise ValueError('Unsupported mcc chunk {} in {}'.format(
+                tag, filename))
+        form = data[start:start + 4]
+        if form == b'CACH':
+            header = read_header(data, start + 4, start + size)
+        elif form == b'MYCH':
+            blocks.append(read_block(data, start + 4, start + size))
+    return header, blocks
+
+
+def index_mcc(filename):
+    """ Return the header and the location of the channels datas in the file
+    without reading them. The blocks are (time, [(name, tag, offset, count)])
+    where count is the number of values. It's used to memory map the frames.
+    """
+    with open(filename, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        header = {}
+        blocks = []
+        for tag, start, size in iter_chunks(data):
+            form = data[start:start + 4]
+            if form == b'CACH':
+                header = read_header(data, start + 4, start + size)
+            elif form == b'MYCH':
+                blocks.append(index_block(data, start + 4, start + size))
+    finally:
+        data.close()
+    return header, blocks
+
+
+def index_block(data, start, end):
+    time = None
+    channels = []
+    name = None
+    for tag, offset, size in iter_chunks(data, start, end):
+        if tag == b'TIME':
+            time = struct.unpack_from('>i', data, offset)[0]
+        elif tag == b'CHNM':
+            name = data[offset:offset + size].rstrip(b'\0').decode('ascii')
+        elif tag in ARRAY_TYPECODES:
+            itemsize = array(ARRAY_TYPECODES[tag]).itemsize
+            channels.append((name, tag, offset, size // itemsize))
+    return time, channels
+
+
+def read_header(data, start, end):
+    header = {}
+    for tag, offset, size in iter_chunks(data, start, end):
+        if tag == b'VRSN':
+            version = data[offset:offset + size].rstrip(b'\0')
+            header['version'] = version.decode('ascii')
+        elif tag == b'STIM':
+            header['start'] = struct.unpack_from('>i', data, offset)[0]
+        elif tag == b'ETIM':
+            header['end'] = struct.unpack_from('>i', data, offset)[0]
+    return header
+
+
+def read_block(data, start, end):
+    time = None
+    channels = []
+    name = None
+    for tag, offset, size in iter_chunks(data, start, end):
+        if tag == b'TIME':
+            time = struct.unpack_from('>i', data, offset)[0]
+        elif tag == b'CHNM':
+            name = data[offset:offset + size].rstrip(b'\0').decode('ascii')
+        elif tag in ARRAY_TYPECODES:
+            content = data[offset:offset + size]
+            values = array_from_bytes(ARRAY_TYPECODES[tag], content)
+            channels.append((name, tag, values))
+    return time, channels
+
+
+def build_chunk(tag, content):
+    return (
+        struct.pack('>4sI', tag, len(content)) + content +
+        b'\0' * padding(len(content)))
+
+
+def build_string_chunk(tag, string):
+    return build_chunk(tag, string.encode('ascii') + b'\0')
+
+
+def build_form(form, content):
+    return build_chunk(b'FOR4', form + content)
+
+
+def write_mcc(filename, header, blocks):
+    content = build_string_chunk(b'VRSN', header.get('version', '0.1'))
+    content += build_chunk(b'STIM', struct.pack('>i', header['start']))
+    content += build_chunk(b'ETIM', struct.pack('>i', header['end']))
+    data = [build_form(b'CACH', content)]
+    for time, channels in blocks:
+        content = b''
+        if time is not None:
+            content += build_chunk(b'TIME', struct.pack('>i', time))
+        for name, tag, values in channels:
+            count = len(values) // 3 if tag in VECTOR_TAGS else len(values)
+            content += build_string_chunk(b'CHNM', name)
+            content += build_chunk(b'SIZE', struct.pack('>I', count))
+            content += build_chunk(tag, array_to_bytes(values))
+        data.append(build_form(b'MYCH', content))
+    with open(filename, 'wb') as f:
+        f.write(b''.join(data))
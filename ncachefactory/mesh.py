@@ -1,3 +1,4 @@
+import os
 from maya import cmds, mel
 import maya.api.OpenMaya as om2
 
@@ -102,6 +103,22 @@ def attach_geo_cache(mesh, xml_file):
     mel.eval(command)
 
 
+def bake_mesh_to_geo_cache(mesh, directory, start_frame, end_frame):
+    """ Record the mesh deformation in a one file geometry cache and return
+    the xml description path.
+    """
+    name = mesh.split(':')[-1].split('|')[-1]
+    cmds.cacheFile(
+        fileName=name,
+        directory=directory,
+        points=mesh,
+        startTime=start_frame,
+        endTime=end_frame,
+        format='OneFile',
+        cacheFormat='mcc')
+    return os.path.join(directory, name + '.xml')
+
+
 def is_deformed_mesh_too_stretched(
         deformed_mesh, reference_mesh, tolerence_factor=2):
     """ This function compare a deformed mesh to a reference mesh and query if
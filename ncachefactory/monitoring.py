@@ -3,19 +3,25 @@ from math import ceil, sqrt
 from PySide2 import QtWidgets, QtGui, QtCore
 from maya import cmds
 
+from ncachefactory.batch import is_batch_job_resumable, resume_batch_job
 from ncachefactory.playblast import compile_movie
+from ncachefactory.cachediff import compare_cacheversions
 from ncachefactory.cachemanager import connect_cacheversion
 from ncachefactory.ncache import list_connected_cachefiles
-from ncachefactory.arrayutils import overlap_arrays_from_ranges, range_ranges
+from ncachefactory.optionvars import MAYAPY_PATH_OPTIONVAR
+from ncachefactory.preview import PreviewStrip
+from ncachefactory.arrayutils import range_ranges
 from ncachefactory.sequencereader import (
     SequenceImageReader, ImageViewer, SequenceStackedImagesReader,
-    ContactSheetImagesReader)
+    ContactSheetImagesReader, overlap_sequences, pixmap_cache)
 from ncachefactory.versioning import (
-    get_log_filename, list_tmp_jpeg_under_cacheversion)
+    CacheVersion, get_log_filename, list_tmp_jpeg_under_cacheversion)
+from ncachefactory.wedgeanalysis import analyse_wedge
 
 
 WINDOW_TITLE = "Batch cacher monitoring"
 CACHEVERSION_SELECTION_TITLE = "Select cache to compare"
+CACHEDIFF_TITLE = "Geometry difference with {}"
 
 
 class MultiCacheMonitor(QtWidgets.QWidget):
@@ -24,6 +30,7 @@ class MultiCacheMonitor(QtWidgets.QWidget):
         self.setWindowTitle(WINDOW_TITLE)
         self.comparators = []
         self.contact_sheet = []
+        self.cache_diffs = []
         self.tab_widget = QtWidgets.QTabWidget()
         self.tab_widget.setTabsClosable(True)
         self.tab_widget.tabCloseRequested.connect(self.tab_closed)
@@ -45,8 +52,12 @@ class MultiCacheMonitor(QtWidgets.QWidget):
         job_panel = JobPanel(cacheversion, process)
         job_panel.comparisonRequested.connect(self._call_comparison)
         job_panel.contactSheetRequested.connect(self._call_contact_sheet)
+        job_panel.resumeRequested.connect(self._call_resume)
+        job_panel.geometryDiffRequested.connect(self._call_geometry_diff)
+        job_panel.wedgeAnalysisRequested.connect(self._call_wedge_analysis)
         self.job_panels.append(job_panel)
-        self.tab_widget.addTab(job_panel, cacheversion.name)
+        name = cacheversion.name + job_panel.suffix
+        self.tab_widget.addTab(job_panel, name)
         self.tab_widget.setCurrentIndex(len(self.job_panels) - 1)
 
     def showEvent(self, *events):
@@ -72,8 +83,14 @@ class MultiCacheMonitor(QtWidgets.QWidget):
 
         if next(self.updater) is True:
             for job_panel in self.job_panels:
+                job_panel.update_status()
                 job_panel.update()
 
+    def _call_resume(self, job_panel):
+        cacheversion = CacheVersion(job_panel.cacheversion.directory)
+        process = resume_batch_job(cacheversion, job_panel.suffix)
+        self.add_job(cacheversion, process)
+
     def _call_comparison(self, job_panel):
         cacheversions = [jp.cacheversion for jp in self.job_panels]
         names = [cv.name for cv in cacheversions]
@@ -87,8 +104,8 @@ class MultiCacheMonitor(QtWidgets.QWidget):
         range1 = slider.minimum, slider.maximum_settable_value
         slider = job_panel2.images.slider
         range2 = slider.minimum, slider.maximum_settable_value
-        pixmaps1, pixmaps2 = overlap_arrays_from_ranges(
-            arrays=[job_panel.images._pixmaps, job_panel2.images._pixmaps],
+        pixmaps1, pixmaps2 = overlap_sequences(
+            sequences=[job_panel.images.sequence, job_panel2.images.sequence],
             ranges=[range1, range2])
         frames = range_ranges([range1, range2])
         comparator = SequenceStackedImagesReader(
@@ -100,6 +117,62 @@ class MultiCacheMonitor(QtWidgets.QWidget):
         comparator.show()
         self.comparators.append(comparator)
 
+    def _call_geometry_diff(self, job_panel):
+        cacheversions = [jp.cacheversion for jp in self.job_panels]
+        names = [cv.name for cv in cacheversions]
+        dialog = CacheVersionSelection(names=names, multiselection=True)
+        result = dialog.exec_()
+        if result == QtWidgets.QDialog.Rejected or dialog.indexes is None:
+            return
+        reference = job_panel.cacheversion
+        processes, executable = get_cache_diff_processes()
+        diffs = []
+        QtWidgets.QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
+        try:
+            for index in dialog.indexes:
+                cacheversion = CacheVersion(cacheversions[index].directory)
+                if cacheversion == reference:
+                    continue
+                node_diffs = compare_cacheversions(
+                    reference, cacheversion, processes=processes,
+                    executable=executable)
+                for node, diff in sorted(node_diffs.items()):
+                    diffs.append((cacheversion.name, node, diff))
+        finally:
+            QtWidgets.QApplication.restoreOverrideCursor()
+        window = CacheDiffWindow(reference.name, diffs, parent=self)
+        window.show()
+        self.cache_diffs.append(window)
+
+    def _call_wedge_analysis(self, job_panel):
+        cacheversions = [jp.cacheversion for jp in self.job_panels]
+        names = [cv.name for cv in cacheversions]
+        dialog = CacheVersionSelection(names=names, multiselection=True)
+        result = dialog.exec_()
+        if result == QtWidgets.QDialog.Rejected or dialog.indexes is None:
+            return
+        job_panels = [self.job_panels[i] for i in dialog.indexes]
+        QtWidgets.QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
+        try:
+            analyses = analyse_wedge([
+                CacheVersion(jp.cacheversion.directory) for jp in job_panels])
+        finally:
+            QtWidgets.QApplication.restoreOverrideCursor()
+        # only the representatives and the outliers are reviewed
+        reviewed = []
+        for jp in job_panels:
+            analysis = analyses[jp.cacheversion.name]
+            if analysis['representative'] or analysis['cluster'] is None:
+                key = analysis['cluster'] is None, analysis['cluster']
+                reviewed.append((key, jp, analysis))
+        if not reviewed:
+            return
+        reviewed = sorted(reviewed, key=lambda x: x[0])
+        names = [
+            format_wedge_analysis_name(jp.cacheversion.name, analysis)
+            for _, jp, analysis in reviewed]
+        self.show_contact_sheet([jp for _, jp, _ in reviewed], names)
+
     def _call_contact_sheet(self, job_panel):
         cacheversions = [jp.cacheversion for jp in self.job_panels]
         names = [cv.name for cv in cacheversions]
@@ -109,12 +182,15 @@ class MultiCacheMonitor(QtWidgets.QWidget):
             return
         job_panels = [self.job_panels[i] for i in dialog.indexes]
         names = [job_panel.cacheversion.name for job_panel in job_panels]
+        self.show_contact_sheet(job_panels, names)
+
+    def show_contact_sheet(self, job_panels, names):
         ranges = []
         for job_panel in job_panels:
             slider = job_panel.images.slider
             ranges.append([slider.minimum, slider.maximum_settable_value])
-        pixmap_lists = overlap_arrays_from_ranges(
-            arrays=[job_panel.images._pixmaps for job_panel in job_panels],
+        pixmap_lists = overlap_sequences(
+            sequences=[job_panel.images.sequence for job_panel in job_panels],
             ranges=ranges)
         contact_sheet = ContactSheetImagesReader(
             names=names,
@@ -127,12 +203,19 @@ class MultiCacheMonitor(QtWidgets.QWidget):
 class JobPanel(QtWidgets.QWidget):
     comparisonRequested = QtCore.Signal(object)
     contactSheetRequested = QtCore.Signal(object)
+    resumeRequested = QtCore.Signal(object)
+    geometryDiffRequested = QtCore.Signal(object)
+    wedgeAnalysisRequested = QtCore.Signal(object)
 
     def __init__(self, cacheversion, process, parent=None):
         super(JobPanel, self).__init__(parent)
         self.finished = False
+        self.resumed = False
+        self.terminated = False
         self.is_playing = False
         self.process = process
+        # the solver group jobs share the cacheversion with a suffix
+        self.suffix = getattr(process, 'suffix', '')
         self.cacheversion = cacheversion
         self.logfile = get_log_filename(cacheversion)
         self.imagepath = []
@@ -141,14 +224,27 @@ class JobPanel(QtWidgets.QWidget):
         endframe = cacheversion.infos['end_frame']
         self.images = SequenceImageReader(range_=[startframe, endframe])
         self.log = InteractiveLog(filepath=self.logfile)
+        # allow to preview the jobs recorded without playblast
+        self.preview = PreviewStrip()
+        self.preview.set_cacheversion(cacheversion)
+        self.status = QtWidgets.QLabel()
         self.connect_cache = QtWidgets.QPushButton('Connect cache')
         self.connect_cache.released.connect(self._call_connect_cache)
         self.connect_cache.setEnabled(False)
         self.kill_button = QtWidgets.QPushButton('Kill')
         self.kill_button.released.connect(self._call_kill)
+        self.resume = QtWidgets.QPushButton('Resume from checkpoint')
+        self.resume.setEnabled(False)
+        self.resume.released.connect(self._call_resume)
         self.compare = QtWidgets.QPushButton('Compare with')
         self.compare.setEnabled(False)
         self.compare.released.connect(self._call_compare)
+        self.geometry_diff = QtWidgets.QPushButton('Geometry difference with')
+        self.geometry_diff.setEnabled(False)
+        self.geometry_diff.released.connect(self._call_geometry_diff)
+        self.wedge_analysis = QtWidgets.QPushButton('Wedge analysis')
+        self.wedge_analysis.setEnabled(False)
+        self.wedge_analysis.released.connect(self._call_wedge_analysis)
         self.contactsheet = QtWidgets.QPushButton('Contact sheet')
         self.contactsheet.setEnabled(False)
         self.contactsheet.released.connect(self._call_contact_sheet)
@@ -159,10 +255,15 @@ class JobPanel(QtWidgets.QWidget):
         self.log_layout = QtWidgets.QVBoxLayout(self.log_widget)
         self.log_layout.setContentsMargins(0, 0, 0, 0)
         self.log_layout.setSpacing(2)
+        self.log_layout.addWidget(self.status)
         self.log_layout.addWidget(self.log)
+        self.log_layout.addWidget(self.preview)
         self.log_layout.addWidget(self.connect_cache)
         self.log_layout.addWidget(self.kill_button)
+        self.log_layout.addWidget(self.resume)
         self.log_layout.addWidget(self.compare)
+        self.log_layout.addWidget(self.geometry_diff)
+        self.log_layout.addWidget(self.wedge_analysis)
         self.log_layout.addWidget(self.contactsheet)
         self.log_layout.addWidget(self.playstop)
 
@@ -174,6 +275,25 @@ class JobPanel(QtWidgets.QWidget):
         self.layout.setContentsMargins(0, 0, 0, 0)
         self.layout.addWidget(self.splitter)
 
+    def update_status(self):
+        # the status of a terminated job doesn't change anymore, the files
+        # read by the poll and the resume check can be on a network drive.
+        if self.terminated is True:
+            return
+        # the poll is also used by the executor to launch the queued jobs.
+        self.terminated = self.process.poll() is not None
+        if self.terminated:
+            # the garbage collector can delete the jpegs of a dead job.
+            self.images.sequence.detach()
+        if self.terminated and not self.resumed:
+            resumable = is_batch_job_resumable(self.cacheversion, self.suffix)
+            self.resume.setEnabled(resumable)
+        status = getattr(self.process, 'status', None)
+        if status is None:
+            return
+        host = self.process.host
+        self.status.setText(status + (' on ' + host if host else ''))
+
     def update(self):
         if self.log.is_log_changed() is False or self.finished is True:
             return
@@ -185,11 +305,10 @@ class JobPanel(QtWidgets.QWidget):
             # has dead frames. Those checks stop the update in case of issue
             # forcing the new files to be add on next update.
             if jpeg not in self.imagepath and os.path.exists(jpeg):
-                pixmap = QtGui.QPixmap(jpeg)
-                if pixmap.isNull():
+                if pixmap_cache.get(jpeg) is None:
                     break
                 self.imagepath.append(jpeg)
-                self.images.add_pixmap(pixmap)
+                self.images.add_image(jpeg)
 
         if jpegs:
             # allow to use option which need at least one frame cached
@@ -199,12 +318,18 @@ class JobPanel(QtWidgets.QWidget):
                 self.playstop.setEnabled(True)
             if self.compare.isEnabled() is False:
                 self.compare.setEnabled(True)
+            if self.geometry_diff.isEnabled() is False:
+                self.geometry_diff.setEnabled(True)
             if self.contactsheet.isEnabled() is False:
                 self.contactsheet.setEnabled(True)
 
         if self.images.isfull() is True:
+            # the analysis needs the complete caches
+            self.wedge_analysis.setEnabled(True)
             self.finished = True
             self.images.finish()
+            # keep the frames, the files aren't referenced by any job anymore
+            self.images.sequence.detach()
             self.kill_button.setEnabled(False)
 
     def _call_connect_cache(self):
@@ -233,9 +358,20 @@ class JobPanel(QtWidgets.QWidget):
     def _call_compare(self):
         self.comparisonRequested.emit(self)
 
+    def _call_resume(self):
+        self.resumed = True
+        self.resume.setEnabled(False)
+        self.resumeRequested.emit(self)
+
     def _call_contact_sheet(self):
         self.contactSheetRequested.emit(self)
 
+    def _call_geometry_diff(self):
+        self.geometryDiffRequested.emit(self)
+
+    def _call_wedge_analysis(self):
+        self.wedgeAnalysisRequested.emit(self)
+
     def kill(self):
         if self.finished is True:
             return
@@ -253,14 +389,26 @@ class JobPanel(QtWidgets.QWidget):
         # edit the range at the current frame stop
         self.cacheversion.set_range(end_frame=start_frame + len(images))
         source = compile_movie(images)
+        # the images stay visible in the monitor and the comparators
+        self.images.sequence.detach()
         for image in images:
             os.remove(image)
+            pixmap_cache.discard(image)
         directory = self.cacheversion.directory
         destination = os.path.join(directory, os.path.basename(source))
         os.rename(source, destination)
         self.cacheversion.add_playblast(destination)
 
 
+def format_wedge_analysis_name(name, analysis):
+    if analysis['cluster'] is not None:
+        name += ' (cluster {}: {} versions)'.format(
+            analysis['cluster'], analysis['cluster_size'])
+    if analysis['flags']:
+        name += ' [{}]'.format(', '.join(analysis['flags']))
+    return name
+
+
 class InteractiveLog(QtWidgets.QWidget):
     def __init__(self, parent=None, filepath=''):
         super(InteractiveLog, self).__init__(parent)
@@ -325,6 +473,65 @@ class CacheVersionSelection(QtWidgets.QDialog):
         return indexes
 
 
+class CacheDiffWindow(QtWidgets.QWidget):
+    ''' Display the summary of the geometry differences by cacheversion and
+    node, and the values by frame of the selected row. '''
+    SUMMARY_HEADERS = (
+        'Version', 'Node', 'First divergence', 'Max RMS', 'Max displacement')
+    FRAME_HEADERS = 'Frame', 'RMS', 'Max displacement'
+
+    def __init__(self, reference, diffs, parent=None):
+        super(CacheDiffWindow, self).__init__(parent, QtCore.Qt.Tool)
+        self.setWindowTitle(CACHEDIFF_TITLE.format(reference))
+        self.diffs = diffs
+        self.summary = QtWidgets.QTableWidget(len(diffs), 5)
+        self.summary.setHorizontalHeaderLabels(self.SUMMARY_HEADERS)
+        mode = QtWidgets.QAbstractItemView.SelectRows
+        self.summary.setSelectionBehavior(mode)
+        self.summary.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        for row, (name, node, diff) in enumerate(diffs):
+            divergence = diff.first_divergence_frame
+            values = (
+                name, node, 'None' if divergence is None else str(divergence),
+                '{:.5f}'.format(diff.max_rms),
+                '{:.5f}'.format(diff.max_displacement))
+            for column, value in enumerate(values):
+                self.summary.setItem(
+                    row, column, QtWidgets.QTableWidgetItem(value))
+        self.summary.itemSelectionChanged.connect(self._call_row_changed)
+        self.frames = QtWidgets.QTableWidget(0, 3)
+        self.frames.setHorizontalHeaderLabels(self.FRAME_HEADERS)
+        self.frames.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+
+        self.layout = QtWidgets.QVBoxLayout(self)
+        self.layout.addWidget(self.summary)
+        self.layout.addWidget(self.frames)
+
+    def _call_row_changed(self):
+        rows = [index.row() for index in self.summary.selectedIndexes()]
+        if not rows:
+            return
+        diff = self.diffs[rows[0]][2]
+        self.frames.setRowCount(len(diff))
+        values = zip(diff.frames, diff.rms, diff.maximums)
+        for row, (frame, rms, maximum) in enumerate(values):
+            texts = str(frame), '{:.5f}'.format(rms), '{:.5f}'.format(maximum)
+            for column, text in enumerate(texts):
+                self.frames.setItem(
+                    row, column, QtWidgets.QTableWidgetItem(text))
+
+
+def get_cache_diff_processes():
+    ''' Return the pool size and the executable of the cache comparison. The
+    pool spawns mayapy, the current executable is maya itself in the
+    interactive session. The comparison stay in the current process if
+    mayapy isn't set. '''
+    mayapy = cmds.optionVar(query=MAYAPY_PATH_OPTIONVAR)
+    if not mayapy or not os.path.exists(mayapy):
+        return 1, None
+    return None, mayapy
+
+
 def kill_them_all_confirmation_dialog():
     message = (
         "Some caching processes still running, do you want to kill them all ?")
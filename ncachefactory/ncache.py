@@ -76,9 +76,16 @@ def record_ncache(
     return cache_nodes
 
 
-def append_ncache(nodes=None, evaluate_every_frame=1.0, save_every_evaluation=1):
+def append_ncache(
+        nodes=None, evaluate_every_frame=1.0, save_every_evaluation=1,
+        end_frame=None):
+    ''' Append the connected caches from the current time to the end_frame.
+    If no end_frame is given, the playback max is used.
+    '''
     nodes = nodes or cmds.ls(DYNAMIC_NODES)
     nodes = filter_invisible_nodes_for_manager(nodes)
+    if end_frame is None:
+        end_frame = cmds.playbackOptions(max=True, query=True)
     cmds.cacheFile(
         refresh=True,
         noBackup=True,
@@ -86,7 +93,7 @@ def append_ncache(nodes=None, evaluate_every_frame=1.0, save_every_evaluation=1)
         sampleMultiplier=save_every_evaluation,
         cacheableNode=nodes,
         startTime=cmds.currentTime(query=True),
-        endTime=cmds.playbackOptions(max=True, query=True))
+        endTime=end_frame)
 
 
 def import_ncache(node, filename, behavior=0):
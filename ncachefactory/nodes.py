@@ -11,13 +11,20 @@ from ncachefactory.mesh import (
     set_mesh_color, get_mesh_color, is_mesh_visible, is_mesh_visibility_locked,
     switch_meshes_visibilities)
 from ncachefactory.attributes import (
-    ensure_node_has_ncachemanager_tags, FILTERED_FOR_NCACHEMANAGER)
+    ensure_node_has_ncachemanager_tags, is_filtered_for_manager,
+    list_filtered_nodes_for_manager, FILTERED_FOR_NCACHEMANAGER)
+
+
+DYNAMIC_NODES_TYPES = 'hairSystem', 'nCloth'
 
 
 class DynamicNode(object):
     """this object is a model for the DynamicNodeTableView and his delegate.
     It's linked to a maya node and contain method and properties needed for
-    the table view"""
+    the table view. The maya queries are memoized to paint the table without
+    querying maya. The state is cleared by invalidate(), called by the setters
+    and the table callbacks. The node isn't tagged before it is cached or
+    filtered."""
     ENABLE_ATTRIBUTE = None
     TYPE = None
     ICONS = {'on': None, 'off': None, 'visible': None, 'hidden': None}
@@ -25,22 +32,38 @@ class DynamicNode(object):
     def __init__(self, nodename):
         if cmds.nodeType(nodename) != self.TYPE:
             raise ValueError('wrong node type, {} excepted'.format(self.TYPE))
-        ensure_node_has_ncachemanager_tags(nodename)
         dependnode = om2.MSelectionList().add(nodename).getDependNode(0)
         self._dagnode = om2.MFnDagNode(dependnode)
+        self._handle = om2.MObjectHandle(dependnode)
         self._color = None
+        self._state = {}
+
+    def _get_state(self, key, function):
+        if key not in self._state:
+            self._state[key] = function()
+        return self._state[key]
+
+    def invalidate(self):
+        self._state = {}
 
     @property
     def name(self):
         return self._dagnode.name()
 
+    @property
+    def is_valid(self):
+        ''' False if the maya node was deleted (e.g. new scene opened) '''
+        return self._handle.isValid()
+
     @property
     def parent(self):
-        return cmds.listRelatives(self.name, parent=True)[0].split(':')[-1]
+        return self._get_state('parent', lambda: cmds.listRelatives(
+            self.name, parent=True)[0].split(':')[-1])
 
     @property
     def is_cached(self):
-        return bool(cmds.listConnections(self.name + '.playFromCache'))
+        return self._get_state('is_cached', lambda: bool(
+            cmds.listConnections(self.name + '.playFromCache')))
 
     @property
     def cache_nodetype(self):
@@ -53,26 +76,33 @@ class DynamicNode(object):
 
     @property
     def locked(self):
-        plug = self.name + '.' + self.ENABLE_ATTRIBUTE
-        locked = cmds.getAttr(plug, lock=True)
-        return bool(cmds.listConnections(plug)) or locked
+        def query():
+            plug = self.name + '.' + self.ENABLE_ATTRIBUTE
+            locked = cmds.getAttr(plug, lock=True)
+            return bool(cmds.listConnections(plug)) or locked
+        return self._get_state('locked', query)
 
     @property
     def enable(self):
-        return bool(cmds.getAttr(self.name + '.' + self.ENABLE_ATTRIBUTE))
+        return self._get_state('enable', lambda: bool(
+            cmds.getAttr(self.name + '.' + self.ENABLE_ATTRIBUTE)))
 
     def switch(self):
         if self.locked:
             return
         value = not self.enable
         cmds.setAttr(self.name + '.' + self.ENABLE_ATTRIBUTE, value)
+        self.invalidate()
 
     @property
     def filtered(self):
-        return cmds.getAttr(self.name + '.' + FILTERED_FOR_NCACHEMANAGER)
+        return self._get_state(
+            'filtered', lambda: is_filtered_for_manager(self.name))
 
     def set_filtered(self, state):
+        ensure_node_has_ncachemanager_tags(self.name)
         cmds.setAttr(self.name + '.' + FILTERED_FOR_NCACHEMANAGER, state)
+        self.invalidate()
 
 
 class HairNode(DynamicNode):
@@ -86,10 +116,12 @@ class HairNode(DynamicNode):
 
     @property
     def color(self):
-        return cmds.getAttr(self.name + '.displayColor')[0]
+        return self._get_state('color', lambda: cmds.getAttr(
+            self.name + '.displayColor')[0])
 
     def set_color(self, red, green, blue):
         cmds.setAttr(self.name + '.displayColor', red, green, blue)
+        self.invalidate()
 
     def switch(self):
         if self.locked:
@@ -102,18 +134,23 @@ class HairNode(DynamicNode):
         else:
             value = 0
         cmds.setAttr(self.name + '.' + self.ENABLE_ATTRIBUTE, value)
+        self.invalidate()
 
     @property
     def visible(self):
-        return cmds.getAttr(self.name + '.solverDisplay')
+        return self._get_state('visible', lambda: cmds.getAttr(
+            self.name + '.solverDisplay'))
 
     @property
     def visibility_locked(self):
-        connections = cmds.listConnections(self.name + '.solverDisplay')
-        locked = cmds.getAttr(self.name + '.solverDisplay', lock=True)
-        return bool(connections) or locked
+        def query():
+            connections = cmds.listConnections(self.name + '.solverDisplay')
+            locked = cmds.getAttr(self.name + '.solverDisplay', lock=True)
+            return bool(connections) or locked
+        return self._get_state('visibility_locked', query)
 
     def set_visible(self, state):
+        self.invalidate()
         return cmds.setAttr(self.name + '.solverDisplay', state)
 
 
@@ -136,6 +173,10 @@ class ClothNode(DynamicNode):
     def reset_connections(self):
         self._in_mesh = None
         self._out_mesh = None
+        self.invalidate()
+
+    def invalidate(self):
+        super(ClothNode, self).invalidate()
         self._current_mesh = None
         self._color = None
 
@@ -199,15 +240,19 @@ class ClothNode(DynamicNode):
     def visible(self):
         if self.out_mesh is None:
             return False
-        return is_mesh_visible(self.out_mesh.name())
+        return self._get_state(
+            'visible', lambda: is_mesh_visible(self.out_mesh.name()))
 
     @property
     def visibility_locked(self):
         if not self.out_mesh or not self.in_mesh:
             return
-        in_mesh_locked = is_mesh_visibility_locked(self.in_mesh.name())
-        out_mesh_locked = is_mesh_visibility_locked(self.out_mesh.name())
-        return in_mesh_locked or out_mesh_locked
+
+        def query():
+            in_mesh_locked = is_mesh_visibility_locked(self.in_mesh.name())
+            out_mesh_locked = is_mesh_visibility_locked(self.out_mesh.name())
+            return in_mesh_locked or out_mesh_locked
+        return self._get_state('visibility_locked', query)
 
     def set_visible(self, state):
         if not self.out_mesh or not self.in_mesh or self.visibility_locked:
@@ -215,17 +260,26 @@ class ClothNode(DynamicNode):
         mesh_to_show = self.out_mesh if state else self.in_mesh
         mesh_to_hide = self.in_mesh if state else self.out_mesh
         switch_meshes_visibilities(mesh_to_show.name(), mesh_to_hide.name())
-        self._current_mesh = None
-        self._color = None
+        self.invalidate()
 
 
 def list_dynamic_nodes():
     return [
-        create_dynamic_node(n) for n in cmds.ls(type=('hairSystem', 'nCloth'))]
+        create_dynamic_node(n) for n in cmds.ls(type=DYNAMIC_NODES_TYPES)]
+
+
+def list_dynamic_nodes_names(filtered=True):
+    ''' Return the dynamic nodes names without creating the DynamicNode. The
+    nodes filtered for the manager are excluded if filtered is True. '''
+    nodes = cmds.ls(type=DYNAMIC_NODES_TYPES)
+    if filtered is False:
+        return nodes
+    excluded = set(list_filtered_nodes_for_manager())
+    return [node for node in nodes if node not in excluded]
 
 
 def filtered_dynamic_nodes():
-    return [n for n in list_dynamic_nodes() if not n.filtered]
+    return [create_dynamic_node(n) for n in list_dynamic_nodes_names()]
 
 
 def create_dynamic_node(nodename):
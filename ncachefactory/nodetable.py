@@ -3,16 +3,16 @@ from maya import cmds
 import maya.OpenMaya as om
 
 from ncachefactory.qtutils import get_icon
-from ncachefactory.nodes import filtered_dynamic_nodes, create_dynamic_node
+from ncachefactory.nodes import list_dynamic_nodes_names, create_dynamic_node
 from ncachefactory.cachemanager import filter_connected_cacheversions
-from ncachefactory.versioning import (
-    list_available_cacheversions, split_namespace_nodename)
 from ncachefactory.ncache import (
     DYNAMIC_NODES, clear_cachenodes, list_connected_cachefiles,
     list_connected_cacheblends)
 from ncachefactory.filtering import FilterDialog
+from ncachefactory.workspacewatcher import WorkspaceWatcher
 
 RANGE_CACHED_COLOR = "#44aa22"
+RANGE_SUBFRAME_CACHED_COLOR = "#88cc44"
 RANGE_NOT_CACHED_COLOR = "#333333"
 CURRENT_TIME_COLOR = "#CC5533"
 NUCLEUS_START_TIME_COLOR = "#363430"
@@ -23,8 +23,20 @@ FULL_UPDATE_REQUIRED_EVENTS = (
     om.MSceneMessage.kAfterRemoveReference,
     om.MSceneMessage.kAfterUnloadReference,
     om.MSceneMessage.kAfterCreateReference)
-UPDATE_LAYOUT_EVENTS = "playbackRangeChanged", "timeChanged"
+UPDATE_LAYOUT_EVENTS = "playbackRangeChanged",
+CACHED_RANGE_COLUMN = 5
 OM_DYNAMIC_NODES = om.MFn.kNCloth, om.MFn.kHairSystem
+OM_CACHE_NODES = om.MFn.kCacheFile, om.MFn.kCacheBlend
+MESH_PLUGS = 'outputMesh', 'inputMesh'
+# the visibility icon of a cloth reads these attributes of his meshes
+MESH_VISIBILITY_ATTRIBUTES = 'visibility', 'intermediateObject'
+MESH_VISIBILITY_MESSAGES = (
+    om.MNodeMessage.kAttributeSet |
+    om.MNodeMessage.kAttributeLocked |
+    om.MNodeMessage.kAttributeUnlocked |
+    om.MNodeMessage.kConnectionMade |
+    om.MNodeMessage.kConnectionBroken)
+EVENTS_FLUSH_DELAY = 50
 
 
 class DynamicNodesTableWidget(QtWidgets.QWidget):
@@ -36,9 +48,13 @@ class DynamicNodesTableWidget(QtWidgets.QWidget):
         self._workspace = None
         self._active_selection_callbacks = True
         self._callbacks = []
+        # attribute changed callbacks of the created dynamic nodes
+        self._nodes_callbacks = {}
         self._jobs = []
         self._filter = FilterDialog()
         self._filter.updateRequested.connect(self._full_update_callback)
+        self.events = EventBuffer(parent=self)
+        self.events.flushed.connect(self._flush_events)
         self.script_jobs = []
         self.versions = []
         self.table_model = DynamicNodeTableModel()
@@ -56,7 +72,14 @@ class DynamicNodesTableWidget(QtWidgets.QWidget):
         self.table_view.set_enable_delegate(self.table_enable)
         self.table_view.set_visibility_delegate(self.table_visibility)
         self.table_view.set_cacherange_delegate(self.table_cached_range)
-        self.table_model.set_nodes(filtered_dynamic_nodes())
+        self.table_model.nodeCreated.connect(self._register_node_callback)
+        self.table_model.nodeDiscarded.connect(self._unregister_node_callback)
+        self.table_model.set_node_names(list_dynamic_nodes_names())
+        self.watcher = WorkspaceWatcher(parent=self)
+        method = self.table_model.set_cacheversions
+        self.watcher.cacheversionsChanged.connect(method)
+        method = self._cacheversions_modified
+        self.watcher.cacheversionsModified.connect(method)
         self.table_toolbar = TableToolBar(self.table_view)
         self.table_toolbar.updateRequested.connect(self.update_layout)
         self.table_toolbar.showFilterRequested.connect(self._filter.show)
@@ -79,8 +102,7 @@ class DynamicNodesTableWidget(QtWidgets.QWidget):
 
     def set_workspace(self, workspace):
         self._workspace = workspace
-        cacheversions = list_available_cacheversions(self._workspace)
-        self.table_model.set_cacheversions(cacheversions)
+        self.watcher.set_workspace(workspace)
 
     def register_callbacks(self):
         if self._callbacks:
@@ -103,67 +125,175 @@ class DynamicNodesTableWidget(QtWidgets.QWidget):
             cb = om.MSceneMessage.addCallback(event, function)
             self._callbacks.append(cb)
 
-        function = self._synchronise_selection_from_maya
+        function = self._selection_changed_callback
         cb = om.MEventMessage.addEventCallback('SelectionChanged', function)
         self._callbacks.append(cb)
 
-        function = self.update_layout
+        function = self._layout_changed_callback
         cb = om.MNodeMessage.addNameChangedCallback(om.MObject(), function)
         self._callbacks.append(cb)
         for event in UPDATE_LAYOUT_EVENTS:
             job = cmds.scriptJob(event=[event, function])
             self._jobs.append(job)
+        # the time changes only move the current time marker
+        job = cmds.scriptJob(event=['timeChanged', self._time_changed])
+        self._jobs.append(job)
+        self._register_nodes_callbacks()
+        self.watcher.start()
+
+    def _register_nodes_callbacks(self):
+        self._unregister_nodes_callbacks()
+        for node in self.table_model.created_nodes:
+            self._register_node_callback(node)
+
+    def _register_node_callback(self, node):
+        # the nodes created before the show are registered with the others
+        if not self._callbacks or node in self._nodes_callbacks:
+            return
+        function = self._attribute_changed_callback
+        mobject = get_mobject(node.name)
+        cb = om.MNodeMessage.addAttributeChangedCallback(mobject, function)
+        callbacks = [cb]
+        # the meshes can be hidden or locked from the outliner or the viewport
+        function = self._mesh_attribute_changed_callback
+        names = 'in_mesh', 'out_mesh'
+        for mesh in [getattr(node, name, None) for name in names]:
+            if mesh is None:
+                continue
+            mobject = get_mobject(mesh.fullPathName())
+            cb = om.MNodeMessage.addAttributeChangedCallback(
+                mobject, function, node)
+            callbacks.append(cb)
+        self._nodes_callbacks[node] = callbacks
+
+    def _unregister_node_callback(self, node):
+        for callback in self._nodes_callbacks.pop(node, []):
+            om.MMessage.removeCallback(callback)
+
+    def _unregister_nodes_callbacks(self):
+        for callbacks in self._nodes_callbacks.values():
+            for callback in callbacks:
+                om.MMessage.removeCallback(callback)
+        self._nodes_callbacks = {}
 
     def unregister_callbacks(self):
         for callback in self._callbacks:
             om.MMessage.removeCallback(callback)
         self._callbacks = []
+        self._unregister_nodes_callbacks()
         for job in self._jobs:
             cmds.scriptJob(kill=job, force=True)
+        self._jobs = []
+        self.events.clear()
+        self.watcher.stop()
 
     def _remove_node_callback(self, mobject, *unused_callbacks_args):
         if mobject.apiType() not in OM_DYNAMIC_NODES:
             return
-        node = om.MFnDagNode(mobject).name()
-        dynamic_nodes = [n for n in self.table_model.nodes if n.name == node]
-        if not dynamic_nodes:
-            return
-        for dynamic_node in dynamic_nodes:
-            self.table_model.remove_node(dynamic_node)
+        name = om.MFnDagNode(mobject).name()
+        # the row is removed at the next flush, the node must not be
+        # queried until.
+        self.table_model.mark_removed(name)
+        self.events.post('removed', name)
 
     def _preconnection_made_callback(self, inplug, outplug, *unused_args):
-        for plug in (inplug, outplug):
-            name = plug.name()
-            if 'outputMesh' not in name and 'inputMesh' not in name:
-                continue
-            plug_node = om.MFnDagNode(plug.node()).name()
-            for node in self.table_model.nodes:
-                if node.name == plug_node:
-                    node.reset_connections()
-                    return
+        """ The connections and disconnections of the dynamic nodes and the
+        cache nodes invalidate the memoized states of the table. """
+        mobjects = inplug.node(), outplug.node()
+        nodes = [self.table_model.find_node(mobject) for mobject in mobjects]
+        nodes = [node for node in nodes if node is not None]
+        cache_connection = any(m.apiType() in OM_CACHE_NODES for m in mobjects)
+        if not nodes and not cache_connection:
+            return
+        plugs_names = inplug.name() + outplug.name()
+        if any(plug in plugs_names for plug in MESH_PLUGS):
+            for node in nodes:
+                node.reset_connections()
+        # a connection between cache nodes (e.g. cacheFile to cacheBlend)
+        # can change the caches of any node.
+        self._invalidate_nodes(None if cache_connection else nodes)
+
+    def _attribute_changed_callback(self, message, plug, *unused_args):
+        if not message & om.MNodeMessage.kAttributeSet:
+            return
+        node = self.table_model.find_node(plug.node())
+        if node is None:
+            return
+        self._invalidate_nodes([node])
+
+    def _mesh_attribute_changed_callback(
+            self, message, plug, unused_other_plug, node):
+        if not message & MESH_VISIBILITY_MESSAGES:
+            return
+        attribute = om.MFnAttribute(plug.attribute()).name()
+        if attribute in MESH_VISIBILITY_ATTRIBUTES:
+            self._invalidate_nodes([node])
+
+    def _invalidate_nodes(self, nodes=None):
+        self.table_model.invalidate(nodes)
+        self.table_cached_range.invalidate()
+        self.table_view.viewport().update()
 
     def _created_node_callback(self, mobject, *unused_callbacks_args):
         if mobject.apiType() not in OM_DYNAMIC_NODES:
             return
-        dynamic_node = create_dynamic_node(om.MFnDagNode(mobject).name())
-        self.table_model.insert_node(dynamic_node)
+        # the name is read at the flush, the node can be renamed meanwhile
+        self.events.post('created', om.MObjectHandle(mobject))
+
+    def _layout_changed_callback(self, *unused_callbacks_args):
+        self.events.post('layout')
+
+    def _selection_changed_callback(self, *unused_callbacks_args):
+        if self._active_selection_callbacks is False:
+            return
+        if not self.table_toolbar.interactive.isChecked():
+            return
+        self.events.post('selection')
+
+    def _flush_events(self, events):
+        """ Apply the events collected since the last flush. The layout update
+        and the full update list the nodes, they include the nodes created
+        and removed. """
+        if 'layout' in events:
+            self.update_layout()
+        elif 'created' in events or 'removed' in events:
+            added = [
+                om.MFnDagNode(handle.object()).name()
+                for handle in events.get('created', [])
+                if handle.isValid()]
+            self.table_model.update_node_names(
+                added=added, removed=events.get('removed'))
+        if 'selection' in events:
+            self._synchronise_selection_from_maya()
 
     def _full_update_callback(self, *unused_callbacks_args):
-        self.table_model.set_nodes(filtered_dynamic_nodes())
+        # the nodes are listed, the pending events are outdated
+        self.events.clear()
+        self.table_cached_range.invalidate()
+        self.table_model.set_node_names(list_dynamic_nodes_names())
         if not self._workspace:
             return
-        cacheversions = list_available_cacheversions(self._workspace)
-        self.table_model.set_cacheversions(cacheversions)
+        self.watcher.set_workspace(self._workspace)
 
-    def _synchronise_selection_from_maya(self, *unused_callbacks_args):
-        if self._active_selection_callbacks is False:
-            return
+    def _cacheversions_modified(self, *unused_signal_args):
+        self.table_model.invalidate()
+        self.table_cached_range.invalidate()
+        self.table_model.layoutChanged.emit()
+
+    def _time_changed(self, *unused_callbacks_args):
+        time = cmds.currentTime(query=True)
+        self.table_cached_range.set_current_time(time)
+        x = self.table_view.columnViewportPosition(CACHED_RANGE_COLUMN)
+        width = self.table_view.columnWidth(CACHED_RANGE_COLUMN)
+        height = self.table_view.viewport().height()
+        self.table_view.viewport().update(QtCore.QRect(x, 0, width, height))
+
+    def _synchronise_selection_from_maya(self):
         if not self.table_toolbar.interactive.isChecked():
             return
         self._active_selection_callbacks = False
         nodes = cmds.ls(selection=True, dag=True, type=DYNAMIC_NODES)
-        dynamic_nodes = [n for n in self.table_model.nodes if n.name in nodes]
-        rows = [self.table_model.nodes.index(n) for n in dynamic_nodes]
+        rows = self.table_model.find_rows(nodes)
         self.table_view.select_rows(rows)
         self._active_selection_callbacks = True
 
@@ -179,8 +309,13 @@ class DynamicNodesTableWidget(QtWidgets.QWidget):
         self._active_selection_callbacks = True
 
     def update_layout(self, *unused_callbacks_args):
+        # only the modified infos are reloaded
         for cacheversion in self.table_model.cacheversions:
-            cacheversion.update()
+            cacheversion.update_if_modified()
+        self.table_model.invalidate()
+        self.table_cached_range.invalidate()
+        # the nodes can be renamed
+        self.table_model.set_node_names(list_dynamic_nodes_names())
         self.table_model.layoutChanged.emit()
 
     def show(self):
@@ -219,8 +354,12 @@ class DynamicNodeTableView(QtWidgets.QTableView):
         self.setSortingEnabled(True)
         mode = QtWidgets.QHeaderView.ResizeToContents
         self.verticalHeader().hide()
-        self.verticalHeader().setSectionResizeMode(mode)
+        # fixed rows height and contents measured on the visible rows only,
+        # the nodes of the hidden rows aren't created.
+        self.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+        self.verticalHeader().setDefaultSectionSize(24)
         self.horizontalHeader().setSectionResizeMode(mode)
+        self.horizontalHeader().setResizeContentsPrecision(0)
         self.horizontalHeader().setStretchLastSection(True)
         self.setEditTriggers(QtWidgets.QAbstractItemView.AllEditTriggers)
 
@@ -246,7 +385,9 @@ class DynamicNodeTableView(QtWidgets.QTableView):
         if not indexes:
             return None
         indexes = [i for i in indexes if i.column() == 0]
-        return [self._model.data(i, QtCore.Qt.UserRole) for i in indexes]
+        nodes = [self._model.data(i, QtCore.Qt.UserRole) for i in indexes]
+        # the rows of the nodes deleted are empty until the next update
+        return [node for node in nodes if node is not None]
 
     def set_model(self, model):
         self.setModel(model)
@@ -258,17 +399,18 @@ class DynamicNodeTableView(QtWidgets.QTableView):
         self.selectionIsChanged.emit()
 
     def select_rows(self, rows):
-        self.blockSignals(True)
         if self._selection_model is None:
             return
-        self._selection_model.clearSelection()
-        flag = QtCore.QItemSelectionModel.Select
-        for row in range(self._model.rowCount()):
-            if row not in rows:
-                continue
-            for col in range(self._model.columnCount()):
-                index = self._model.index(row, col, QtCore.QModelIndex())
-                self._selection_model.select(index, flag)
+        self.blockSignals(True)
+        # the contiguous rows are selected as one range
+        selection = QtCore.QItemSelection()
+        last_column = self._model.columnCount() - 1
+        for first, last in group_consecutive_rows(rows):
+            selection.select(
+                self._model.index(first, 0, QtCore.QModelIndex()),
+                self._model.index(last, last_column, QtCore.QModelIndex()))
+        flag = QtCore.QItemSelectionModel.ClearAndSelect
+        self._selection_model.select(selection, flag)
         self.blockSignals(False)
         self.selectionIsChanged.emit()
 
@@ -286,50 +428,155 @@ class DynamicNodeTableView(QtWidgets.QTableView):
 
     def set_cacherange_delegate(self, item_delegate):
         self.cacherange_delegate = item_delegate
-        self.setItemDelegateForColumn(5, item_delegate)
+        self.setItemDelegateForColumn(CACHED_RANGE_COLUMN, item_delegate)
 
 
 class DynamicNodeTableModel(QtCore.QAbstractTableModel):
+    """ The model contains the nodes names, the DynamicNode are created when
+    a row is requested (painted or selected). The nodes states and the
+    connected caches names are memoized, the painting doesn't query maya.
+    They are cleared by invalidate().
+    The rows are indexed by name and the created nodes by MObjectHandle hash
+    code to find them without iterating the list in the maya callbacks. """
     HEADERS = "", "", "", "Node", "Cache(s)", "Range Cached", ""
+    nodeCreated = QtCore.Signal(object)
+    nodeDiscarded = QtCore.Signal(object)
 
     def __init__(self, parent=None):
         super(DynamicNodeTableModel, self).__init__(parent)
-        self.nodes = []
+        self.names = []
         self.cacheversions = []
+        self._reverse = False
+        # {node name: DynamicNode} created on demand
+        self._nodes = {}
+        # names of the nodes deleted in maya but still in the rows
+        self._removed = set()
+        # {node name: connected cache names}
+        self._cache_names = {}
+        # {node name: row}
+        self._rows = {}
+        # {handle hash code: node} and {node: handle hash code}
+        self._handles = {}
+        self._hash_codes = {}
 
     def columnCount(self, _=None):
         return len(self.HEADERS)
 
     def rowCount(self, _=None):
-        return len(self.nodes)
+        return len(self.names)
+
+    @property
+    def nodes(self):
+        ''' Create all the nodes, this is only used by the actions applied on
+        the whole table. '''
+        return [self.get_node(name) for name in self.names]
+
+    @property
+    def created_nodes(self):
+        return list(self._nodes.values())
 
-    def set_nodes(self, nodes):
+    def get_node(self, name):
+        node = self._nodes.get(name)
+        if node is not None:
+            return node
+        node = create_dynamic_node(name)
+        self._nodes[name] = node
+        hash_code = get_hash_code(get_mobject(name))
+        self._handles[hash_code] = node
+        self._hash_codes[node] = hash_code
+        self.nodeCreated.emit(node)
+        return node
+
+    def _discard_node(self, name):
+        node = self._nodes.pop(name, None)
+        self._cache_names.pop(name, None)
+        if node is None:
+            return
+        self._handles.pop(self._hash_codes.pop(node, None), None)
+        self.nodeDiscarded.emit(node)
+
+    def set_node_names(self, names):
+        """ Update the rows with the current dynamic nodes. The nodes already
+        created are kept if they still exist with the same name. """
+        names = sorted(names, reverse=self._reverse)
+        outdated = [
+            name for name, node in self._nodes.items()
+            if name not in names or not node.is_valid or node.name != name]
+        if names == self.names and not outdated and not self._removed:
+            return
         self.layoutAboutToBeChanged.emit()
-        self.nodes = nodes
+        for name in outdated:
+            self._discard_node(name)
+        self.names = names
+        self._removed = set()
+        self.update_rows()
         self.layoutChanged.emit()
 
-    def insert_node(self, node):
+    def update_node_names(self, added=None, removed=None):
+        ''' Add and remove rows in a single layout change '''
+        removed = set(removed or []) & set(self._rows)
+        names = [name for name in self.names if name not in removed]
+        existing = set(names)
+        added = [name for name in set(added or []) if name not in existing]
+        if not added and not removed:
+            return
         self.layoutAboutToBeChanged.emit()
-        self.nodes.append(node)
-        self.nodes = sorted(self.nodes, key=lambda x: x.name)
+        for name in removed:
+            self._discard_node(name)
+        self._removed -= removed
+        self.names = sorted(names + added, reverse=self._reverse)
+        self.update_rows()
         self.layoutChanged.emit()
 
+    def mark_removed(self, name):
+        ''' The node is deleted in maya, his row stays empty until it is
+        removed by update_node_names. '''
+        if name not in self._rows:
+            return
+        self._removed.add(name)
+        self._discard_node(name)
+
+    def update_rows(self):
+        self._rows = {name: row for row, name in enumerate(self.names)}
+
+    def find_node(self, mobject):
+        ''' Return the node created for the mobject or None '''
+        return self._handles.get(get_hash_code(mobject))
+
+    def find_rows(self, names):
+        return [self._rows[name] for name in names if name in self._rows]
+
+    def insert_node(self, name):
+        self.update_node_names(added=[name])
+
     def set_cacheversions(self, cacheversions):
         self.layoutAboutToBeChanged.emit()
         self.cacheversions = cacheversions
+        self._cache_names = {}
         self.layoutChanged.emit()
 
-    def remove_node(self, node):
-        self.layoutAboutToBeChanged.emit()
-        self.nodes.remove(node)
-        self.layoutChanged.emit()
+    def invalidate(self, nodes=None):
+        nodes = self.created_nodes if nodes is None else nodes
+        for node in nodes:
+            node.invalidate()
+            self._cache_names.pop(node.name, None)
+
+    def get_cache_names(self, node):
+        if node.name not in self._cache_names:
+            self._cache_names[node.name] = get_connected_cache_names(
+                node.name, self.cacheversions)
+        return self._cache_names[node.name]
+
+    def remove_node(self, name):
+        self.update_node_names(removed=[name])
 
     def sort(self, column, order):
         if column != 3:
             return
-        reverse_ = order == QtCore.Qt.AscendingOrder
+        self._reverse = order == QtCore.Qt.AscendingOrder
         self.layoutAboutToBeChanged.emit()
-        self.nodes = sorted(self.nodes, key=lambda x: x.name, reverse=reverse_)
+        self.names = sorted(self.names, reverse=self._reverse)
+        self.update_rows()
         self.layoutChanged.emit()
 
     def headerData(self, section, orientation, role):
@@ -342,12 +589,14 @@ class DynamicNodeTableModel(QtCore.QAbstractTableModel):
         if not index.isValid():
             return
         row, column = index.row(), index.column()
-        node = self.nodes[row]
+        if self.names[row] in self._removed:
+            return
+        node = self.get_node(self.names[row])
         if role == QtCore.Qt.DisplayRole:
             if column == 3:
                 return node.parent
             elif column == 4:
-                return get_connected_cache_names(node.name, self.cacheversions)
+                return self.get_cache_names(node)
         elif role == QtCore.Qt.UserRole:
             return node
         elif role == QtCore.Qt.TextAlignmentRole:
@@ -364,6 +613,8 @@ class ColorSquareDelegate(QtWidgets.QStyledItemDelegate):
 
     def paint(self, painter, option, index):
         dynamic_node = self._model.data(index, QtCore.Qt.UserRole)
+        if dynamic_node is None:
+            return
         left = option.rect.center().x() - 7
         top = option.rect.center().y() - 7
         rect = QtCore.QRect(left, top, 14, 14)
@@ -378,6 +629,8 @@ class ColorSquareDelegate(QtWidgets.QStyledItemDelegate):
 
     def createEditor(self, _, __, index):
         dynamic_node = self._model.data(index, QtCore.Qt.UserRole)
+        if dynamic_node is None:
+            return
         red, green, blue = map(float, cmds.colorEditor().split()[:3])
         if cmds.colorEditor(query=True, result=True) is False:
             return
@@ -425,6 +678,8 @@ class SwitcherDelegate(QtWidgets.QStyledItemDelegate):
 
     def paint(self, painter, option, index):
         dynamic_node = self._model.data(index, QtCore.Qt.UserRole)
+        if dynamic_node is None:
+            return
         icon = self.get_icon(dynamic_node)
         pixmap = icon.pixmap(24, 24).scaled(
             QtCore.QSize(*self.ICONSIZE),
@@ -462,6 +717,8 @@ class VisibilityDelegate(SwitcherDelegate):
 
     def createEditor(self, _, __, index):
         dynamic_node = self._model.data(index, QtCore.Qt.UserRole)
+        if dynamic_node is None:
+            return
         state = not dynamic_node.visible
         dynamic_node.set_visible(state)
         return
@@ -478,6 +735,8 @@ class EnableDelegate(SwitcherDelegate):
 
     def createEditor(self, _, __, index):
         dynamic_node = self._model.data(index, QtCore.Qt.UserRole)
+        if dynamic_node is None:
+            return
         dynamic_node.switch()
         return
 
@@ -496,50 +755,94 @@ class EnableDelegate(SwitcherDelegate):
 
 class CachedRangeDelegate(QtWidgets.QStyledItemDelegate):
     """ this is an informative delegate (not interaction possible).
-    It draws a bar who represents the current maya timeline. The green part
-    represent the cached frames. The red line is the current time.
+    It draws a bar who represents the current maya timeline. The green parts
+    represent the runs of cached frames saved in the cacheversion infos, the
+    light green parts are sampled by sub-frames. The red line is the current
+    time. The coverages are kept until invalidate() is called, a time change
+    only query the current time and the nucleus start frames once.
     """
     def __init__(self, table):
         super(CachedRangeDelegate, self).__init__(table)
         self._model = table.model()
+        self.current_time = None
+        # {node name: frames runs or None}
+        self._coverages = {}
+        self._scene_range = None
+        self._nucleus_times = None
+
+    def invalidate(self):
+        self._coverages = {}
+        self._scene_range = None
+        self._nucleus_times = None
+        self.current_time = None
+
+    def set_current_time(self, time):
+        self.current_time = time
+        # the start frames can be keyed or edited during the playback
+        self._nucleus_times = None
+
+    def get_scene_range(self):
+        if self._scene_range is None:
+            self._scene_range = (
+                cmds.playbackOptions(query=True, minTime=True),
+                cmds.playbackOptions(query=True, maxTime=True))
+        return self._scene_range
+
+    def get_nucleus_times(self):
+        if self._nucleus_times is None:
+            self._nucleus_times = [
+                cmds.getAttr(nucleus + '.startFrame')
+                for nucleus in cmds.ls(type='nucleus')]
+        return self._nucleus_times
+
+    def get_coverage(self, dynamic_node):
+        if dynamic_node.name in self._coverages:
+            return self._coverages[dynamic_node.name]
+        cacheversions = filter_connected_cacheversions(
+            dynamic_node.name, self._model.cacheversions)
+        coverage = None
+        if cacheversions and not len(cacheversions) > 1:
+            coverage = cacheversions[0].get_coverage(dynamic_node.name)
+        self._coverages[dynamic_node.name] = coverage
+        return coverage
 
     def paint(self, painter, option, index):
         dynamic_node = self._model.data(index, QtCore.Qt.UserRole)
-        _, node = split_namespace_nodename(dynamic_node.name)
-        cacheversions = self._model.cacheversions
-        cacheversions = filter_connected_cacheversions(
-            dynamic_node.name, cacheversions)
-
-        scenestart = cmds.playbackOptions(query=True, minTime=True)
-        sceneend = cmds.playbackOptions(query=True, maxTime=True)
+        if dynamic_node is None:
+            return
+        coverage = self.get_coverage(dynamic_node)
+        scenestart, sceneend = self.get_scene_range()
         bg_rect = QtCore.QRect(
             option.rect.left() + 8,
             option.rect.top() + 8,
             option.rect.width() - 16,
             option.rect.height() - 16)
 
-        if cacheversions and not len(cacheversions) > 1:
-            cachedstart, cachedend = cacheversions[0].infos["nodes"][node]["range"]
-            invalue = percent(cachedstart, scenestart, sceneend)
-            outvalue = percent(cachedend, scenestart, sceneend)
+        if coverage is not None:
             brush = QtGui.QBrush(QtGui.QColor(RANGE_NOT_CACHED_COLOR))
             pen = QtGui.QPen(QtGui.QColor(0, 0, 0, 0))
             painter.setPen(pen)
             painter.setBrush(brush)
             painter.drawRect(bg_rect)
-            if outvalue != invalue:
+            for cachedstart, cachedend, step in coverage:
+                if cachedend < scenestart or cachedstart > sceneend:
+                    continue
+                invalue = percent(cachedstart, scenestart, sceneend)
+                outvalue = percent(cachedend, scenestart, sceneend)
                 left = from_percent(invalue, bg_rect.left(), bg_rect.right())
                 right = from_percent(outvalue, bg_rect.left(), bg_rect.right())
-                top = bg_rect.top()
-                height = bg_rect.height()
-                cached_rect = QtCore.QRect(left, top, right, height)
-                cached_rect.setRight(right)
-                brush = QtGui.QBrush(QtGui.QColor(RANGE_CACHED_COLOR))
-                painter.setBrush(brush)
+                # the single frames are drawn at least one pixel wide
+                width = max(int(right - left), 1)
+                cached_rect = QtCore.QRect(
+                    int(left), bg_rect.top(), width, bg_rect.height())
+                subframe = 0 < step < 1
+                color = (
+                    RANGE_SUBFRAME_CACHED_COLOR if subframe
+                    else RANGE_CACHED_COLOR)
+                painter.setBrush(QtGui.QBrush(QtGui.QColor(color)))
                 painter.drawRect(cached_rect)
 
-        for nucleus in cmds.ls(type='nucleus'):
-            time = cmds.getAttr(nucleus + '.startFrame')
+        for time in self.get_nucleus_times():
             if time < scenestart or time > sceneend:
                 continue
             left = percent(time, scenestart, sceneend)
@@ -549,7 +852,9 @@ class CachedRangeDelegate(QtWidgets.QStyledItemDelegate):
             painter.setPen(pen)
             painter.drawLine(left, option.rect.top(), left, option.rect.bottom())
 
-        time = cmds.currentTime(query=True)
+        if self.current_time is None:
+            self.current_time = cmds.currentTime(query=True)
+        time = self.current_time
         if time > scenestart and time < sceneend:
             left = percent(time, scenestart, sceneend)
             left = from_percent(left, bg_rect.left(), bg_rect.right())
@@ -562,6 +867,60 @@ class CachedRangeDelegate(QtWidgets.QStyledItemDelegate):
         return QtCore.QSize(60, 22)
 
 
+class EventBuffer(QtCore.QObject):
+    """ Collect the maya events and emit them together. A burst of events
+    (e.g. a reference import creating hundreds of nodes) results in a single
+    update of the table. The first event posted starts a single shot timer
+    which flushes the events: {event name: [values posted]}. """
+    flushed = QtCore.Signal(dict)
+
+    def __init__(self, delay=EVENTS_FLUSH_DELAY, parent=None):
+        super(EventBuffer, self).__init__(parent)
+        self.events = {}
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self.flush)
+
+    def post(self, event, value=None):
+        self.events.setdefault(event, []).append(value)
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def flush(self):
+        self.timer.stop()
+        events, self.events = self.events, {}
+        if events:
+            self.flushed.emit(events)
+
+    def clear(self):
+        self.timer.stop()
+        self.events = {}
+
+
+def get_mobject(name):
+    selection = om.MSelectionList()
+    selection.add(name)
+    mobject = om.MObject()
+    selection.getDependNode(0, mobject)
+    return mobject
+
+
+def get_hash_code(mobject):
+    return om.MObjectHandle(mobject).hashCode()
+
+
+def group_consecutive_rows(rows):
+    ''' Return the rows as list of (first, last) ranges '''
+    ranges = []
+    for row in sorted(set(rows)):
+        if ranges and ranges[-1][1] == row - 1:
+            ranges[-1][1] = row
+        else:
+            ranges.append([row, row])
+    return [tuple(row_range) for row_range in ranges]
+
+
 def percent(value, rangein=0, rangeout=100):
     if value < rangein:
         return 0
@@ -13,6 +13,18 @@ except BaseException:
 _current_dir = os.path.dirname(os.path.realpath(__file__))
 CONFIGFILE_PATH = os.path.join(_current_dir, '..', 'config.cfg')
 
+BATCH_BAKE_INPUTS_OPTIONVAR = 'ncachefactory_batch_bake_inputs'
+BATCH_CHECKPOINT_INTERVAL_OPTIONVAR = 'ncachefactory_batch_checkpoint_interval'
+BATCH_COMMAND_TEMPLATE_OPTIONVAR = 'ncachefactory_batch_command_template'
+BATCH_EXECUTOR_OPTIONVAR = 'ncachefactory_batch_executor'
+BATCH_FARM_COMMAND_OPTIONVAR = 'ncachefactory_batch_farm_command'
+BATCH_FARM_RESOURCES_OPTIONVAR = 'ncachefactory_batch_farm_resources'
+BATCH_FARM_CHAINED_OPTIONVAR = 'ncachefactory_batch_farm_chained'
+BATCH_HOSTS_OPTIONVAR = 'ncachefactory_batch_hosts'
+BATCH_SLOTS_OPTIONVAR = 'ncachefactory_batch_slots'
+BATCH_SNAPSHOT_OPTIONVAR = 'ncachefactory_batch_snapshot'
+BATCH_SPLIT_SOLVERS_OPTIONVAR = 'ncachefactory_batch_split_solvers'
+BATCH_STORAGE_FORMAT_OPTIONVAR = 'ncachefactory_batch_storage_format'
 CACHE_BEHAVIOR_OPTIONVAR = 'ncachefactory_behavior'
 CACHEVERSION_SORTING_TYPE_OPTIONVAR = 'ncachefactory_cacherversion_sorting_type'
 COMPARISON_EXP_OPTIONVAR = 'ncachefactory_comparison_expanded'
@@ -30,6 +42,9 @@ PLAYBLAST_CAMERA_SELECTION_TYPE = 'ncachefactory_camera_selection_type'
 PLAYBLAST_EXP_OPTIONVAR = 'ncachefactory_playblast_expanded'
 RANGETYPE_OPTIONVAR = 'ncachefactory_rangetype'
 RECORD_PLAYBLAST_OPTIONVAR = 'ncachefactory_record_playblast'
+RETENTION_KEEP_LAST_OPTIONVAR = 'ncachefactory_retention_keep_last'
+RETENTION_KEEP_STARRED_OPTIONVAR = 'ncachefactory_retention_keep_starred'
+RETENTION_QUOTA_OPTIONVAR = 'ncachefactory_retention_quota'
 SAMPLES_EVALUATED_OPTIONVAR = 'ncachefactory_samples_evaluated'
 SAMPLES_SAVED_OPTIONVAR = 'ncachefactory_samples_saved'
 TIMELIMIT_ENABLED_OPTIONVAR = 'ncachefactory_timelimit_enabled'
@@ -40,6 +55,18 @@ VERSION_EXP_OPTIONVAR = 'ncachefactory_version_expanded'
 WORKSPACES_RECENTLY_USED_OPTIONVAR = 'ncachefactory_recent_workspaces_used'
 
 OPTIONVARS = {
+    BATCH_BAKE_INPUTS_OPTIONVAR: 0,
+    BATCH_CHECKPOINT_INTERVAL_OPTIONVAR: 0,
+    BATCH_COMMAND_TEMPLATE_OPTIONVAR: '{command}',
+    BATCH_EXECUTOR_OPTIONVAR: 0,
+    BATCH_FARM_COMMAND_OPTIONVAR: '',
+    BATCH_FARM_RESOURCES_OPTIONVAR: '',
+    BATCH_FARM_CHAINED_OPTIONVAR: 0,
+    BATCH_HOSTS_OPTIONVAR: '',
+    BATCH_SLOTS_OPTIONVAR: 0,
+    BATCH_SNAPSHOT_OPTIONVAR: 0,
+    BATCH_SPLIT_SOLVERS_OPTIONVAR: 0,
+    BATCH_STORAGE_FORMAT_OPTIONVAR: 0,
     CACHE_BEHAVIOR_OPTIONVAR: 0,
     CACHEOPTIONS_EXP_OPTIONVAR: 0,
     CACHEVERSION_SORTING_TYPE_OPTIONVAR: 0,
@@ -57,6 +84,9 @@ OPTIONVARS = {
     PLAYBLAST_EXP_OPTIONVAR: 0,
     RANGETYPE_OPTIONVAR: 0,
     RECORD_PLAYBLAST_OPTIONVAR: 1,
+    RETENTION_KEEP_LAST_OPTIONVAR: 0,
+    RETENTION_KEEP_STARRED_OPTIONVAR: 1,
+    RETENTION_QUOTA_OPTIONVAR: 0.0,
     SAMPLES_EVALUATED_OPTIONVAR: 1.0,
     SAMPLES_SAVED_OPTIONVAR: 1,
     TIMELIMIT_ENABLED_OPTIONVAR: 0,
@@ -29,7 +29,10 @@ _blasted_images = []
 
 def start_playblast_record(
         directory, camera='perspShape', width=1024, height=748,
-        viewport_display_values=None):
+        viewport_display_values=None, images=None):
+    ''' images is a list of images already rendered to include in the movie.
+    It's used to resume a playblast interrupted.
+    '''
     for cam in cmds.ls(type="camera"):
         cmds.setAttr(cam + '.renderable', cam == camera)
     # the current global render settings are backup to be reset at the end of
@@ -45,6 +48,8 @@ def start_playblast_record(
     cmds.setAttr(attribute, 0.375, 0.375, 0.375, type="double3")
     cmds.workspace(fileRule=['images', directory])
 
+    global _blasted_images
+    _blasted_images = list(images or [])
     global _registered_callback_function
     _registered_callback_function = partial(shoot_frame, camera, width, height)
     add_to_time_callback(_registered_callback_function)
@@ -56,7 +61,9 @@ def shoot_frame(camera, width, height):
     cmds.setAttr("defaultRenderGlobals.endFrame", frame)
     image = cmds.ogsRender(width=width, height=height)
     global _blasted_images
-    _blasted_images.append(image)
+    # a resumed record can render again frames already rendered
+    if image not in _blasted_images:
+        _blasted_images.append(image)
 
 
 def stop_playblast_record(directory):
@@ -127,12 +134,28 @@ def list_render_filter_options():
     return zip(keys, values)
 
 
+def get_ffmpeg_path():
+    return cmds.optionVar(query=FFMPEG_PATH_OPTIONVAR)
+
+
+def open_movie_stream(output, ffmpeg, framerate=24):
+    """ Start an ffmpeg process writing the jpeg images sent to his stdin in
+    an mp4 video. The images are copied like in compile_movie, no temporary
+    files are written. ffmpeg is the executable path, it's given because the
+    stream can be fed from a thread where maya commands can't be called.
+    """
+    arguments = [
+        ffmpeg, "-y", "-f", "image2pipe", "-framerate", str(framerate),
+        "-codec:v", "mjpeg", "-i", "-", "-codec", "copy", output]
+    return subprocess.Popen(arguments, stdin=subprocess.PIPE)
+
+
 def compile_movie(images):
     """ this function an mp4 video from the jpgeg given. In the same folder.
     The jpeg filenames pattern must finish by ".%6d.jpg" to be understood by
     the function
     """
-    ffmpeg = cmds.optionVar(query=FFMPEG_PATH_OPTIONVAR)
+    ffmpeg = get_ffmpeg_path()
     output = images[0][:-11] + ".mp4"
     # this line analyse the filename given and build a filename expression
     # understood by FFMMPEG. %6d mean 6 digit frame number.
@@ -0,0 +1,301 @@
+"""
+This module render previews of a cacheversion without playblast. The cached
+positions are splatted as points with an orthographic projection. The caches
+doesn't contain the topology, the wireframe can't be drawn.
+A preview is a png strip of few thumbnails sampled on the cached range, saved
+in the cacheversion folder and registered in the infos:
+    'preview': {
+        'filename': 'path to png',
+        'frames': [1.0, 15.0, ...],
+        'view': 'front',
+        'time': 65000}
+The rendering doesn't need maya, it is done in a mayapy worker process (see
+script/render_cacheversion_preview.py) to not freeze the interface.
+"""
+
+import os
+import math
+import time
+import zlib
+import struct
+import subprocess
+
+from maya import cmds
+from PySide2 import QtWidgets, QtGui, QtCore
+
+from ncachefactory.cachediff import (
+    list_cache_frames, load_positions, read_time_per_frame)
+from ncachefactory.environment import get_environment
+from ncachefactory.optionvars import MAYAPY_PATH_OPTIONVAR
+from ncachefactory.versioning import find_file_match, load_json
+from ncachefactory.wedgeanalysis import sample_indexes
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+_CURRENTDIR = os.path.dirname(os.path.realpath(__file__))
+_SCRIPT_FILENAME = 'render_cacheversion_preview.py'
+_SCRIPT_FILEPATH = os.path.join(_CURRENTDIR, '..', 'script', _SCRIPT_FILENAME)
+
+PREVIEW_FILENAME = 'preview.png'
+PREVIEW_FRAMES = 8
+THUMBNAIL_SIZE = 128
+# horizontal and vertical axis of the orthographic views
+VIEWS = {'front': (0, 1), 'side': (2, 1), 'top': (0, 2)}
+BACKGROUND_VALUE = 40
+SEPARATOR_VALUE = 0
+MARGIN = 4
+# number of points in a pixel to reach the full intensity
+SATURATION = 4
+
+
+def write_png(filename, pixels):
+    ''' Write a 8 bits grayscale png. pixels is a list of rows of values or
+    a 2d numpy array of uint8 '''
+    height = len(pixels)
+    width = len(pixels[0])
+    rows = b''.join(b'\x00' + bytes(bytearray(row)) for row in pixels)
+
+    def chunk(tag, data):
+        crc = struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+        return struct.pack('>I', len(data)) + tag + data + crc
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)
+    with open(filename, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', header))
+        f.write(chunk(b'IDAT', zlib.compress(rows)))
+        f.write(chunk(b'IEND', b''))
+
+
+def compute_view_bounds(points_list, axes):
+    ''' Return the min and max of the projected points on both axes '''
+    minimums = [float('inf'), float('inf')]
+    maximums = [float('-inf'), float('-inf')]
+    for points in points_list:
+        for i, axis in enumerate(axes):
+            values = points[axis::3]
+            if numpy is not None:
+                values = values[numpy.isfinite(values)]
+                if not len(values):
+                    continue
+                minimum, maximum = float(values.min()), float(values.max())
+            else:
+                values = [v for v in values if not math.isinf(v) and v == v]
+                if not values:
+                    continue
+                minimum, maximum = min(values), max(values)
+            minimums[i] = min(minimums[i], minimum)
+            maximums[i] = max(maximums[i], maximum)
+    return minimums, maximums
+
+
+def rasterize_points(points, bounds, axes, size=THUMBNAIL_SIZE):
+    """ Splat the points in a square thumbnail. The points is a flat list of
+    positions. The bounds are fitted in the thumbnail keeping the aspect
+    ratio. Return the rows of pixels values.
+    """
+    minimums, maximums = bounds
+    extent = max(maximums[0] - minimums[0], maximums[1] - minimums[1]) or 1.0
+    scale = (size - 1 - 2 * MARGIN) / extent
+    # center the bounds in the thumbnail
+    offsets = [
+        (size - 1 - (maximums[i] - minimums[i]) * scale) / 2 for i in (0, 1)]
+
+    if numpy is not None:
+        points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 3)
+        points = points[numpy.isfinite(points).all(axis=1)]
+        u = (points[:, axes[0]] - minimums[0]) * scale + offsets[0]
+        v = (points[:, axes[1]] - minimums[1]) * scale + offsets[1]
+        # the image rows go down
+        v = size - 1 - v
+        u = numpy.round(u).astype(numpy.int64)
+        v = numpy.round(v).astype(numpy.int64)
+        inside = (u >= 0) & (u < size) & (v >= 0) & (v < size)
+        density = numpy.bincount(
+            v[inside] * size + u[inside], minlength=size * size)
+        intensity = numpy.minimum(density / float(SATURATION), 1.0)
+        pixels = BACKGROUND_VALUE + intensity * (255 - BACKGROUND_VALUE)
+        return pixels.astype(numpy.uint8).reshape(size, size)
+
+    density = [0] * (size * size)
+    for i in range(0, len(points), 3):
+        x, y = points[i + axes[0]], points[i + axes[1]]
+        if math.isinf(x) or math.isinf(y) or x != x or y != y:
+            continue
+        u = int(round((x - minimums[0]) * scale + offsets[0]))
+        v = int(round(size - 1 - ((y - minimums[1]) * scale + offsets[1])))
+        if 0 <= u < size and 0 <= v < size:
+            density[v * size + u] += 1
+    values = [
+        int(BACKGROUND_VALUE + min(d / float(SATURATION), 1.0) *
+            (255 - BACKGROUND_VALUE))
+        for d in density]
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+
+def join_thumbnails(thumbnails):
+    ''' Concatenate the thumbnails horizontally with a separator column '''
+    if numpy is not None:
+        separator = numpy.full(
+            (len(thumbnails[0]), 1), SEPARATOR_VALUE, dtype=numpy.uint8)
+        columns = [thumbnails[0]]
+        for thumbnail in thumbnails[1:]:
+            columns.extend((separator, thumbnail))
+        return numpy.hstack(columns)
+    rows = []
+    for row_index in range(len(thumbnails[0])):
+        row = []
+        for thumbnail in thumbnails:
+            if row:
+                row.append(SEPARATOR_VALUE)
+            row.extend(int(value) for value in thumbnail[row_index])
+        rows.append(row)
+    return rows
+
+
+def render_preview(
+        xml_files, filename, frames_count=PREVIEW_FRAMES, size=THUMBNAIL_SIZE,
+        view='front'):
+    """ Render a preview strip of the caches. All the caches share the same
+    bounds to keep the relative motions visible. Return the frames rendered.
+    """
+    caches = [list_cache_frames(xml_file) for xml_file in xml_files]
+    times = sorted(set(time_ for frames in caches for time_ in frames))
+    if not times:
+        return []
+    times = [times[i] for i in sample_indexes(len(times), frames_count)]
+    points_list = []
+    for time_ in times:
+        points = [
+            load_positions(frames[time_]) for frames in caches
+            if time_ in frames]
+        if numpy is not None:
+            points_list.append(numpy.concatenate(points))
+        else:
+            points_list.append([value for p in points for value in p])
+
+    axes = VIEWS[view]
+    bounds = compute_view_bounds(points_list, axes)
+    if math.isinf(bounds[0][0]):
+        # no finite position
+        bounds = [0.0, 0.0], [1.0, 1.0]
+    thumbnails = [
+        rasterize_points(points, bounds, axes, size)
+        for points in points_list]
+    write_png(filename, join_thumbnails(thumbnails))
+    time_per_frame = float(read_time_per_frame(xml_files[0]))
+    return [time_ / time_per_frame for time_ in times]
+
+
+def render_cacheversion_preview(
+        cacheversion, frames_count=PREVIEW_FRAMES, size=THUMBNAIL_SIZE,
+        view='front'):
+    nodes = sorted(cacheversion.infos.get('nodes', {}))
+    xml_files = [
+        find_file_match(node, cacheversion, extension='xml')
+        for node in nodes]
+    xml_files = [xml_file for xml_file in xml_files if xml_file]
+    if not xml_files:
+        return
+    filename = os.path.join(cacheversion.directory, PREVIEW_FILENAME)
+    frames = render_preview(xml_files, filename, frames_count, size, view)
+    if not frames:
+        return
+    preview = {
+        'filename': filename,
+        'frames': frames,
+        'view': view,
+        'time': time.time()}
+    cacheversion.set_preview(preview)
+    return preview
+
+
+def launch_preview_worker(
+        cacheversion, frames_count=PREVIEW_FRAMES, size=THUMBNAIL_SIZE,
+        view='front'):
+    ''' Render the preview in a mayapy process and return the process '''
+    arguments = [
+        cmds.optionVar(query=MAYAPY_PATH_OPTIONVAR), _SCRIPT_FILEPATH,
+        cacheversion.directory, '--frames', str(frames_count),
+        '--size', str(size), '--view', view]
+    return subprocess.Popen(arguments, env=get_environment())
+
+
+class PreviewStrip(QtWidgets.QWidget):
+    ''' Display the preview of a cacheversion and render it on demand '''
+    previewRendered = QtCore.Signal()
+
+    def __init__(self, parent=None):
+        super(PreviewStrip, self).__init__(parent)
+        self.cacheversion = None
+        self.process = None
+        self.image = QtWidgets.QLabel()
+        self.image.setAlignment(QtCore.Qt.AlignCenter)
+        self.scroll_area = QtWidgets.QScrollArea()
+        self.scroll_area.setWidget(self.image)
+        self.scroll_area.setWidgetResizable(True)
+        self.scroll_area.setFixedHeight(THUMBNAIL_SIZE + 24)
+        self.view = QtWidgets.QComboBox()
+        self.view.addItems(sorted(VIEWS))
+        self.view.setCurrentIndex(sorted(VIEWS).index('front'))
+        self.render_button = QtWidgets.QPushButton('Render geometry preview')
+        self.render_button.setEnabled(False)
+        self.render_button.released.connect(self._call_render)
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(500)
+        self.timer.timeout.connect(self._call_check_process)
+
+        self.buttons_layout = QtWidgets.QHBoxLayout()
+        self.buttons_layout.setContentsMargins(0, 0, 0, 0)
+        self.buttons_layout.addWidget(self.view)
+        self.buttons_layout.addWidget(self.render_button)
+
+        self.layout = QtWidgets.QVBoxLayout(self)
+        self.layout.setContentsMargins(0, 0, 0, 0)
+        self.layout.setSpacing(2)
+        self.layout.addWidget(self.scroll_area)
+        self.layout.addLayout(self.buttons_layout)
+
+    def set_cacheversion(self, cacheversion):
+        self.cacheversion = cacheversion
+        enabled = bool(cacheversion) and self.process is None
+        self.render_button.setEnabled(enabled)
+        self.update_image()
+
+    def update_image(self):
+        preview = self.cacheversion and self.cacheversion.infos.get('preview')
+        if not preview or not os.path.exists(preview['filename']):
+            self.image.setPixmap(QtGui.QPixmap())
+            self.image.setText('No preview')
+            return
+        self.image.setText('')
+        self.image.setPixmap(QtGui.QPixmap(preview['filename']))
+        frames = ', '.join(str(int(frame)) for frame in preview['frames'])
+        self.image.setToolTip('{} view, frames: {}'.format(
+            preview['view'], frames))
+
+    def _call_render(self):
+        if self.cacheversion is None or self.process is not None:
+            return
+        self.process = launch_preview_worker(
+            self.cacheversion, view=self.view.currentText())
+        self.render_button.setEnabled(False)
+        self.timer.start()
+
+    def _call_check_process(self):
+        if self.process is None or self.process.poll() is None:
+            return
+        self.timer.stop()
+        self.process = None
+        self.render_button.setEnabled(self.cacheversion is not None)
+        if self.cacheversion is None:
+            return
+        # the infos were modified by the worker
+        infos = load_json(self.cacheversion.infos_path)
+        self.cacheversion.infos['preview'] = infos.get('preview')
+        self.update_image()
+        self.previewRendered.emit()
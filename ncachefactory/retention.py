@@ -0,0 +1,368 @@
+"""
+This module account the disk space used by the cacheversions of a workspace
+and evict the versions following a retention policy.
+
+The disk usage of a version is split by categories (caches, playblasts,
+scenes, jpegs) and cached in memory. It's computed again only when the
+version was modified since. The infos are never written, the batch jobs
+can save them at the same time.
+The scenes stored by content (see scenestore) are hardlinked in every
+version using them. These files are counted as 'shared', they aren't freed
+by the deletion of a single version.
+
+A retention policy protects:
+    - the starred versions (if keep_starred is True)
+    - the keep_last most recent versions of every node.
+If a quota is set, the unprotected versions are evicted from the least
+recently connected until the workspace fits the quota. Without quota, all
+the unprotected versions are evicted.
+The versions with a queued or running job (see farm module) are never
+evicted.
+"""
+
+import os
+import time
+
+from maya import cmds
+from PySide2 import QtWidgets, QtCore
+
+from ncachefactory.farm import list_live_jobs
+from ncachefactory.versioning import list_available_cacheversions
+from ncachefactory.scenestore import (
+    BAKED_INPUTS_SUFFIX, get_store_directory)
+from ncachefactory.cachemanager import delete_cacheversion
+from ncachefactory.optionvars import (
+    RETENTION_KEEP_LAST_OPTIONVAR, RETENTION_KEEP_STARRED_OPTIONVAR,
+    RETENTION_QUOTA_OPTIONVAR, ensure_optionvars_exists)
+
+
+CATEGORIES = 'caches', 'playblasts', 'scenes', 'jpegs', 'others'
+CATEGORIES_EXTENSIONS = {
+    'caches': ('.mcc', '.mcz', '.mcd', '.xml'),
+    'playblasts': ('.mp4', '.mov', '.avi'),
+    'scenes': ('.ma', '.mb'),
+    'jpegs': ('.jpg', '.jpeg')}
+GIGABYTE = 1024 ** 3
+# last disk usage computed by cacheversion directory
+_disk_usages = {}
+
+
+def get_file_category(filename):
+    extension = os.path.splitext(filename)[-1].lower()
+    for category, extensions in CATEGORIES_EXTENSIONS.items():
+        if extension in extensions:
+            return category
+    return 'others'
+
+
+def compute_directory_disk_usage(directory):
+    disk_usage = {category: 0 for category in CATEGORIES}
+    disk_usage['shared'] = 0
+    for root, _, filenames in os.walk(directory):
+        # the baked inputs are saved in a folder next to the scene
+        relative = os.path.relpath(root, directory).split(os.sep)[0]
+        in_scene_inputs = relative.endswith(BAKED_INPUTS_SUFFIX)
+        for filename in filenames:
+            try:
+                stat = os.stat(os.path.join(root, filename))
+            except OSError:
+                # the file can be deleted during the walk by a batch job
+                continue
+            if in_scene_inputs:
+                category = 'scenes'
+            else:
+                category = get_file_category(filename)
+            disk_usage[category] += stat.st_size
+            if stat.st_nlink > 1:
+                disk_usage['shared'] += stat.st_size
+    disk_usage['total'] = sum(disk_usage[c] for c in CATEGORIES)
+    return disk_usage
+
+
+def get_cacheversion_disk_usage(cacheversion, force=False):
+    ''' Return the disk usage cached if the version wasn't modified since
+    the last computation. '''
+    disk_usage = _disk_usages.get(cacheversion.directory)
+    modification_time = max(
+        cacheversion.infos.get('modification_time') or 0,
+        os.path.getmtime(cacheversion.directory))
+    if not force and disk_usage and disk_usage['time'] >= modification_time:
+        return disk_usage
+    disk_usage = compute_directory_disk_usage(cacheversion.directory)
+    disk_usage['time'] = time.time()
+    _disk_usages[cacheversion.directory] = disk_usage
+    return disk_usage
+
+
+def get_reclaimable_size(disk_usage):
+    return disk_usage['total'] - disk_usage['shared']
+
+
+def get_workspace_disk_usage(workspace, cacheversions=None):
+    ''' Return the disk usage by categories of the whole workspace, the scene
+    store included. '''
+    if cacheversions is None:
+        cacheversions = list_available_cacheversions(workspace)
+    workspace_usage = {category: 0 for category in CATEGORIES}
+    for cacheversion in cacheversions:
+        disk_usage = get_cacheversion_disk_usage(cacheversion)
+        for category in CATEGORIES:
+            workspace_usage[category] += disk_usage[category]
+        # the shared files are counted once with the scene store
+        workspace_usage['scenes'] -= disk_usage['shared']
+    store_usage = compute_directory_disk_usage(get_store_directory(workspace))
+    workspace_usage['scenes'] += store_usage['total']
+    workspace_usage['total'] = sum(workspace_usage[c] for c in CATEGORIES)
+    return workspace_usage
+
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024:
+            return '{:.1f} {}'.format(size, unit)
+        size /= 1024.0
+    return '{:.2f} TB'.format(size)
+
+
+def get_lru_time(cacheversion):
+    infos = cacheversion.infos
+    return (
+        infos.get('last_connection_time') or
+        infos.get('modification_time') or
+        infos.get('creation_time') or 0)
+
+
+class RetentionPolicy(object):
+    ''' keep_last and quota at 0 are disabled. The quota is in bytes. '''
+    def __init__(self, keep_last=0, keep_starred=True, quota=0):
+        self.keep_last = keep_last
+        self.keep_starred = keep_starred
+        self.quota = quota
+
+    @property
+    def enabled(self):
+        return bool(self.keep_last or self.quota)
+
+
+class EvictionReport(object):
+    def __init__(self, policy, workspace_size):
+        self.policy = policy
+        self.workspace_size = workspace_size
+        self.evicted = []
+        self.kept = []
+
+    @property
+    def reclaimed_size(self):
+        return sum(size for _, size, _ in self.evicted)
+
+    @property
+    def final_size(self):
+        return self.workspace_size - self.reclaimed_size
+
+    @property
+    def quota_reached(self):
+        return not self.policy.quota or self.final_size <= self.policy.quota
+
+    def format(self):
+        lines = ['Workspace size: ' + format_size(self.workspace_size)]
+        if self.policy.quota:
+            lines.append('Quota: ' + format_size(self.policy.quota))
+        lines.append('Evicted versions: {} ({} reclaimed)'.format(
+            len(self.evicted), format_size(self.reclaimed_size)))
+        for cacheversion, size, reason in self.evicted:
+            lines.append('    - {} {} ({})'.format(
+                cacheversion.name, format_size(size), reason))
+        lines.append('Kept versions: {}'.format(len(self.kept)))
+        for cacheversion, size, reason in self.kept:
+            lines.append('    - {} {} ({})'.format(
+                cacheversion.name, format_size(size), reason))
+        lines.append('Final size: ' + format_size(self.final_size))
+        if not self.quota_reached:
+            lines.append('Warning: the protected versions exceed the quota')
+        return '\n'.join(lines)
+
+
+def find_protected_cacheversions(cacheversions, policy):
+    ''' Return a dict {cacheversion directory: reason} '''
+    protected = {}
+    if policy.keep_starred:
+        for cacheversion in cacheversions:
+            if cacheversion.infos.get('starred'):
+                protected[cacheversion.directory] = 'starred'
+    if not policy.keep_last:
+        return protected
+    cacheversions_by_node = {}
+    for cacheversion in cacheversions:
+        for node in cacheversion.infos.get('nodes', {}):
+            cacheversions_by_node.setdefault(node, []).append(cacheversion)
+    for node, node_cacheversions in cacheversions_by_node.items():
+        node_cacheversions.sort(
+            key=lambda cv: cv.infos.get('creation_time') or 0, reverse=True)
+        for cacheversion in node_cacheversions[:policy.keep_last]:
+            reason = 'last {} of {}'.format(policy.keep_last, node)
+            protected.setdefault(cacheversion.directory, reason)
+    return protected
+
+
+def plan_eviction(workspace, policy, cacheversions=None):
+    """ Build the eviction report of the workspace without deleting anything.
+    It's the dry run of evict_cacheversions.
+    """
+    if cacheversions is None:
+        cacheversions = list_available_cacheversions(workspace)
+    workspace_usage = get_workspace_disk_usage(workspace, cacheversions)
+    report = EvictionReport(policy, workspace_usage['total'])
+    sizes = {
+        cv.directory: get_reclaimable_size(get_cacheversion_disk_usage(cv))
+        for cv in cacheversions}
+    protected = find_protected_cacheversions(cacheversions, policy)
+    candidates = []
+    for cacheversion in cacheversions:
+        size = sizes[cacheversion.directory]
+        if not policy.enabled:
+            report.kept.append((cacheversion, size, 'no policy'))
+        elif cacheversion.directory in protected:
+            reason = protected[cacheversion.directory]
+            report.kept.append((cacheversion, size, reason))
+        elif list_live_jobs(cacheversion.directory):
+            report.kept.append((cacheversion, size, 'job running'))
+        else:
+            candidates.append(cacheversion)
+
+    candidates.sort(key=get_lru_time)
+    current_size = workspace_usage['total']
+    for cacheversion in candidates:
+        size = sizes[cacheversion.directory]
+        if policy.quota and current_size <= policy.quota:
+            report.kept.append((cacheversion, size, 'under quota'))
+            continue
+        reason = 'least recently used' if policy.quota else 'not recent'
+        report.evicted.append((cacheversion, size, reason))
+        current_size -= size
+    return report
+
+
+def evict_cacheversions(workspace, policy, dry_run=True):
+    report = plan_eviction(workspace, policy)
+    if dry_run is True:
+        return report
+    for cacheversion, _, _ in report.evicted:
+        delete_cacheversion(cacheversion)
+    return report
+
+
+class RetentionWindow(QtWidgets.QWidget):
+    def __init__(self, parent=None):
+        super(RetentionWindow, self).__init__(parent, QtCore.Qt.Tool)
+        self.setWindowTitle('Disk Usage and Retention')
+        self.workspace = None
+
+        self.usage = QtWidgets.QLabel()
+        self.keep_last = QtWidgets.QSpinBox()
+        self.keep_last.setToolTip(
+            'Most recent versions kept for every node (0=disabled)')
+        self.keep_starred = QtWidgets.QCheckBox('Keep starred versions')
+        self.quota = QtWidgets.QDoubleSpinBox()
+        self.quota.setMaximum(100000)
+        self.quota.setSuffix(' GB')
+        self.quota.setToolTip(
+            'Evict the least recently connected versions until the '
+            'workspace fits the quota (0=disabled)')
+
+        self.dry_run = QtWidgets.QPushButton('Dry run')
+        self.dry_run.released.connect(self._call_dry_run)
+        self.evict = QtWidgets.QPushButton('Evict')
+        self.evict.released.connect(self._call_evict)
+        self.buttons_layout = QtWidgets.QHBoxLayout()
+        self.buttons_layout.setContentsMargins(0, 0, 0, 0)
+        self.buttons_layout.addWidget(self.dry_run)
+        self.buttons_layout.addWidget(self.evict)
+
+        self.report = QtWidgets.QPlainTextEdit()
+        self.report.setReadOnly(True)
+
+        self.form_layout = QtWidgets.QFormLayout()
+        self.form_layout.addRow('Keep last', self.keep_last)
+        self.form_layout.addRow('', self.keep_starred)
+        self.form_layout.addRow('Quota', self.quota)
+
+        self.layout = QtWidgets.QVBoxLayout(self)
+        self.layout.addWidget(self.usage)
+        self.layout.addLayout(self.form_layout)
+        self.layout.addLayout(self.buttons_layout)
+        self.layout.addWidget(self.report)
+
+        self.set_optionvars()
+        self.keep_last.valueChanged.connect(self.save_optionvars)
+        self.keep_starred.stateChanged.connect(self.save_optionvars)
+        self.quota.valueChanged.connect(self.save_optionvars)
+
+    def show(self):
+        super(RetentionWindow, self).show()
+        self.update_usage()
+
+    def set_workspace(self, workspace):
+        self.workspace = workspace
+        if self.isVisible():
+            self.update_usage()
+
+    def update_usage(self):
+        self.report.clear()
+        if self.workspace is None:
+            self.usage.setText('No workspace set')
+            return
+        disk_usage = get_workspace_disk_usage(self.workspace)
+        lines = ['Total: ' + format_size(disk_usage['total'])]
+        for category in CATEGORIES:
+            lines.append('    {}: {}'.format(
+                category, format_size(disk_usage[category])))
+        self.usage.setText('\n'.join(lines))
+
+    @property
+    def policy(self):
+        return RetentionPolicy(
+            keep_last=self.keep_last.value(),
+            keep_starred=self.keep_starred.isChecked(),
+            quota=int(self.quota.value() * GIGABYTE))
+
+    def _call_dry_run(self):
+        if self.workspace is None:
+            return
+        report = evict_cacheversions(self.workspace, self.policy, dry_run=True)
+        self.report.setPlainText(report.format())
+
+    def _call_evict(self):
+        if self.workspace is None:
+            return
+        report = evict_cacheversions(self.workspace, self.policy, dry_run=True)
+        if not report.evicted:
+            self.report.setPlainText(report.format())
+            return
+        message = 'Delete {} versions ({})?'.format(
+            len(report.evicted), format_size(report.reclaimed_size))
+        result = QtWidgets.QMessageBox.question(
+            self, 'Evict versions', message,
+            QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No)
+        if result != QtWidgets.QMessageBox.Yes:
+            return
+        report = evict_cacheversions(
+            self.workspace, self.policy, dry_run=False)
+        self.update_usage()
+        self.report.setPlainText(report.format())
+
+    def set_optionvars(self):
+        ensure_optionvars_exists()
+        value = cmds.optionVar(query=RETENTION_KEEP_LAST_OPTIONVAR)
+        self.keep_last.setValue(value)
+        value = cmds.optionVar(query=RETENTION_KEEP_STARRED_OPTIONVAR)
+        self.keep_starred.setChecked(bool(value))
+        value = cmds.optionVar(query=RETENTION_QUOTA_OPTIONVAR)
+        self.quota.setValue(value)
+
+    def save_optionvars(self, *signals_args):
+        value = self.keep_last.value()
+        cmds.optionVar(intValue=[RETENTION_KEEP_LAST_OPTIONVAR, value])
+        value = int(self.keep_starred.isChecked())
+        cmds.optionVar(intValue=[RETENTION_KEEP_STARRED_OPTIONVAR, value])
+        value = self.quota.value()
+        cmds.optionVar(floatValue=[RETENTION_QUOTA_OPTIONVAR, value])
@@ -0,0 +1,122 @@
+"""
+This module manage a content addressed store of the scenes sent in batch.
+Every scene saved for a batch job is moved in the workspace store and renamed
+by the hash of his content. The cache versions doesn't keep a copy of the
+scene anymore but a hardlink to the stored one (or a simple reference if the
+file system doesn't support hardlinks). Same scene sent several times is
+stored only once.
+The baked inputs folder of the scene (geometry caches of the animated
+meshes, see batch.export_scene_snapshot_for_batch) is part of the hash: a
+scene whose animation changed is stored again with his new inputs.
+The mayaAscii volatile lines (comments, UUID) are skipped in the hash. The
+mayaBinary files are hashed raw, their header contains the save date, so the
+same binary scene saved twice is rarely deduplicated.
+
+The module respect a nomenclature:
+    store: the folder under the workspace containing the hashed scenes
+    stored scene: a scene file named by his hash in the store
+"""
+
+import os
+import shutil
+import hashlib
+
+
+SCENESTORE_FOLDERNAME = 'scenes_store'
+HASH_BLOCKSIZE = 2 ** 20
+BAKED_INPUTS_SUFFIX = '_inputs'
+# Those mayaAscii lines are different at every save even if the scene content
+# doesn't change. They are skipped in the hash computation.
+VOLATILE_ASCII_LINES = b'//', b'fileInfo "UUID"'
+
+
+def get_store_directory(workspace):
+    return os.path.join(workspace, SCENESTORE_FOLDERNAME).replace("\\", "/")
+
+
+def update_hash(sha, filename):
+    with open(filename, 'rb') as f:
+        block = f.read(HASH_BLOCKSIZE)
+        while block:
+            sha.update(block)
+            block = f.read(HASH_BLOCKSIZE)
+
+
+def compute_scene_hash(scene):
+    ''' Hash the scene content and his baked inputs if exists '''
+    sha = hashlib.sha1()
+    if scene.endswith('.ma'):
+        with open(scene, 'rb') as f:
+            for line in f:
+                if not line.startswith(VOLATILE_ASCII_LINES):
+                    sha.update(line)
+    else:
+        update_hash(sha, scene)
+    inputs = os.path.splitext(scene)[0] + BAKED_INPUTS_SUFFIX
+    if not os.path.isdir(inputs):
+        return sha.hexdigest()
+    for root, directories, filenames in os.walk(inputs):
+        directories.sort()
+        for filename in sorted(filenames):
+            path = os.path.join(root, filename)
+            relative = os.path.relpath(path, inputs).replace("\\", "/")
+            sha.update(relative.encode('utf-8'))
+            update_hash(sha, path)
+    return sha.hexdigest()
+
+
+def is_stored_scene(scene):
+    directory = os.path.dirname(os.path.normpath(scene))
+    return os.path.basename(directory) == SCENESTORE_FOLDERNAME
+
+
+def store_scene(workspace, scene):
+    """ Move the given scene into the workspace store and return the stored
+    scene path. If a scene with the same content and the same baked inputs is
+    already stored, the given scene is just deleted.
+    """
+    if is_stored_scene(scene):
+        return scene.replace("\\", "/")
+    directory = get_store_directory(workspace)
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    extension = os.path.splitext(scene)[-1]
+    stored = os.path.join(directory, compute_scene_hash(scene) + extension)
+    inputs = os.path.splitext(scene)[0] + BAKED_INPUTS_SUFFIX
+    stored_inputs = os.path.splitext(stored)[0] + BAKED_INPUTS_SUFFIX
+    if os.path.exists(stored):
+        os.remove(scene)
+        if os.path.exists(inputs):
+            shutil.rmtree(inputs)
+    else:
+        os.rename(scene, stored)
+        if os.path.exists(inputs):
+            os.rename(inputs, stored_inputs)
+    return stored.replace("\\", "/")
+
+
+def link_scene(stored, destination):
+    """ Create a hardlink of the stored scene to the destination. If the link
+    isn't supported by the os or the file system, the stored scene path is
+    returned to be used as reference.
+    """
+    try:
+        os.link(stored, destination)
+    except (AttributeError, OSError):
+        return stored
+    stored_inputs = os.path.splitext(stored)[0] + BAKED_INPUTS_SUFFIX
+    if os.path.exists(stored_inputs):
+        # baked inputs are small compared to the scene, they are just referred
+        # by a json file which contains relative paths. A copy is safer.
+        inputs = os.path.splitext(destination)[0] + BAKED_INPUTS_SUFFIX
+        shutil.copytree(stored_inputs, inputs)
+    return destination.replace("\\", "/")
+
+
+def list_stored_scenes(workspace):
+    directory = get_store_directory(workspace)
+    if not os.path.exists(directory):
+        return []
+    return sorted(
+        os.path.join(directory, f).replace("\\", "/")
+        for f in os.listdir(directory) if f.endswith(('.ma', '.mb')))
@@ -1,9 +1,13 @@
 import os
+import threading
 from math import ceil, sqrt
-import tempfile
+from collections import OrderedDict
 from PySide2 import QtCore, QtWidgets, QtGui
+from ncachefactory.arrayutils import normalize_ranges
+from ncachefactory.imagecomparison import (
+    compare_images, list_available_modes, WIPE)
 from ncachefactory.slider import Slider
-from ncachefactory.playblast import compile_movie
+from ncachefactory.playblast import open_movie_stream, get_ffmpeg_path
 
 
 POINT_RADIUS = 8
@@ -24,12 +28,143 @@ STACKED_IMAGE_TEXTCOLOR = "#ffffff"
 COMPARATOR_TITLE = "Compare versions"
 CONTACTSHEET_TITLE = "Contact sheet"
 CONTACTSHEET_TEMPFILENAME = 'ncachemanager_contactsheet.{}.jpg'
+PIXMAP_CACHE_MEMORY = 512 * 1024 * 1024
+CONTACTSHEET_JPEG_QUALITY = 90
+DEFAULT_TILE_SIZE = 640, 480
+COMPARISON_CACHE_MEMORY = 256 * 1024 * 1024
+# comparisons computed ahead of the displayed frame
+PREFETCH_FRAMES = 24
+
+
+class PixmapCache(object):
+    """ Least recently used pixmaps loaded from the disk. The size is limited
+    in bytes of the decoded images. """
+    def __init__(self, memory=PIXMAP_CACHE_MEMORY):
+        self.memory = memory
+        self.used_memory = 0
+        self._pixmaps = OrderedDict()
+
+    def get(self, filename):
+        ''' Return the pixmap or None if the file can't be read '''
+        pixmap = self._pixmaps.pop(filename, None)
+        if pixmap is None:
+            if not os.path.exists(filename):
+                return None
+            pixmap = QtGui.QPixmap(filename)
+            if pixmap.isNull():
+                return None
+            self.used_memory += get_pixmap_memory(pixmap)
+        self._pixmaps[filename] = pixmap
+        while self.used_memory > self.memory and len(self._pixmaps) > 1:
+            _, evicted = self._pixmaps.popitem(last=False)
+            self.used_memory -= get_pixmap_memory(evicted)
+        return pixmap
+
+    def discard(self, filename):
+        pixmap = self._pixmaps.pop(filename, None)
+        if pixmap is not None:
+            self.used_memory -= get_pixmap_memory(pixmap)
+
+
+def get_pixmap_memory(pixmap):
+    return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+
+# shared by all the sequences, a frame displayed in the monitor, a
+# comparator and a contact sheet is loaded once.
+pixmap_cache = PixmapCache()
+
+
+class ImageSequence(object):
+    """ Sequence of images indexed from 0. The sequence contains the
+    filenames and the pixmaps are loaded on demand through the shared cache.
+    """
+    def __init__(self, filenames=None, cache=None):
+        self.filenames = list(filenames or [])
+        self.cache = cache or pixmap_cache
+        # pixmaps kept when their files are deleted (see detach)
+        self._pixmaps = None
+
+    def __len__(self):
+        return len(self.filenames)
+
+    def __getitem__(self, index):
+        if self._pixmaps is not None:
+            return self._pixmaps[index]
+        return self.cache.get(self.filenames[index])
+
+    def get_image_source(self, index):
+        ''' Return what a thread needs to load the image: the filename or the
+        image if the file is deleted. QPixmap can't be used out of the main
+        thread. '''
+        if not 0 <= index < len(self):
+            return None
+        if self._pixmaps is not None:
+            pixmap = self._pixmaps[index]
+            return pixmap.toImage() if pixmap is not None else None
+        return self.filenames[index]
+
+    def append(self, filename):
+        self.filenames.append(filename)
+        if self._pixmaps is not None:
+            self._pixmaps.append(self.cache.get(filename))
+
+    def detach(self):
+        ''' Keep the images in memory, their files are going to be removed '''
+        if self._pixmaps is not None:
+            return
+        self._pixmaps = [self[i] for i in range(len(self))]
+
+
+class OverlappedSequence(object):
+    """ View of a sequence placed at a start index of a longer timeline. The
+    indexes outside of the sequence return None. """
+    def __init__(self, sequence, start, length, count):
+        self.sequence = sequence
+        self.start = start
+        self.length = length
+        self.count = count
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.length:
+            raise IndexError('sequence index out of range')
+        index -= self.start
+        if not 0 <= index < min(self.count, len(self.sequence)):
+            return None
+        return self.sequence[index]
+
+    def get_image_source(self, index):
+        index -= self.start
+        if not 0 <= index < min(self.count, len(self.sequence)):
+            return None
+        return self.sequence.get_image_source(index)
+
+
+def overlap_sequences(sequences, ranges):
+    """ Return views of the sequences overlapped on the same timeline, the
+    same result as arrayutils.overlap_arrays_from_ranges without copying the
+    images. """
+    ranges = normalize_ranges(ranges)
+    length = max([r[-1] for r in ranges])
+    return [
+        OverlappedSequence(
+            sequence, range_[0], length, range_[1] - range_[0] + 1)
+        for sequence, range_ in zip(sequences, ranges)]
+
+
+def find_first_image(sequence):
+    for i in range(len(sequence)):
+        if sequence[i] is not None:
+            return sequence[i]
 
 
 class SequenceImageReader(QtWidgets.QWidget):
     def __init__(self, range_, name='', parent=None):
         super(SequenceImageReader, self).__init__(parent, QtCore.Qt.Window)
-        self._pixmaps = []
+        self.sequence = ImageSequence()
         self.image = ImageViewer(name)
         self.image.set_image(None)
         self.slider = Slider()
@@ -44,15 +179,15 @@ class SequenceImageReader(QtWidgets.QWidget):
         self.layout.addWidget(self.image)
         self.layout.addWidget(self.slider)
 
-    def add_pixmap(self, pixmap):
-        self._pixmaps.append(pixmap)
-        value = len(self._pixmaps) + self.slider.minimum
+    def add_image(self, filename):
+        self.sequence.append(filename)
+        value = len(self.sequence) + self.slider.minimum
         self.slider.maximum_settable_value = value
         self.slider.value = self.slider.maximum_settable_value
 
     def _call_slider_value_changed(self, value):
         self.image.name = str(value)
-        self.image.set_image(self._pixmaps[self.slider.position])
+        self.image.set_image(self.sequence[self.slider.position])
 
     def set_next_image(self):
         if not (self.slider.start <= self.slider.value < self.slider.end):
@@ -108,6 +243,75 @@ class ImageViewer(QtWidgets.QWidget):
             painter.end()
 
 
+class ComparisonCache(object):
+    """ Least recently used comparisons by (mode, frame index). The size is
+    limited in bytes like the PixmapCache. """
+    def __init__(self, memory=COMPARISON_CACHE_MEMORY):
+        self.memory = memory
+        self.used_memory = 0
+        self._pixmaps = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._pixmaps
+
+    def get(self, key):
+        pixmap = self._pixmaps.pop(key, None)
+        if pixmap is not None:
+            self._pixmaps[key] = pixmap
+        return pixmap
+
+    def add(self, key, pixmap):
+        self.discard(key)
+        self._pixmaps[key] = pixmap
+        self.used_memory += get_pixmap_memory(pixmap)
+        while self.used_memory > self.memory and len(self._pixmaps) > 1:
+            _, evicted = self._pixmaps.popitem(last=False)
+            self.used_memory -= get_pixmap_memory(evicted)
+
+    def discard(self, key):
+        pixmap = self._pixmaps.pop(key, None)
+        if pixmap is not None:
+            self.used_memory -= get_pixmap_memory(pixmap)
+
+
+class ComparisonWorker(QtCore.QThread):
+    """ Compute the comparisons requested in a thread. A request replaces
+    the pending tasks, they are obsolete when the displayed frame moved.
+    A task is a tuple (key, mode, source1, source2), see load_image. """
+    computed = QtCore.Signal(object, object)
+
+    def __init__(self, parent=None):
+        super(ComparisonWorker, self).__init__(parent)
+        self._condition = threading.Condition()
+        self._tasks = []
+        self._stopped = False
+
+    def request(self, tasks):
+        with self._condition:
+            self._tasks = list(tasks)
+            self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._tasks = []
+            self._condition.notify()
+        self.wait()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while not self._tasks and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                key, mode, source1, source2 = self._tasks.pop(0)
+            image1, image2 = load_image(source1), load_image(source2)
+            if image1 is None or image2 is None:
+                continue
+            self.computed.emit(key, compare_images(image1, image2, mode))
+
+
 class SequenceStackedImagesReader(QtWidgets.QWidget):
     def __init__(self, pixmaps1, pixmaps2, frames, names=None, parent=None):
         super(SequenceStackedImagesReader, self).__init__(parent, QtCore.Qt.Tool)
@@ -124,9 +328,9 @@ class SequenceStackedImagesReader(QtWidgets.QWidget):
         self.stacked_imagesview.set_pixmaps(pixmap1, pixmap2)
         self.stacked_imagesview.name = self.names[0]
         # find the first pixmap which is not None and use is as reference size
-        for pixmap in pixmaps1 + pixmaps2:
-            if pixmap:
-                self.stacked_imagesview.setFixedSize(pixmap.size())
+        pixmap = find_first_image(pixmaps1) or find_first_image(pixmaps2)
+        if pixmap:
+            self.stacked_imagesview.setFixedSize(pixmap.size())
         self.stacked_imagesview.update_geometries()
         self.slider = Slider()
         self.slider.minimum = 0
@@ -142,6 +346,16 @@ class SequenceStackedImagesReader(QtWidgets.QWidget):
         self.blender.setSliderPosition(100)
         self.blender.valueChanged.connect(self._call_blender_value_changed)
 
+        self.mode = QtWidgets.QComboBox()
+        self.mode.addItems(list_available_modes())
+        self.mode.currentIndexChanged.connect(self._call_mode_changed)
+        self.comparisons = ComparisonCache()
+        # the comparisons are computed in a thread to not block the playback,
+        # the wipe is displayed while the comparison isn't ready.
+        self.worker = ComparisonWorker(self)
+        self.worker.computed.connect(self._call_comparison_computed)
+        self.worker.start()
+
         self.playstop = QtWidgets.QPushButton("Play")
         self.playstop.released.connect(self._call_playstop)
 
@@ -151,6 +365,7 @@ class SequenceStackedImagesReader(QtWidgets.QWidget):
         self.layout.addWidget(self.stacked_imagesview)
         self.layout.addWidget(self.slider)
         self.layout.addWidget(self.blender)
+        self.layout.addWidget(self.mode)
         self.layout.addWidget(self.playstop)
 
     def timerEvent(self, event):
@@ -164,12 +379,58 @@ class SequenceStackedImagesReader(QtWidgets.QWidget):
         self.stacked_imagesview.name = self.names[i]
         pixmap1, pixmap2 = self.pixmaps1[i], self.pixmaps2[i]
         self.stacked_imagesview.set_pixmaps(pixmap1, pixmap2)
+        self.update_comparison()
+
+    def update_comparison(self):
+        mode = self.mode.currentText()
+        self.blender.setEnabled(mode == WIPE)
+        if mode == WIPE:
+            self.stacked_imagesview.set_comparison(None)
+            return
+        i = self.slider.position
+        self.stacked_imagesview.set_comparison(self.comparisons.get((mode, i)))
+        self.prefetch_comparisons(mode)
+
+    def list_prefetched_positions(self):
+        ''' Return the positions of the current frame and the next ones in
+        the playback order. '''
+        start, end = self.slider.start, self.slider.end
+        value = self.slider.value
+        if not start <= value <= end:
+            value = start
+        count = min(PREFETCH_FRAMES, end - start + 1)
+        values = [start + (value - start + i) % (end - start + 1)
+                  for i in range(count)]
+        offset = self.slider.minimum + 1
+        return [v - offset for v in values if 0 <= v - offset < len(self.names)]
+
+    def prefetch_comparisons(self, mode):
+        tasks = []
+        for i in self.list_prefetched_positions():
+            if (mode, i) in self.comparisons:
+                continue
+            source1 = self.pixmaps1.get_image_source(i)
+            source2 = self.pixmaps2.get_image_source(i)
+            # the missing images can be rendered later, nothing is cached
+            if source1 is None or source2 is None:
+                continue
+            tasks.append(((mode, i), mode, source1, source2))
+        self.worker.request(tasks)
+
+    def _call_comparison_computed(self, key, image):
+        self.comparisons.add(key, QtGui.QPixmap.fromImage(image))
+        if key == (self.mode.currentText(), self.slider.position):
+            self.stacked_imagesview.set_comparison(self.comparisons.get(key))
+
+    def _call_mode_changed(self, _):
+        self.update_comparison()
 
     def _call_blender_value_changed(self, value):
         self.stacked_imagesview.alpha = value / 100.0
 
     def closeEvent(self, event):
         self.timer.stop()
+        self.worker.stop()
 
     def _call_playstop(self):
         if self.isplaying is False:
@@ -192,6 +453,8 @@ class StackedImagesViewer(QtWidgets.QWidget):
         self.mouse_pressed = False
         self.pixmap1 = None
         self.pixmap2 = None
+        # replaces the wipe when a comparison mode is displayed
+        self.comparison = None
         self.image2_rect = None
         self.left_resizer = None
         self.right_resizer = None
@@ -274,6 +537,11 @@ class StackedImagesViewer(QtWidgets.QWidget):
         self.pixmap2 = pixmap2
         self.repaint()
 
+    def set_comparison(self, pixmap):
+        self.comparison = pixmap
+        # set after the pixmaps of the same frame, the paints are coalesced
+        self.update()
+
     def paintEvent(self, event):
         if self.image2_rect is None:
             self.update_geometries()
@@ -282,7 +550,10 @@ class StackedImagesViewer(QtWidgets.QWidget):
         painter = QtGui.QPainter()
         painter.begin(self)
         try:
-            draw_stacked_imagesview(painter, self, alpha=self._alpha)
+            if self.comparison is not None:
+                draw_comparison(painter, self)
+            else:
+                draw_stacked_imagesview(painter, self, alpha=self._alpha)
         except Exception:
             import traceback
             print(traceback.format_exc())
@@ -290,6 +561,119 @@ class StackedImagesViewer(QtWidgets.QWidget):
             painter.end()
 
 
+def load_image(source):
+    ''' source is a filename, a QImage or None '''
+    if source is None or isinstance(source, QtGui.QImage):
+        return source
+    image = QtGui.QImage(source)
+    return None if image.isNull() else image
+
+
+def compose_contact_sheet(images, names, tile_size):
+    """ Tile the images in a grid with the layout of the contact sheet. The
+    missing images are drawn as empty tiles. QImage and QPainter can be
+    used in a thread. """
+    columns = int(ceil(sqrt(len(images))))
+    rows = int(ceil(len(images) / float(columns)))
+    width, height = tile_size
+    sheet = QtGui.QImage(
+        width * columns, height * rows, QtGui.QImage.Format_RGB32)
+    sheet.fill(QtGui.QColor(NOIMAGE_COLORS["bordercolor"]))
+    painter = QtGui.QPainter()
+    painter.begin(sheet)
+    try:
+        for i, (image, name) in enumerate(zip(images, names)):
+            rect = QtCore.QRect(
+                (i % columns) * width, (i // columns) * height, width, height)
+            if image is None:
+                draw_empty_image(painter, rect, name)
+                continue
+            painter.drawImage(rect, image)
+            draw_name(painter, rect, name)
+    finally:
+        painter.end()
+    return sheet
+
+
+def draw_name(painter, rect, name):
+    font = QtGui.QFont()
+    font.setBold(True)
+    font.setItalic(False)
+    font.setPixelSize(15)
+    painter.setFont(font)
+    painter.setPen(QtGui.QPen(QtGui.QColor(STACKED_IMAGE_TEXTCOLOR)))
+    flags = QtCore.Qt.AlignCenter | QtCore.Qt.AlignBottom
+    painter.drawText(QtCore.QRectF(rect), flags, name)
+
+
+def encode_jpeg(image, quality=CONTACTSHEET_JPEG_QUALITY):
+    data = QtCore.QByteArray()
+    buffer_ = QtCore.QBuffer(data)
+    buffer_.open(QtCore.QIODevice.WriteOnly)
+    image.save(buffer_, 'JPG', quality)
+    buffer_.close()
+    return data.data()
+
+
+class ContactSheetExporter(QtCore.QThread):
+    """ Compose the contact sheet frames offscreen and stream them to ffmpeg.
+    frames is a list of image sources by frame (see load_image). The tiles
+    have the size of the first image found. """
+    progress = QtCore.Signal(int, int)
+    failed = QtCore.Signal(str)
+
+    def __init__(self, frames, names, destination, ffmpeg, parent=None):
+        super(ContactSheetExporter, self).__init__(parent)
+        self.frames = frames
+        self.names = names
+        self.destination = destination
+        self.ffmpeg = ffmpeg
+        self.canceled = False
+
+    def cancel(self):
+        self.canceled = True
+
+    def run(self):
+        try:
+            process = open_movie_stream(self.destination, self.ffmpeg)
+        except OSError as e:
+            self.failed.emit('Cannot start ffmpeg: {}'.format(e))
+            return
+        tile_size = None
+        error = None
+        try:
+            for i, sources in enumerate(self.frames):
+                if self.canceled:
+                    break
+                images = [load_image(source) for source in sources]
+                if tile_size is None:
+                    sizes = [(i.width(), i.height()) for i in images if i]
+                    tile_size = sizes[0] if sizes else None
+                sheet = compose_contact_sheet(
+                    images, self.names, tile_size or DEFAULT_TILE_SIZE)
+                process.stdin.write(encode_jpeg(sheet))
+                self.progress.emit(i + 1, len(self.frames))
+        except (IOError, OSError) as e:
+            # ffmpeg closed the pipe
+            error = e
+        finally:
+            try:
+                process.stdin.close()
+            except (IOError, OSError) as e:
+                # the pipe is already broken, the flush on close fails
+                error = error or e
+            process.wait()
+        if self.canceled:
+            if os.path.exists(self.destination):
+                os.remove(self.destination)
+            return
+        if error is not None:
+            self.failed.emit('Export failed: {}'.format(error))
+        elif process.returncode != 0:
+            message = 'Export failed: ffmpeg exited with code {}'
+            self.failed.emit(message.format(process.returncode))
+
+
 class ContactSheetImagesReader(QtWidgets.QWidget):
     def __init__(self, names=None, pixmap_lists=None, parent=None):
         super(ContactSheetImagesReader, self).__init__(parent, QtCore.Qt.Tool)
@@ -298,6 +682,8 @@ class ContactSheetImagesReader(QtWidgets.QWidget):
         self.names = names
         self.pixmap_lists = pixmap_lists
         self.imageviewers = [ImageViewer(name=name) for name in self.names]
+        self.exporter = None
+        self.progress = None
 
         self.timer = QtCore.QBasicTimer()
 
@@ -361,27 +747,47 @@ class ContactSheetImagesReader(QtWidgets.QWidget):
 
     def closeEvent(self, event):
         self.timer.stop()
+        if self.exporter is not None:
+            self.exporter.cancel()
+            self.exporter.wait()
 
     def _call_export(self):
+        if self.exporter is not None:
+            return
         destination = QtWidgets.QFileDialog.getSaveFileName(
             self, 'export contact sheet', '', "Mp4 (*.mp4);;All Files (*)")
         if not destination[0]:
             return
-
-        images = []
-        folder = tempfile.gettempdir()
-        for i in range(self.slider.start, self.slider.end + 1):
-            self.slider.value = i
-            jpg = CONTACTSHEET_TEMPFILENAME.format(str(i).zfill(6))
-            output = os.path.join(folder, jpg)
-            pixmap = QtGui.QPixmap.grabWindow(self.grid_widget.winId())
-            pixmap.save(output, 'jpg', quality=100)
-            images.append(output)
-        source = compile_movie(images)
-        os.rename(source, destination[0])
-
-        for image in images:
-            os.remove(image)
+        frames = [
+            [pixmaps.get_image_source(i) for pixmaps in self.pixmap_lists]
+            for i in range(self.slider.start, self.slider.end + 1)]
+        self.exporter = ContactSheetExporter(
+            frames=frames,
+            names=self.names,
+            destination=destination[0],
+            ffmpeg=get_ffmpeg_path(),
+            parent=self)
+        self.progress = QtWidgets.QProgressDialog(
+            'Export contact sheet', 'Cancel', 0, len(frames), self)
+        self.progress.canceled.connect(self.exporter.cancel)
+        self.exporter.progress.connect(self._call_export_progress)
+        self.exporter.failed.connect(self._call_export_failed)
+        self.exporter.finished.connect(self._call_export_finished)
+        self.export.setEnabled(False)
+        self.progress.show()
+        self.exporter.start()
+
+    def _call_export_progress(self, value, maximum):
+        self.progress.setValue(value)
+
+    def _call_export_failed(self, message):
+        QtWidgets.QMessageBox.warning(self, CONTACTSHEET_TITLE, message)
+
+    def _call_export_finished(self):
+        self.progress.close()
+        self.progress = None
+        self.exporter = None
+        self.export.setEnabled(True)
 
 
 def draw_stacked_imagesview(painter, stacked_imagesview, alpha=1):
@@ -440,11 +846,13 @@ def draw_stacked_imagesview(painter, stacked_imagesview, alpha=1):
         painter.setBrush(brush)
         painter.drawRect(rect)
     # draw frames
-    pen = QtGui.QPen(QtGui.QColor(STACKED_IMAGE_TEXTCOLOR))
-    painter.setPen(pen)
-    flags = QtCore.Qt.AlignCenter | QtCore.Qt.AlignBottom
-    textrect = QtCore.QRectF(stacked_imagesview.rect())
-    painter.drawText(textrect, flags, stacked_imagesview.name)
+    draw_name(painter, stacked_imagesview.rect(), stacked_imagesview.name)
+
+
+def draw_comparison(painter, stacked_imagesview):
+    rect = stacked_imagesview.rect()
+    painter.drawPixmap(rect, stacked_imagesview.comparison)
+    draw_name(painter, rect, stacked_imagesview.name)
 
 
 def draw_imageview(painter, imageview):
@@ -17,11 +17,25 @@ DEFAULT_INFOS = {
     'comment': 'comme ci comme ca',
     'playblasts': [],
     'scene': 'path to maya scene' or None,
+    'checkpoint': 150 or None, (last frame safely cached by a batch job)
+    'storage': 'mcc', 'mcz' or 'mcd' (format of the cache datas on the disk)
+    'starred': False, (starred versions are protected from the eviction)
+    'last_connection_time': 65300 or None,
+    'wedge_descriptor': {...} or None,
+    'wedge_analysis': {'cluster': 0, 'representative': True, 'flags': [],
+                       ...} or None (see wedgeanalysis module)
+    'preview': {'filename': 'path to png', 'frames': [1.0, 15.0], ...}
+               or None (see preview module)
     'nodes': {
         'nodename_1': {
-            'range': (100, 150)}},
+            'range': (100, 150),
+            'coverage': [[100, 120, 1.0], [130, 150, 0.5]] or None},
         'nodename_2': {
             'namespace': 'scene_saved_00'}}}
+
+The coverage is the list of frames really cached, run-length encoded as
+[start, end, step] runs (see encode_frames_runs). It shows the gaps left by
+the killed jobs, the appended ranges and the sub-frame sampling.
 """
 
 import os
@@ -30,26 +44,51 @@ import glob
 import shutil
 import time
 import xml.etree.ElementTree
+from contextlib import contextmanager
 
 
 INFOS_FILENAME = 'infos.json'
+PARTIAL_INFOS_FILENAME = 'infos{}.json'
+INFOS_LOCK_FILENAME = 'infos.lock'
+INFOS_LOCK_TIMEOUT = 60
+# steps above are gaps in the frames runs
+MAXIMUM_RUN_STEP = 1.0
+FRAME_TOLERANCE = 1e-3
 PLAYBLAST_FILENAME = 'playblast_{}.mp4'
 VERSION_FOLDERNAME = 'version_{}'
 WORKSPACE_FOLDERNAME = 'ncaches'
 LOG_FILENAME = 'infos.log'
+DEFAULT_STORAGE_FORMAT = 'mcc'
+# parsed xml attributes: {filename: ((mtime, size), attributes)}
+_xml_attributes_cache = {}
 
 
 class CacheVersion(object):
-
-    def __init__(self, directory):
+    """ If a partial_suffix is given, the infos are saved in a partial infos
+    file. It's used by the jobs caching in parallel different nodes of the
+    same cacheversion. They merge their partial infos at the end.
+    (see merge_partial_infos)
+    """
+    def __init__(self, directory, partial_suffix=None):
         self.directory = directory.replace("\\", "/")
         self.infos_path = os.path.join(self.directory, INFOS_FILENAME)
         if not os.path.exists(self.infos_path):
             raise ValueError('Invalid version directory')
-        self.infos = load_json(self.infos_path)
+        self.partial_infos_path = None
+        if partial_suffix:
+            filename = PARTIAL_INFOS_FILENAME.format(partial_suffix)
+            self.partial_infos_path = os.path.join(self.directory, filename)
+        if self.partial_infos_path and os.path.exists(self.partial_infos_path):
+            self.infos = load_json(self.partial_infos_path)
+        else:
+            self.infos = load_json(self.infos_path)
+        # state of the infos file when loaded, to detect the modifications
+        self._infos_stat = get_stat_key(self.infos_path)
 
     def save_infos(self):
-        save_json(self.infos_path, self.infos)
+        save_json(self.partial_infos_path or self.infos_path, self.infos)
+        if not self.partial_infos_path:
+            self._infos_stat = get_stat_key(self.infos_path)
 
     def get_files(self, extension_filter=None):
         return [
@@ -73,6 +112,31 @@ class CacheVersion(object):
             self.infos.get('nodes')[node]['range'] = start, end
         self.save_infos()
 
+    def set_coverage(self, coverages):
+        ''' coverages is a dict {node: frames runs} '''
+        for node, runs in coverages.items():
+            _, node = split_namespace_nodename(node)
+            self.infos['nodes'][node]['coverage'] = runs
+        self.save_infos()
+
+    def get_coverage(self, node):
+        ''' Return the frames runs cached for the node. The versions recorded
+        without coverage fall back on the range. '''
+        _, node = split_namespace_nodename(node)
+        node_infos = self.infos.get('nodes', {}).get(node)
+        if not node_infos:
+            return []
+        if node_infos.get('coverage') is not None:
+            return node_infos['coverage']
+        start, end = node_infos['range']
+        return [[start, end, 1.0]]
+
+    def list_cached_frames(self, node):
+        return decode_frames_runs(self.get_coverage(node))
+
+    def is_frame_cached(self, node, frame):
+        return is_frame_in_runs(self.get_coverage(node), frame)
+
     def set_timespent(self, nodes=None, seconds=0):
         nodes = nodes or self.infos.get('nodes')
         if nodes:
@@ -81,6 +145,34 @@ class CacheVersion(object):
                 self.infos['nodes'][node]['timespent'] = seconds
         self.save_infos()
 
+    def set_checkpoint(self, frame):
+        self.infos['checkpoint'] = frame
+        self.save_infos()
+
+    def set_storage_format(self, storage_format):
+        self.infos['storage'] = storage_format
+        self.save_infos()
+
+    def set_starred(self, state):
+        self.infos['starred'] = state
+        self.save_infos()
+
+    def set_last_connection_time(self):
+        self.infos['last_connection_time'] = time.time()
+        self.save_infos()
+
+    def set_wedge_descriptor(self, descriptor):
+        self.infos['wedge_descriptor'] = descriptor
+        self.save_infos()
+
+    def set_wedge_analysis(self, analysis):
+        self.infos['wedge_analysis'] = analysis
+        self.save_infos()
+
+    def set_preview(self, preview):
+        self.infos['preview'] = preview
+        self.save_infos()
+
     def add_playblast(self, playblast_filename):
         self.infos.get('playblasts').append(playblast_filename)
         self.save_infos()
@@ -101,12 +193,26 @@ class CacheVersion(object):
     def name(self):
         return self.infos.get('name')
 
+    @property
+    def storage_format(self):
+        return self.infos.get('storage') or DEFAULT_STORAGE_FORMAT
+
     @property
     def workspace(self):
         return os.path.dirname(self.directory)
 
     def update(self):
         self.infos = load_json(self.infos_path)
+        self._infos_stat = get_stat_key(self.infos_path)
+
+    def update_if_modified(self):
+        ''' Reload the infos only if the file changed since the last load. It
+        costs a stat instead of a json parsing. Return True if reloaded. '''
+        stat = get_stat_key(self.infos_path)
+        if stat is None or stat == self._infos_stat:
+            return False
+        self.update()
+        return True
 
     def update_modification_time(self):
         self.infos['modification_time'] = time.time()
@@ -126,6 +232,56 @@ class CacheVersion(object):
         return reprname
 
 
+def get_stat_key(filename):
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return stat.st_mtime, stat.st_size
+
+
+def encode_frames_runs(frames):
+    """ Run-length encode the frames as a list of [start, end, step] runs of
+    regularly spaced frames. A gap or a change of sampling starts a new run.
+    A run of a single frame has a step of 0.
+    """
+    runs = []
+    for frame in sorted(set(frames)):
+        if runs:
+            run = runs[-1]
+            step = frame - run[1]
+            regular = not run[2] or abs(step - run[2]) < FRAME_TOLERANCE
+            if regular and step <= MAXIMUM_RUN_STEP + FRAME_TOLERANCE:
+                run[1] = frame
+                run[2] = run[2] or step
+                continue
+        runs.append([frame, frame, 0])
+    return runs
+
+
+def decode_frames_runs(runs):
+    frames = []
+    for start, end, step in runs:
+        if not step:
+            frames.append(start)
+            continue
+        count = int(round((end - start) / step))
+        frames.extend(round(start + i * step, 6) for i in range(count + 1))
+    return frames
+
+
+def is_frame_in_runs(runs, frame):
+    for start, end, step in runs:
+        if frame < start - FRAME_TOLERANCE or frame > end + FRAME_TOLERANCE:
+            continue
+        if not step:
+            return True
+        offset = (frame - start) / step
+        if abs(offset - round(offset)) * step < FRAME_TOLERANCE:
+            return True
+    return False
+
+
 def load_json(filename):
     with open(filename, 'r') as f:
         return json.load(f)
@@ -279,6 +435,63 @@ def move_playblast_to_cacheversion(source, cacheversion):
     return destination
 
 
+@contextmanager
+def infos_lock(directory):
+    ''' Lock the cacheversion infos between several processes. The lock is a
+    file created exclusively in the cacheversion directory.
+    '''
+    filename = os.path.join(directory, INFOS_LOCK_FILENAME)
+    start_time = time.time()
+    while True:
+        try:
+            descriptor = os.open(filename, os.O_CREAT | os.O_EXCL | os.O_RDWR)
+            break
+        except OSError:
+            if time.time() - start_time > INFOS_LOCK_TIMEOUT:
+                raise RuntimeError('Infos lock timeout: {}'.format(filename))
+            time.sleep(0.1)
+    try:
+        yield
+    finally:
+        os.close(descriptor)
+        os.remove(filename)
+
+
+def merge_partial_infos(cacheversion, nodes):
+    ''' Merge the given nodes entries, the playblasts, the checkpoint and the
+    storage format of the partial infos in the cacheversion infos. The
+    version is resumable from the lowest checkpoint of his jobs. The storage
+    format is the same for every solver group, the first one merged is kept.
+    The partial infos file is removed and the cacheversion is switched back
+    to the common infos.
+    '''
+    if cacheversion.partial_infos_path is None:
+        return
+    partial_infos = cacheversion.infos
+    with infos_lock(cacheversion.directory):
+        infos = load_json(cacheversion.infos_path)
+        for node in nodes:
+            _, nodename = split_namespace_nodename(node)
+            infos['nodes'][nodename] = partial_infos['nodes'][nodename]
+        for playblast in partial_infos['playblasts']:
+            if playblast not in infos['playblasts']:
+                infos['playblasts'].append(playblast)
+        infos['modification_time'] = max(
+            infos['modification_time'], partial_infos['modification_time'])
+        checkpoints = [
+            checkpoint for checkpoint in (
+                infos.get('checkpoint'), partial_infos.get('checkpoint'))
+            if checkpoint is not None]
+        if checkpoints:
+            infos['checkpoint'] = min(checkpoints)
+        if not infos.get('storage') and partial_infos.get('storage'):
+            infos['storage'] = partial_infos['storage']
+        save_json(cacheversion.infos_path, infos)
+    os.remove(cacheversion.partial_infos_path)
+    cacheversion.partial_infos_path = None
+    cacheversion.infos = infos
+
+
 def get_log_filename(cacheversion):
     return os.path.join(cacheversion.directory, LOG_FILENAME)
 
@@ -295,7 +508,18 @@ def list_tmp_jpeg_under_cacheversion(cacheversion):
 def extract_xml_attributes(xml_file):
     """ Read an xml file save maya the maya cacheFile command, and convert it
     to a python dictionnary of {"maya_plug": value}
+    The parsed attributes are kept until the file is modified. A copy is
+    returned, the callers can modify it.
     """
+    key = get_stat_key(xml_file)
+    cached = _xml_attributes_cache.get(xml_file)
+    if cached is None or cached[0] != key:
+        cached = key, parse_xml_attributes(xml_file)
+        _xml_attributes_cache[xml_file] = cached
+    return dict(cached[1])
+
+
+def parse_xml_attributes(xml_file):
     tree = xml.etree.ElementTree.parse(xml_file).getroot()
     attributes = [element.text.split("=") for element in tree.findall('extra')]
     return {
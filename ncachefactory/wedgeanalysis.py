@@ -0,0 +1,314 @@
+"""
+This module analyse the cacheversions of a wedge to limit the review to a few
+representative results.
+A compact descriptor is computed for every version from his caches:
+    - trajectories: positions of a few vertices on a few sampled frames
+    - bounding boxes: min and max corners on the sampled frames
+    - stretch: mean and max length ratio between sampled vertices and their
+      nearest neighbor at the first frame. The caches don't contain the
+      topology, this approximates the edge stretching.
+The versions are clustered with a k-medoids on the normalized descriptors.
+The medoid of every cluster is flagged as representative. The exploded
+results are excluded from the clustering and the near identical results are
+flagged as duplicates. The versions without frame cached (e.g. a job killed
+before his first frame) are flagged as empty and excluded too.
+
+The descriptors are saved in the infos of every version as
+'wedge_descriptor' and reused while the version isn't modified.
+The results are saved in the infos of every version:
+    'wedge_analysis': {
+        'time': 65000,
+        'versions': ['version_001', 'version_002', ...],
+        'cluster': 0 or None (exploded),
+        'cluster_size': 4,
+        'representative': True,
+        'flags': ['exploded', 'empty', 'duplicate of version_002'],
+        'distance': 0.35 (distance to the representative)}
+"""
+
+import math
+import time
+
+from ncachefactory.cachediff import list_cache_frames, load_positions
+from ncachefactory.versioning import find_file_match
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+SAMPLED_FRAMES = 12
+SAMPLED_VERTICES = 32
+NEIGHBOR_CANDIDATES = 512
+EXPLOSION_FACTOR = 10.0
+EXPLOSION_STRETCH = 5.0
+DUPLICATE_TOLERANCE = 1e-2
+MAXIMUM_CLUSTERS = 8
+KMEDOIDS_ITERATIONS = 20
+
+
+def sample_indexes(count, samples):
+    if count <= samples:
+        return list(range(count))
+    step = (count - 1) / float(samples - 1)
+    return [int(round(i * step)) for i in range(samples)]
+
+
+def get_point(positions, index):
+    return (
+        float(positions[index * 3]),
+        float(positions[index * 3 + 1]),
+        float(positions[index * 3 + 2]))
+
+
+def distance(point1, point2):
+    return math.sqrt(sum((a - b) ** 2 for a, b in zip(point1, point2)))
+
+
+def compute_bounding_box(positions):
+    if numpy is not None:
+        points = numpy.asarray(positions, dtype=numpy.float64).reshape(-1, 3)
+        corners = list(points.min(axis=0)) + list(points.max(axis=0))
+        return [float(v) for v in corners]
+    minimums = [min(positions[axis::3]) for axis in range(3)]
+    maximums = [max(positions[axis::3]) for axis in range(3)]
+    return [float(v) for v in minimums + maximums]
+
+
+def find_neighbors(points, candidates):
+    ''' Return the index of the nearest candidate of every point, skipping
+    the candidates at the same position. '''
+    neighbors = []
+    for point in points:
+        distances = [distance(point, candidate) for candidate in candidates]
+        distances = [(d, i) for i, d in enumerate(distances) if d > 0]
+        neighbors.append(min(distances)[1] if distances else None)
+    return neighbors
+
+
+def compute_cache_descriptor(xml_file):
+    """ Return a dict containing the descriptor blocks of a cache. The cache
+    is flagged as exploded if his bounding box grows more than
+    EXPLOSION_FACTOR, if the stretch exceeds EXPLOSION_STRETCH or if the
+    positions aren't finite.
+    """
+    frames = list_cache_frames(xml_file)
+    if not frames:
+        return {'exploded': False, 'empty': True}
+    times = sorted(frames)
+    times = [times[i] for i in sample_indexes(len(times), SAMPLED_FRAMES)]
+    first = load_positions(frames[times[0]])
+    vertex_count = len(first) // 3
+    candidates_indexes = sample_indexes(vertex_count, NEIGHBOR_CANDIDATES)
+    vertices = [
+        candidates_indexes[i] for i in
+        sample_indexes(len(candidates_indexes), SAMPLED_VERTICES)]
+    candidates = [get_point(first, i) for i in candidates_indexes]
+    neighbors = find_neighbors(
+        [get_point(first, i) for i in vertices], candidates)
+    pairs = [
+        (vertex, candidates_indexes[neighbor])
+        for vertex, neighbor in zip(vertices, neighbors)
+        if neighbor is not None]
+    rest_lengths = [
+        distance(get_point(first, a), get_point(first, b)) for a, b in pairs]
+
+    trajectories, bounding_boxes, stretch = [], [], []
+    exploded = False
+    for time_ in times:
+        positions = load_positions(frames[time_])
+        if len(positions) != len(first):
+            # topology changed, the vertices don't match anymore
+            exploded = True
+            break
+        for vertex in vertices:
+            trajectories.extend(get_point(positions, vertex))
+        bounding_boxes.extend(compute_bounding_box(positions))
+        ratios = [
+            distance(get_point(positions, a), get_point(positions, b)) / rest
+            for (a, b), rest in zip(pairs, rest_lengths)] or [1.0]
+        stretch.extend((sum(ratios) / len(ratios), max(ratios)))
+
+    values = trajectories + bounding_boxes + stretch
+    if exploded or not all(is_finite(value) for value in values):
+        return {'exploded': True}
+    diagonals = [
+        distance(bounding_boxes[i:i + 3], bounding_boxes[i + 3:i + 6])
+        for i in range(0, len(bounding_boxes), 6)]
+    growth = max(diagonals) / diagonals[0] if diagonals[0] else 1.0
+    stretch_max = max(stretch[1::2]) if stretch else 1.0
+    exploded = growth > EXPLOSION_FACTOR or stretch_max > EXPLOSION_STRETCH
+    return {
+        'exploded': exploded,
+        'trajectories': trajectories,
+        'bounding_boxes': bounding_boxes,
+        'stretch': stretch}
+
+
+def is_finite(value):
+    return not (math.isnan(value) or math.isinf(value))
+
+
+def compute_cacheversion_descriptor(cacheversion, nodes=None):
+    ''' Concatenate the descriptors of the given nodes caches (all the nodes
+    of the version by default). '''
+    nodes = nodes or sorted(cacheversion.infos.get('nodes', {}))
+    descriptor = {
+        'exploded': False, 'empty': False, 'trajectories': [],
+        'bounding_boxes': [],
+        'stretch': [], 'nodes': nodes, 'time': time.time()}
+    for node in nodes:
+        xml_file = find_file_match(node, cacheversion, extension='xml')
+        if not xml_file:
+            continue
+        node_descriptor = compute_cache_descriptor(xml_file)
+        if node_descriptor.get('empty'):
+            descriptor['empty'] = True
+            break
+        if node_descriptor['exploded']:
+            descriptor['exploded'] = True
+            break
+        for key in ('trajectories', 'bounding_boxes', 'stretch'):
+            descriptor[key].extend(node_descriptor[key])
+    return descriptor
+
+
+def get_cacheversion_descriptor(cacheversion, nodes=None, force=False):
+    ''' Return the descriptor saved in the infos if it is more recent than
+    the last modification of the version, compute and save it otherwise. '''
+    nodes = nodes or sorted(cacheversion.infos.get('nodes', {}))
+    descriptor = cacheversion.infos.get('wedge_descriptor')
+    modification_time = cacheversion.infos.get('modification_time') or 0
+    if (force is False and descriptor and descriptor['nodes'] == nodes and
+            descriptor['time'] > modification_time):
+        return descriptor
+    descriptor = compute_cacheversion_descriptor(cacheversion, nodes)
+    cacheversion.set_wedge_descriptor(descriptor)
+    return descriptor
+
+
+def normalize_descriptors(descriptors):
+    """ Build the feature vectors. Every dimension is standardized across the
+    versions and every block is weighted to have the same influence whatever
+    his size. The blocks are truncated to the shortest cache.
+    """
+    vectors = [[] for _ in descriptors]
+    for key in ('trajectories', 'bounding_boxes', 'stretch'):
+        size = min(len(d[key]) for d in descriptors)
+        if not size:
+            continue
+        weight = 1.0 / math.sqrt(size)
+        for dimension in range(size):
+            values = [d[key][dimension] for d in descriptors]
+            mean = sum(values) / len(values)
+            deviation = math.sqrt(
+                sum((v - mean) ** 2 for v in values) / len(values))
+            # constant dimensions are ignored
+            deviation = deviation or float('inf')
+            for vector, value in zip(vectors, values):
+                vector.append((value - mean) / deviation * weight)
+    return vectors
+
+
+def compute_distance_matrix(vectors):
+    if numpy is not None:
+        array = numpy.asarray(vectors, dtype=numpy.float64)
+        squared = (array * array).sum(axis=1)
+        matrix = squared[:, None] + squared[None, :] - 2 * array.dot(array.T)
+        return numpy.sqrt(numpy.maximum(matrix, 0)).tolist()
+    return [[distance(v1, v2) for v2 in vectors] for v1 in vectors]
+
+
+def choose_clusters_count(count):
+    return max(1, min(MAXIMUM_CLUSTERS, int(round(math.sqrt(count / 2.0)))))
+
+
+def kmedoids(matrix, clusters_count):
+    """ Cluster the items of the distance matrix. The medoids are initialized
+    by farthest point sampling to be deterministic. Return the medoids and
+    the medoid index of every item.
+    """
+    count = len(matrix)
+    # the first medoid is the most central item
+    medoids = [min(range(count), key=lambda i: sum(matrix[i]))]
+    while len(medoids) < min(clusters_count, count):
+        farthest = max(
+            range(count), key=lambda i: min(matrix[i][m] for m in medoids))
+        if farthest in medoids:
+            break
+        medoids.append(farthest)
+
+    for _ in range(KMEDOIDS_ITERATIONS):
+        assignments = [
+            min(medoids, key=lambda m: matrix[i][m]) for i in range(count)]
+        new_medoids = []
+        for medoid in medoids:
+            members = [i for i in range(count) if assignments[i] == medoid]
+            new_medoids.append(min(
+                members, key=lambda c: sum(matrix[c][m] for m in members)))
+        if sorted(new_medoids) == sorted(medoids):
+            break
+        medoids = new_medoids
+    assignments = [
+        min(medoids, key=lambda m: matrix[i][m]) for i in range(count)]
+    return medoids, assignments
+
+
+def analyse_wedge(
+        cacheversions, nodes=None, clusters_count=None, force=False):
+    """ Analyse the cacheversions, save the result in their infos and return
+    the analysis by cacheversion name. By default, the number of clusters
+    depends of the number of versions.
+    """
+    descriptors = [
+        get_cacheversion_descriptor(cv, nodes, force) for cv in cacheversions]
+    names = [cv.name for cv in cacheversions]
+    analyses = {
+        name: {
+            'time': time.time(),
+            'versions': names,
+            'cluster': None,
+            'cluster_size': 0,
+            'representative': False,
+            'flags': [],
+            'distance': None}
+        for name in names}
+
+    valid = [
+        i for i, d in enumerate(descriptors)
+        if not d['exploded'] and not d.get('empty')]
+    for i, descriptor in enumerate(descriptors):
+        if descriptor.get('empty'):
+            analyses[names[i]]['flags'].append('empty')
+        elif i not in valid:
+            analyses[names[i]]['flags'].append('exploded')
+
+    if valid:
+        vectors = normalize_descriptors([descriptors[i] for i in valid])
+        matrix = compute_distance_matrix(vectors)
+        clusters_count = clusters_count or choose_clusters_count(len(valid))
+        medoids, assignments = kmedoids(matrix, clusters_count)
+        for i, medoid in enumerate(assignments):
+            analysis = analyses[names[valid[i]]]
+            analysis['cluster'] = medoids.index(medoid)
+            analysis['cluster_size'] = assignments.count(medoid)
+            analysis['representative'] = i == medoid
+            analysis['distance'] = matrix[i][medoid]
+            duplicates = [
+                names[valid[j]] for j in range(i)
+                if matrix[i][j] < DUPLICATE_TOLERANCE]
+            if duplicates:
+                analysis['flags'].append('duplicate of ' + duplicates[0])
+
+    for cacheversion in cacheversions:
+        cacheversion.set_wedge_analysis(analyses[cacheversion.name])
+    return analyses
+
+
+def list_representatives(analyses):
+    ''' Return the names of the representatives sorted by cluster. '''
+    representatives = [
+        (analysis['cluster'], name) for name, analysis in analyses.items()
+        if analysis['representative']]
+    return [name for _, name in sorted(representatives)]
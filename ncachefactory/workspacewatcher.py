@@ -0,0 +1,80 @@
+"""
+This module watch a workspace and push the cacheversions changes to the
+interface. The watcher polls the file system states (os.stat) instead of
+reloading the infos.json, the files are only parsed when they changed.
+The polling is used instead of QFileSystemWatcher which isn't reliable on
+network file systems.
+"""
+
+import os
+from PySide2 import QtCore
+
+from ncachefactory.versioning import (
+    list_available_cacheversions, INFOS_FILENAME)
+
+
+POLLING_INTERVAL = 2000
+
+
+class WorkspaceWatcher(QtCore.QObject):
+    # emitted when versions are added or removed, the list of
+    # cacheversions is reloaded.
+    cacheversionsChanged = QtCore.Signal(list)
+    # emitted with the cacheversions which infos were modified.
+    cacheversionsModified = QtCore.Signal(list)
+
+    def __init__(self, interval=POLLING_INTERVAL, parent=None):
+        super(WorkspaceWatcher, self).__init__(parent)
+        self.workspace = None
+        self.cacheversions = []
+        self._workspace_mtime = None
+        # folders without infos yet, the version can be in creation
+        self._pending_directories = []
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.check)
+
+    def set_workspace(self, workspace):
+        self.workspace = workspace
+        self._workspace_mtime = self.get_workspace_mtime()
+        self.cacheversions = list_available_cacheversions(workspace)
+        self._pending_directories = [
+            os.path.join(workspace, folder) for folder in os.listdir(workspace)
+            if not os.path.exists(
+                os.path.join(workspace, folder, INFOS_FILENAME))]
+        self.cacheversionsChanged.emit(self.cacheversions)
+
+    def get_workspace_mtime(self):
+        try:
+            return os.stat(self.workspace).st_mtime
+        except (OSError, TypeError):
+            return None
+
+    def start(self):
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def check(self):
+        ''' Emit the changes since the last check. The creation or deletion
+        of a version folder modifies the workspace mtime. '''
+        if not self.workspace:
+            return
+        mtime = self.get_workspace_mtime()
+        created = any(
+            os.path.exists(os.path.join(directory, INFOS_FILENAME))
+            for directory in self._pending_directories)
+        if mtime != self._workspace_mtime or created:
+            self.set_workspace(self.workspace)
+            return
+        modified = []
+        for cacheversion in self.cacheversions:
+            try:
+                if cacheversion.update_if_modified():
+                    modified.append(cacheversion)
+            except ValueError:
+                # the infos are read while they're written.
+                continue
+        if modified:
+            self.cacheversionsModified.emit(modified)
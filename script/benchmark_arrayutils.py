@@ -0,0 +1,47 @@
+"""
+Micro benchmarks of the arrayutils range functions on 100 ranges of 10000
+frames, the size of a contact sheet of a large wedge.
+The ncachefactory package must be in the PYTHONPATH.
+    python benchmark_arrayutils.py
+"""
+
+import random
+import timeit
+
+from ncachefactory.arrayutils import (
+    overlap_arrays_from_ranges, range_ranges, normalize_ranges, merge_ranges)
+
+
+RANGES_COUNT = 100
+FRAMES_COUNT = 10000
+REPEAT = 5
+
+
+def create_ranges(count=RANGES_COUNT, frames=FRAMES_COUNT, seed=0):
+    ''' Ranges of frames length starting randomly, some of them leave gaps '''
+    generator = random.Random(seed)
+    ranges = []
+    for _ in range(count):
+        start = generator.randint(0, frames * 3)
+        ranges.append([start, start + frames - 1])
+    return ranges
+
+
+def benchmark(name, function):
+    seconds = min(timeit.repeat(function, number=1, repeat=REPEAT))
+    print('{:<30} {:>10.2f} ms'.format(name, seconds * 1000))
+
+
+def run():
+    ranges = create_ranges()
+    arrays = [[object()] * FRAMES_COUNT for _ in ranges]
+    benchmark('normalize_ranges', lambda: normalize_ranges(ranges))
+    benchmark('merge_ranges', lambda: merge_ranges(ranges))
+    benchmark('range_ranges', lambda: range_ranges(ranges))
+    benchmark(
+        'overlap_arrays_from_ranges',
+        lambda: overlap_arrays_from_ranges(arrays, ranges))
+
+
+if __name__ == "__main__":
+    run()
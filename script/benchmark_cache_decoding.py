@@ -0,0 +1,125 @@
+"""
+Compare the size and the decoding speed of the cache storage formats.
+The ncachefactory package must be in the PYTHONPATH.
+    mayapy benchmark_cache_decoding.py [path to a cache xml] [--frames 200]
+If no cache is given, a synthetic cache (a waving sheet) is generated.
+"""
+
+import os
+import math
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from array import array
+
+from ncachefactory.mcc import read_mcc, write_mcc
+from ncachefactory.cachecompression import (
+    compress_cache, CompressedCacheReader, list_geometry_mcc_files)
+from ncachefactory.deltacodec import encode_delta_cache, DeltaCacheReader
+
+
+def create_synthetic_cache(directory, frames, vertices):
+    xml_file = os.path.join(directory, 'benchmarkShape.xml')
+    with open(xml_file, 'w') as f:
+        f.write('<Autodesk_Cache_File/>')
+    seeds = [random.random() for _ in range(vertices)]
+    for frame in range(1, frames + 1):
+        positions = array('f')
+        for i, seed in enumerate(seeds):
+            x, z = i % 100, i // 100
+            y = math.sin(frame * 0.1 + x * 0.2 + seed * 0.01) * 5
+            positions.extend((x, y, z))
+        channels = [('benchmarkShape_positions', b'FVCA', positions)]
+        filename = 'benchmarkShapeFrame{}.mcc'.format(frame)
+        header = {'version': '0.1', 'start': frame * 250, 'end': frame * 250}
+        write_mcc(os.path.join(directory, filename), header, [(None, channels)])
+    return xml_file
+
+
+def get_size(filenames):
+    return sum(os.path.getsize(filename) for filename in filenames)
+
+
+def benchmark(label, function, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.time()
+        function()
+        timings.append(time.time() - start)
+    print('    {:<28} {:.3f}s'.format(label, min(timings)))
+
+
+def read_all_mcc(mcc_files):
+    for mcc_file in mcc_files:
+        read_mcc(mcc_file)
+
+
+def read_all_chunks(reader):
+    for _ in reader.iter_chunks():
+        pass
+
+
+def read_random_chunks(reader, indices):
+    for index in indices:
+        reader.read_chunk(index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('xml_file', nargs='?', default=None)
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--vertices', type=int, default=10000)
+    parser.add_argument('--codec', default=None)
+    parser.add_argument('--keyframe_interval', type=int, default=25)
+    arguments = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        if arguments.xml_file:
+            source = os.path.dirname(arguments.xml_file)
+            xml_file = os.path.join(
+                directory, os.path.basename(arguments.xml_file))
+            shutil.copy(arguments.xml_file, xml_file)
+            for mcc_file in list_geometry_mcc_files(arguments.xml_file):
+                shutil.copy(mcc_file, directory)
+            print('cache: ' + source)
+        else:
+            xml_file = create_synthetic_cache(
+                directory, arguments.frames, arguments.vertices)
+        mcc_files = list_geometry_mcc_files(xml_file)
+        mcz = compress_cache(xml_file, codec=arguments.codec)
+        mcd = encode_delta_cache(
+            xml_file, codec=arguments.codec,
+            keyframe_interval=arguments.keyframe_interval)
+
+        mcc_size = float(get_size(mcc_files))
+        print('sizes')
+        for label, size in (
+                ('mcc', mcc_size),
+                ('mcz (quantized)', get_size([mcz])),
+                ('mcd (delta lossless)', get_size([mcd]))):
+            print('    {:<28} {:>12} bytes ({:.1%})'.format(
+                label, int(size), size / mcc_size))
+
+        mcz_reader = CompressedCacheReader(mcz)
+        mcd_reader = DeltaCacheReader(mcd)
+        indices = list(range(len(mcd_reader)))
+        random.shuffle(indices)
+        print('decoding')
+        benchmark('mcc sequential', lambda: read_all_mcc(mcc_files))
+        benchmark('mcz sequential', lambda: read_all_chunks(mcz_reader))
+        benchmark('mcd sequential', lambda: read_all_chunks(mcd_reader))
+        benchmark(
+            'mcz random access',
+            lambda: read_random_chunks(mcz_reader, indices))
+        benchmark(
+            'mcd random access',
+            lambda: read_random_chunks(mcd_reader, indices))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
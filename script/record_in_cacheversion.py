@@ -13,6 +13,13 @@ The script create a ncache in background, this is the arguments orders
     -playblast_camera
     -timelimit
     -stretchmax
+    -attribute_override
+    -attribute_override_value
+    -checkpoint_interval
+    -storage_format
+    -solver_group
+If the cacheversion contains a checkpoint, the script resume the cache from
+this frame instead of recording it from the start.
 """
 
 import os
@@ -34,6 +41,9 @@ TIMELIMIT_HELP = "time limit per frame evaluated in second (0 is no limit)"
 STRETCH_LIMIT_HELP = "Stretch max supported by output mesh (0 is no limit)"
 ATTRIBUTE_OVERRIDE_HELP = "Plug name which is overrided for simlulation"
 ATTRIBUTE_OVERRIDE_VALUE_HELP = "Attribute overrided value"
+CHECKPOINT_INTERVAL_HELP = "Frames cached between checkpoints (0 is none)"
+STORAGE_FORMAT_HELP = "Companion cache written after the record (none, mcz, mcd)"
+SOLVER_GROUP_HELP = "Index of the solvers group cached in parallel (-1 is none)"
 
 INFOS = """\
 Scripts Arguments:
@@ -50,6 +60,9 @@ Scripts Arguments:
     - Stretch max supported = {arguments.stretchmax} * input edge length
     - Attribute override = {arguments.attribute_override}
     - Attribute override value = {arguments.attribute_override_value}
+    - Checkpoint interval = {arguments.checkpoint_interval}
+    - Storage format = {arguments.storage_format}
+    - Solver group = {arguments.solver_group}
 """
 
 try:
@@ -68,6 +81,9 @@ try:
     parser.add_argument('stretchmax', help=STRETCH_LIMIT_HELP, type=int)
     parser.add_argument('attribute_override', help=ATTRIBUTE_OVERRIDE_HELP)
     parser.add_argument('attribute_override_value', help=ATTRIBUTE_OVERRIDE_VALUE_HELP, type=float)
+    parser.add_argument('checkpoint_interval', help=CHECKPOINT_INTERVAL_HELP, type=int)
+    parser.add_argument('storage_format', help=STORAGE_FORMAT_HELP)
+    parser.add_argument('solver_group', help=SOLVER_GROUP_HELP, type=int)
     arguments = parser.parse_args()
 
     def force_log_info(message):
@@ -88,13 +104,25 @@ try:
 
     force_log_info("initializing maya ...")
     from maya import cmds
-    from ncachefactory.versioning import CacheVersion
-    from ncachefactory.cachemanager import record_in_existing_cacheversion
+    from ncachefactory.versioning import CacheVersion, merge_partial_infos
+    from ncachefactory.batch import (
+        attach_baked_inputs, get_solver_group_suffix, NO_STORAGE_FORMAT)
+    from ncachefactory.farm import (
+        write_job_status, write_job_heartbeat, is_kill_requested, RUNNING,
+        FINISHED, FAILED, KILLED)
+    from ncachefactory.cachemanager import (
+        record_in_existing_cacheversion, resume_cacheversion)
     from ncachefactory.ncloth import is_output_too_streched
     from ncachefactory.viewporttext import create_viewport_text
     from ncachefactory.timecallbacks import (
         add_to_time_callback, get_timespent_since_last_frame_set, time_verbose,
         register_time_callback)
+    storage_format = arguments.storage_format
+    if storage_format == NO_STORAGE_FORMAT:
+        storage_format = None
+    # the jobs caching solver groups in parallel suffix their files
+    suffix = get_solver_group_suffix(arguments.solver_group)
+    write_job_status(arguments.directory, RUNNING, suffix=suffix)
     import maya.standalone
     maya.standalone.initialize(name='python')
     force_log_info("... maya initialized")
@@ -119,14 +147,32 @@ try:
 
         if result:
             logging.error("User defined explosion limit reached.")
+            write_job_status(
+                arguments.directory, FAILED, "explosion limit", suffix)
             cmds.quit(force=True)
             exit()
 
+    def kill_request_check(directory):
+        """ this function is a time changed callback which stop the
+        simulation if the monitor requested it. That's the only way to stop
+        a job running on a farm machine. The status is refreshed to show
+        the job is alive. """
+        if not is_kill_requested(directory, suffix):
+            write_job_heartbeat(directory, suffix)
+            return
+        force_log_info("kill requested")
+        write_job_status(directory, KILLED, suffix=suffix)
+        cmds.quit(force=True)
+        exit()
+
     # force dg evaluation to DG to ensure not multi thread usage.
     cmds.evaluationManager(mode="off")
     force_log_info('open maya scene ...')
     cmds.file(arguments.scene, open=True, force=True)
     force_log_info('maya scene opened')
+    baked_meshes = attach_baked_inputs(arguments.scene)
+    if baked_meshes:
+        force_log_info("baked inputs attached: " + ", ".join(baked_meshes))
     cacheversion = CacheVersion(arguments.directory)
 
     attribute = arguments.attribute_override
@@ -150,6 +196,7 @@ try:
         arguments.timelimit,
         arguments.stretchmax)
     add_to_time_callback(func)
+    add_to_time_callback(partial(kill_request_check, arguments.directory))
     register_time_callback()
 
     display_values = [
@@ -167,21 +214,47 @@ try:
         'viewport_display_values': display_values,
         'camera': arguments.playblast_camera}
 
-    cacheversion = CacheVersion(arguments.directory)
-    record_in_existing_cacheversion(
-        cacheversion=cacheversion,
-        start_frame=arguments.start_frame,
-        end_frame=arguments.end_frame,
-        nodes=arguments.nodes.split(', '),
-        evaluate_every_frame=arguments.evaluate_every_frame,
-        save_every_evaluation=arguments.save_every_evaluation,
-        behavior=0,
-        playblast=True,
-        playblast_viewport_options=playblast_viewport_options)
+    cacheversion = CacheVersion(arguments.directory, partial_suffix=suffix)
+    checkpoint = cacheversion.infos.get('checkpoint')
+    # only the first solver group job record the playblast
+    playblast = arguments.solver_group <= 0
+    if checkpoint is not None:
+        force_log_info("resume cache from checkpoint: {}".format(checkpoint))
+        resume_cacheversion(
+            cacheversion=cacheversion,
+            end_frame=arguments.end_frame,
+            nodes=arguments.nodes.split(', '),
+            evaluate_every_frame=arguments.evaluate_every_frame,
+            save_every_evaluation=arguments.save_every_evaluation,
+            playblast=playblast,
+            playblast_viewport_options=playblast_viewport_options,
+            checkpoint_interval=arguments.checkpoint_interval,
+            storage_format=storage_format)
+    else:
+        record_in_existing_cacheversion(
+            cacheversion=cacheversion,
+            start_frame=arguments.start_frame,
+            end_frame=arguments.end_frame,
+            nodes=arguments.nodes.split(', '),
+            evaluate_every_frame=arguments.evaluate_every_frame,
+            save_every_evaluation=arguments.save_every_evaluation,
+            behavior=0,
+            playblast=playblast,
+            playblast_viewport_options=playblast_viewport_options,
+            checkpoint_interval=arguments.checkpoint_interval,
+            storage_format=storage_format)
+    merge_partial_infos(cacheversion, arguments.nodes.split(', '))
+    write_job_status(arguments.directory, FINISHED, suffix=suffix)
     force_log_info("process is terminated")
 
 except Exception:
     import traceback
     logging.error(traceback.format_exc())
+    try:
+        write_job_status(
+            arguments.directory, FAILED, traceback.format_exc(), suffix)
+    except Exception:
+        # the failure can come from the ncachefactory import itself.
+        pass
     force_log_info("process is terminated")
 
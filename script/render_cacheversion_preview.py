@@ -0,0 +1,26 @@
+"""
+This is a standalone script which to by launched in a mayapy.
+The ncache manager path has to be set in the PYTHONPATH.
+The script render a geometry preview of a cacheversion from his cached
+positions. Maya isn't initialized, numpy is recommended.
+    mayapy render_cacheversion_preview.py directory [--frames 8] [--size 128]
+    [--view front]
+"""
+
+import argparse
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('directory', help='cacheversion directory')
+    parser.add_argument('--frames', type=int, default=8)
+    parser.add_argument('--size', type=int, default=128)
+    parser.add_argument('--view', default='front')
+    arguments = parser.parse_args()
+
+    from ncachefactory.versioning import CacheVersion
+    from ncachefactory.preview import render_cacheversion_preview
+    cacheversion = CacheVersion(arguments.directory)
+    render_cacheversion_preview(
+        cacheversion, frames_count=arguments.frames, size=arguments.size,
+        view=arguments.view)
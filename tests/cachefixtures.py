@@ -0,0 +1,33 @@
+"""
+Helpers writing the fake geometry caches used by the tests.
+"""
+
+import os
+from array import array
+
+from ncachefactory.mcc import write_mcc
+
+
+CACHE_XML = """\
+<?xml version="1.0"?>
+<Autodesk_Cache_File>
+  <cacheTimePerFrame TimePerFrame="250"/>
+</Autodesk_Cache_File>
+"""
+
+
+def write_fake_cache(directory, frames_positions, name='clothShape'):
+    ''' Write a cache with one mcc file per frame. frames_positions is a list
+    of flat positions lists starting at the frame 1. Return the xml file. '''
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    xml_file = os.path.join(directory, name + '.xml')
+    with open(xml_file, 'w') as f:
+        f.write(CACHE_XML)
+    for frame, positions in enumerate(frames_positions, 1):
+        channels = [(name + '_positions', b'FVCA', array('f', positions))]
+        header = {'version': '0.1', 'start': frame * 250, 'end': frame * 250}
+        filename = os.path.join(
+            directory, '{}Frame{}.mcc'.format(name, frame))
+        write_mcc(filename, header, [(None, channels)])
+    return xml_file
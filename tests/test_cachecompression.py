@@ -0,0 +1,68 @@
+import os
+import random
+import tempfile
+from array import array
+
+from ncachefactory.mcc import read_mcc, write_mcc
+from ncachefactory.cachecompression import (
+    compress_cache, expand_cache, CompressedCacheReader,
+    list_geometry_mcc_files, QUANTIZATION_MAX)
+from ncachefactory.deltacodec import encode_delta_cache, DeltaCacheReader
+
+
+def create_fake_cache(directory, frames=5, vertices=100):
+    xml_file = os.path.join(directory, 'clothShape.xml')
+    with open(xml_file, 'w') as f:
+        f.write('<Autodesk_Cache_File/>')
+    for frame in range(1, frames + 1):
+        header = {'version': '0.1', 'start': 250 * frame, 'end': 250 * frame}
+        positions = array(
+            'f', [random.uniform(-10, 10) for _ in range(vertices * 3)])
+        channels = [
+            ('clothShape_positions', b'FVCA', positions),
+            ('clothShape_mass', b'DBLA', array('d', [frame] * vertices))]
+        filename = 'clothShapeFrame{}.mcc'.format(frame)
+        write_mcc(os.path.join(directory, filename), header, [(None, channels)])
+    return xml_file
+
+
+def test_compression_roundtrip():
+    directory = tempfile.mkdtemp()
+    xml_file = create_fake_cache(directory)
+    originals = {
+        os.path.basename(f): read_mcc(f)
+        for f in list_geometry_mcc_files(xml_file)}
+
+    filename = compress_cache(xml_file, codec='zlib', remove_sources=True)
+    assert not list_geometry_mcc_files(xml_file)
+    reader = CompressedCacheReader(filename)
+    assert len(reader) == 5
+    assert reader.read_chunk(2)[1][2][0] == 3.0
+
+    assert expand_cache(xml_file) is True
+    for mcc_file in list_geometry_mcc_files(xml_file):
+        header, blocks = read_mcc(mcc_file)
+        original_header, original_blocks = originals[os.path.basename(mcc_file)]
+        assert header == original_header
+        original_channels = original_blocks[0][1]
+        channels = blocks[0][1]
+        # the quantization error is at most half a step of the bounding box
+        tolerance = 20.0 / QUANTIZATION_MAX
+        for a, b in zip(original_channels[0][2], channels[0][2]):
+            assert abs(a - b) <= tolerance
+        assert list(original_channels[1][2]) == list(channels[1][2])
+
+
+def test_delta_codec_random_access():
+    directory = tempfile.mkdtemp()
+    xml_file = create_fake_cache(directory, frames=12)
+    mcc_files = sorted(
+        list_geometry_mcc_files(xml_file),
+        key=lambda f: int(f.split('Frame')[-1][:-4]))
+    originals = [read_mcc(f)[1][0][1] for f in mcc_files]
+    filename = encode_delta_cache(xml_file, codec='zlib', keyframe_interval=5)
+    reader = DeltaCacheReader(filename)
+    for index in (7, 3, 4, 11, 0, 10):
+        channels = reader.read_chunk(index)
+        for original, channel in zip(originals[index], channels):
+            assert original[2] == channel[2]
@@ -0,0 +1,58 @@
+import os
+import sys
+import tempfile
+
+from cachefixtures import write_fake_cache
+from ncachefactory.cachediff import compare_caches, compute_cache_coverage
+from ncachefactory.cachecompression import compress_cache
+from ncachefactory.versioning import (
+    encode_frames_runs, decode_frames_runs, is_frame_in_runs)
+
+
+def create_cache(directory, offsets):
+    ''' Create a cache of two vertices. The second one is moved on x by the
+    offset given for every frame. '''
+    return write_fake_cache(
+        directory, [[0, 0, 0, offset, 0, 0] for offset in offsets])
+
+
+def test_compare_caches():
+    directory = tempfile.mkdtemp()
+    xml_file1 = create_cache(os.path.join(directory, 'a'), [0, 0, 0, 0])
+    xml_file2 = create_cache(os.path.join(directory, 'b'), [0, 0, 2, 4])
+    diff = compare_caches(xml_file1, xml_file2, processes=1)
+    assert diff.frames == [1, 2, 3, 4]
+    assert diff.maximums == [0, 0, 2, 4]
+    assert abs(diff.rms[3] - 8 ** 0.5) < 1e-6
+    assert diff.first_divergence_frame == 3
+    # the compressed caches are read when the mcc files are removed.
+    compress_cache(xml_file2, remove_sources=True)
+    diff = compare_caches(xml_file1, xml_file2, processes=1)
+    assert diff.first_divergence_frame == 3
+    assert abs(diff.max_displacement - 4) < 1e-3
+
+
+def test_cache_coverage():
+    directory = tempfile.mkdtemp()
+    xml_file = create_cache(os.path.join(directory, 'a'), [0] * 6)
+    # a killed job left a gap
+    os.remove(os.path.join(directory, 'a', 'clothShapeFrame4.mcc'))
+    runs = compute_cache_coverage(xml_file)
+    assert runs == [[1, 3, 1], [5, 6, 1]]
+    assert decode_frames_runs(runs) == [1, 2, 3, 5, 6]
+    assert is_frame_in_runs(runs, 5) and not is_frame_in_runs(runs, 4)
+    runs = encode_frames_runs([1, 2, 2.5, 3, 3.5, 10])
+    assert runs == [[1, 2, 1], [2.5, 3.5, 0.5], [10, 10, 0]]
+    assert is_frame_in_runs(runs, 3) and not is_frame_in_runs(runs, 2.75)
+
+
+def test_compare_caches_in_pool():
+    directory = tempfile.mkdtemp()
+    offsets = [0] * 10 + [1] * 10
+    xml_file1 = create_cache(os.path.join(directory, 'a'), [0] * 20)
+    xml_file2 = create_cache(os.path.join(directory, 'b'), offsets)
+    # the pool spawns the given executable (mayapy in maya)
+    diff = compare_caches(
+        xml_file1, xml_file2, processes=2, executable=sys.executable)
+    assert diff.maximums == offsets
+    assert diff.first_divergence_frame == 11
@@ -0,0 +1,198 @@
+import os
+import sys
+import time
+import tempfile
+
+from ncachefactory.executors import (
+    LocalExecutor, TemplateExecutor, SshExecutor, FarmExecutor,
+    FarmJob, LocalSubmitter, parse_hosts)
+from ncachefactory.farm import (
+    build_job_description, write_job_description, read_job_description,
+    write_job_status, read_job_status, request_kill, is_kill_requested,
+    clean_job_status, list_live_jobs, QUEUED, RUNNING, FINISHED, FAILED,
+    KILLED, JOB_STATUS_FILENAME, STALE_JOB_DELAY, STALE_QUEUED_JOB_DELAY)
+from ncachefactory.versioning import save_json
+
+
+STUB_SCRIPT = """\
+import sys
+import time
+time.sleep(float(sys.argv[2]))
+with open(sys.argv[1], 'w') as f:
+    f.write('done')
+"""
+FARM_STUB_SCRIPT = """\
+import os
+import sys
+import json
+with open(os.path.join(sys.argv[1], 'job_status.json'), 'w') as f:
+    json.dump({'status': 'finished', 'host': 'localhost'}, f)
+"""
+
+
+class FakeExecutor(TemplateExecutor):
+    """ Run the stub script on fake hosts which are all the local machine """
+    def __init__(self, hosts):
+        super(FakeExecutor, self).__init__('{command}', hosts)
+        self.launched_hosts = []
+
+    def launch(self, arguments, environment, host):
+        self.launched_hosts.append(host)
+        return super(FakeExecutor, self).launch(arguments, environment, host)
+
+
+def create_stub_script(content=STUB_SCRIPT):
+    directory = tempfile.mkdtemp()
+    script = os.path.join(directory, 'stub.py')
+    with open(script, 'w') as f:
+        f.write(content)
+    return directory, script
+
+
+def wait_for(jobs, timeout=10):
+    start = time.time()
+    while any(job.poll() is None for job in jobs):
+        assert time.time() - start < timeout
+        time.sleep(0.05)
+
+
+def test_executors_scheduling():
+    directory, script = create_stub_script()
+    executor = FakeExecutor(hosts={'host1': 1, 'host2': 1})
+    outputs = [os.path.join(directory, str(i)) for i in range(3)]
+    jobs = [
+        executor.submit([sys.executable, script, output, '0.5'], os.environ)
+        for output in outputs]
+    assert [job.status for job in jobs] == [RUNNING, RUNNING, QUEUED]
+    assert sorted(executor.launched_hosts) == ['host1', 'host2']
+    wait_for(jobs)
+    assert [job.status for job in jobs] == [FINISHED] * 3
+    assert all(os.path.exists(output) for output in outputs)
+
+
+def test_executors_kill():
+    directory, script = create_stub_script()
+    executor = LocalExecutor(slots=1)
+    outputs = [os.path.join(directory, str(i)) for i in range(2)]
+    jobs = [
+        executor.submit([sys.executable, script, output, '5'], os.environ)
+        for output in outputs]
+    jobs[1].kill()
+    jobs[0].kill()
+    wait_for(jobs)
+    assert [job.status for job in jobs] == [KILLED, KILLED]
+    assert jobs[1].process is None
+    assert not any(os.path.exists(output) for output in outputs)
+
+
+def test_executors_commands():
+    assert parse_hosts('host1:2, host2;host3:4') == {
+        'host1': 2, 'host2': 1, 'host3': 4}
+    executor = TemplateExecutor('nice -n 10 {command}')
+    command = executor.build_command(['mayapy', 'a b', None], {}, 'localhost')
+    assert command == ['nice', '-n', '10', 'mayapy', 'a b', '']
+    executor = SshExecutor({'host1': 1})
+    environment = {'PYTHONPATH': '/a b', 'HOME': '/home'}
+    command = executor.build_command(['mayapy', 'script'], environment, 'h')
+    assert command[-2:] == ['h', "env 'PYTHONPATH=/a b' mayapy script"]
+
+
+def test_farm_executor():
+    directory, script = create_stub_script(FARM_STUB_SCRIPT)
+    executor = FarmExecutor(LocalSubmitter())
+    job = executor.submit(
+        [sys.executable, script, directory], os.environ, directory=directory)
+    description = read_job_description(directory)
+    assert description['command'][1:] == [script, directory]
+    assert description['farm_id'] is not None
+    wait_for([job])
+    assert job.status == FINISHED
+    job = FarmJob(executor, tempfile.mkdtemp())
+    assert job.status == QUEUED
+    write_job_status(job.directory, RUNNING)
+    assert job.poll() is None
+    job.kill()
+    write_job_status(job.directory, KILLED)
+    assert job.poll() == -1
+
+
+def test_farm_job_failures():
+    directory, script = create_stub_script('import sys')
+    executor = FarmExecutor(LocalSubmitter(), chained=True)
+    # the process ends without writing his status
+    job1 = executor.submit(
+        [sys.executable, script], os.environ, directory=directory)
+    wait_for([job1])
+    assert job1.status == FAILED
+    directory2 = tempfile.mkdtemp()
+    executor.submit(
+        [sys.executable, script], os.environ, directory=directory2)
+    description = read_job_description(directory2)
+    assert description['dependencies'] == [os.path.basename(directory)]
+    # the process died during the cache without updating his status
+    write_job_status(directory2, RUNNING)
+    status = read_job_status(directory2)
+    status['time'] -= STALE_JOB_DELAY + 1
+    save_json(os.path.join(directory2, JOB_STATUS_FILENAME.format('')), status)
+    assert FarmJob(executor, directory2).status == FAILED
+
+
+def test_solver_group_kill_request():
+    directory = tempfile.mkdtemp()
+    request_kill(directory, '_solvers01')
+    assert is_kill_requested(directory, '_solvers01')
+    assert not is_kill_requested(directory, '_solvers00')
+    request_kill(directory, '_solvers00')
+    clean_job_status(directory, '_solvers00')
+    assert not is_kill_requested(directory, '_solvers00')
+    assert is_kill_requested(directory, '_solvers01')
+
+
+def age_job_status(directory, delay, suffix=''):
+    status = read_job_status(directory, suffix)
+    status['time'] -= delay
+    filename = os.path.join(directory, JOB_STATUS_FILENAME.format(suffix))
+    save_json(filename, status)
+
+
+def test_live_jobs():
+    # split solvers: the status files must not be read as descriptions
+    directory = tempfile.mkdtemp()
+    for suffix in ('_solvers00', '_solvers01'):
+        description = build_job_description(
+            directory, ['mayapy'], {}, suffix=suffix)
+        write_job_description(directory, description)
+        write_job_status(directory, RUNNING, suffix=suffix)
+    assert len(list_live_jobs(directory)) == 2
+    write_job_status(directory, FINISHED, suffix='_solvers00')
+    write_job_status(directory, FINISHED, suffix='_solvers01')
+    assert list_live_jobs(directory) == []
+
+    # the heartbeat of a running job stopped
+    directory = tempfile.mkdtemp()
+    description = build_job_description(directory, ['mayapy'], {})
+    write_job_description(directory, description)
+    assert len(list_live_jobs(directory)) == 1
+    write_job_status(directory, RUNNING)
+    age_job_status(directory, STALE_JOB_DELAY + 1)
+    assert list_live_jobs(directory) == []
+
+    # a job never started
+    clean_job_status(directory)
+    description['submission_time'] -= STALE_QUEUED_JOB_DELAY + 1
+    write_job_description(directory, description)
+    assert list_live_jobs(directory) == []
+
+
+def test_killed_local_job_status():
+    directory, script = create_stub_script()
+    executor = LocalExecutor()
+    output = os.path.join(directory, 'output')
+    job = executor.submit(
+        [sys.executable, script, output, '5'], os.environ,
+        directory=directory)
+    # the batch script is killed before to write his final status
+    write_job_status(directory, RUNNING)
+    job.kill()
+    wait_for([job])
+    assert read_job_status(directory)['status'] == KILLED
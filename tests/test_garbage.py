@@ -0,0 +1,64 @@
+import os
+import tempfile
+
+from ncachefactory.batch import TEMPFOLDER_NAME
+from ncachefactory.farm import (
+    build_job_description, write_job_description, write_job_status,
+    read_job_status, RUNNING, JOB_STATUS_FILENAME, STALE_JOB_DELAY)
+from ncachefactory.garbage import collect_garbage
+from ncachefactory.scenestore import get_store_directory
+from ncachefactory.versioning import create_cacheversion, save_json
+
+
+def create_file(*path):
+    filename = os.path.join(*path)
+    if not os.path.exists(os.path.dirname(filename)):
+        os.makedirs(os.path.dirname(filename))
+    with open(filename, 'wb') as f:
+        f.write(b'0' * 100)
+    # make the file older than the minimum age
+    os.utime(filename, (0, 0))
+    return filename
+
+
+def test_garbage_collection():
+    workspace = tempfile.mkdtemp()
+    queued = create_file(workspace, TEMPFOLDER_NAME, 'batch_scene_1.ma')
+    orphan = create_file(workspace, TEMPFOLDER_NAME, 'batch_scene_2.ma')
+    store = get_store_directory(workspace)
+    unused = create_file(store, 'abcd.mb')
+    used = create_file(store, 'efgh.mb')
+    cacheversion = create_cacheversion(workspace=workspace, nodes=['cloth'])
+    cacheversion.set_scene(used)
+    jpeg = create_file(cacheversion.directory, 'ncache_playblast.0001.jpg')
+
+    report = collect_garbage(workspace, dry_run=True, protected=[queued])
+    garbages = sorted(path for path, _, _ in report.garbages)
+    assert garbages == sorted([orphan, unused, jpeg])
+    assert report.reclaimed_size == 300
+    assert os.path.exists(orphan)
+
+    report = collect_garbage(workspace, dry_run=False, protected=[queued])
+    assert not report.errors
+    assert not any(os.path.exists(path) for path in (orphan, unused, jpeg))
+    assert os.path.exists(queued) and os.path.exists(used)
+
+
+def test_killed_job_playblast_collection():
+    workspace = tempfile.mkdtemp()
+    cacheversion = create_cacheversion(workspace=workspace, nodes=['cloth'])
+    directory = cacheversion.directory
+    jpeg = create_file(directory, 'ncache_playblast.0001.jpg')
+    description = build_job_description(directory, ['mayapy'], {})
+    write_job_description(directory, description)
+    write_job_status(directory, RUNNING)
+    # the jpegs of a running job are kept
+    report = collect_garbage(workspace, dry_run=True)
+    assert jpeg not in [path for path, _, _ in report.garbages]
+
+    # the job was killed, his heartbeat stopped
+    status = read_job_status(directory)
+    status['time'] -= STALE_JOB_DELAY + 1
+    save_json(os.path.join(directory, JOB_STATUS_FILENAME.format('')), status)
+    report = collect_garbage(workspace, dry_run=True)
+    assert jpeg in [path for path, _, _ in report.garbages]
@@ -0,0 +1,27 @@
+import pytest
+
+numpy = pytest.importorskip('numpy')
+from ncachefactory.imagecomparison import (  # noqa: E402
+    compare_arrays, DIFFERENCE, ONION_SKIN, HEATMAP, HEATMAP_LUT)
+
+
+def test_compare_arrays():
+    array1 = numpy.zeros((4, 6, 3), dtype=numpy.uint8)
+    array2 = array1.copy()
+    array2[1, 2] = 10, 20, 200
+
+    difference = compare_arrays(array1, array2, DIFFERENCE)
+    assert difference.shape == array1.shape
+    assert difference[1, 2].tolist() == [40, 80, 255]
+    assert not difference[0].any()
+
+    onion_skin = compare_arrays(array1, array2, ONION_SKIN)
+    # the second image is in cyan (blue and green), the first in red
+    assert onion_skin[1, 2, 2] == 0
+    assert onion_skin[1, 2, 0] == onion_skin[1, 2, 1] > 0
+    identical = compare_arrays(array2, array2, ONION_SKIN)
+    assert (identical[..., 0] == identical[..., 2]).all()
+
+    heatmap = compare_arrays(array1, array2, HEATMAP)
+    assert heatmap[1, 2].tolist() == HEATMAP_LUT[255].tolist()
+    assert heatmap[0, 0].tolist() == HEATMAP_LUT[0].tolist()
@@ -0,0 +1,23 @@
+import os
+import struct
+import tempfile
+
+from cachefixtures import write_fake_cache
+from ncachefactory.preview import render_preview, THUMBNAIL_SIZE
+
+
+def test_render_preview():
+    directory = tempfile.mkdtemp()
+    xml_file = write_fake_cache(directory, [
+        [0, -frame, 0, 1, -frame, 0, float('nan'), 0, 0]
+        for frame in range(1, 21)])
+
+    filename = os.path.join(directory, 'preview.png')
+    frames = render_preview([xml_file], filename, frames_count=4)
+    assert frames == [1, 7, 14, 20]
+    with open(filename, 'rb') as f:
+        data = f.read(24)
+    assert data[:8] == b'\x89PNG\r\n\x1a\n'
+    width, height = struct.unpack('>II', data[16:24])
+    assert width == THUMBNAIL_SIZE * 4 + 3
+    assert height == THUMBNAIL_SIZE
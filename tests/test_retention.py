@@ -0,0 +1,74 @@
+import os
+import tempfile
+
+from ncachefactory.farm import (
+    build_job_description, write_job_description, write_job_status,
+    FINISHED)
+from ncachefactory.versioning import create_cacheversion
+from ncachefactory.retention import (
+    RetentionPolicy, plan_eviction, get_cacheversion_disk_usage)
+
+
+def create_fake_cacheversion(workspace, nodes, size, creation_time):
+    cacheversion = create_cacheversion(
+        workspace=workspace, name=None, comment='', nodes=nodes,
+        start_frame=1, end_frame=10, timespent=0)
+    with open(os.path.join(cacheversion.directory, 'cloth.mcc'), 'wb') as f:
+        f.write(b'0' * size)
+    with open(os.path.join(cacheversion.directory, 'blast.jpg'), 'wb') as f:
+        f.write(b'0' * 10)
+    cacheversion.infos['creation_time'] = creation_time
+    cacheversion.infos['modification_time'] = creation_time
+    cacheversion.save_infos()
+    return cacheversion
+
+
+def test_retention_policies():
+    workspace = tempfile.mkdtemp()
+    cacheversions = [
+        create_fake_cacheversion(workspace, ['cloth1'], 1000, 1),
+        create_fake_cacheversion(workspace, ['cloth1'], 1000, 2),
+        create_fake_cacheversion(workspace, ['cloth1', 'cloth2'], 1000, 3),
+        create_fake_cacheversion(workspace, ['cloth2'], 1000, 4)]
+    disk_usage = get_cacheversion_disk_usage(cacheversions[0])
+    assert disk_usage['caches'] == 1000
+    assert disk_usage['jpegs'] == 10
+
+    cacheversions[0].set_starred(True)
+    report = plan_eviction(workspace, RetentionPolicy(keep_last=1))
+    evicted = [cv.directory for cv, _, _ in report.evicted]
+    assert evicted == [cacheversions[1].directory]
+
+    # the least recently connected version is evicted first.
+    cacheversions[1].set_last_connection_time()
+    workspace_size = plan_eviction(workspace, RetentionPolicy()).workspace_size
+    quota = workspace_size - 1500
+    report = plan_eviction(workspace, RetentionPolicy(False, False, quota))
+    evicted = [cv.directory for cv, _, _ in report.evicted]
+    assert evicted == [cacheversions[0].directory, cacheversions[2].directory]
+    assert report.quota_reached
+
+
+def test_eviction_skips_live_jobs_and_keeps_infos():
+    workspace = tempfile.mkdtemp()
+    cacheversions = [
+        create_fake_cacheversion(workspace, ['cloth1'], 1000, 1),
+        create_fake_cacheversion(workspace, ['cloth1'], 1000, 2)]
+    directory = cacheversions[0].directory
+    description = build_job_description(directory, ['mayapy'], {})
+    write_job_description(directory, description)
+    with open(cacheversions[0].infos_path, 'r') as f:
+        infos = f.read()
+
+    report = plan_eviction(workspace, RetentionPolicy(keep_last=1))
+    assert not report.evicted
+    reasons = {cv.directory: reason for cv, _, reason in report.kept}
+    assert reasons[directory] == 'job running'
+    # the dry run never writes the infos
+    with open(cacheversions[0].infos_path, 'r') as f:
+        assert f.read() == infos
+
+    write_job_status(directory, FINISHED)
+    report = plan_eviction(workspace, RetentionPolicy(keep_last=1))
+    evicted = [cv.directory for cv, _, _ in report.evicted]
+    assert evicted == [directory]
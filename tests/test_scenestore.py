@@ -0,0 +1,37 @@
+import os
+import tempfile
+
+from ncachefactory.scenestore import store_scene, BAKED_INPUTS_SUFFIX
+
+
+def create_scene(directory, name, content, inputs=None):
+    scene = os.path.join(directory, name + '.ma')
+    with open(scene, 'w') as f:
+        f.write(content)
+    if inputs is not None:
+        folder = os.path.join(directory, name + BAKED_INPUTS_SUFFIX)
+        os.makedirs(folder)
+        with open(os.path.join(folder, 'mesh.mc'), 'w') as f:
+            f.write(inputs)
+    return scene
+
+
+def test_store_scene_with_baked_inputs():
+    workspace = tempfile.mkdtemp()
+    directory = tempfile.mkdtemp()
+    stored1 = store_scene(
+        workspace, create_scene(directory, 'a', '//date\nscene', 'anim1'))
+    stored2 = store_scene(
+        workspace, create_scene(directory, 'b', '//other\nscene', 'anim1'))
+    assert stored1 == stored2
+    inputs = os.path.join(directory, 'b' + BAKED_INPUTS_SUFFIX)
+    assert not os.path.exists(inputs)
+    # the animation changed, the inputs mustn't be shared
+    stored3 = store_scene(
+        workspace, create_scene(directory, 'c', 'scene', 'anim2'))
+    assert stored3 != stored1
+    inputs = os.path.splitext(stored3)[0] + BAKED_INPUTS_SUFFIX
+    with open(os.path.join(inputs, 'mesh.mc')) as f:
+        assert f.read() == 'anim2'
+    stored4 = store_scene(workspace, create_scene(directory, 'd', 'scene'))
+    assert stored4 not in (stored1, stored3)
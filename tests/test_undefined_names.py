@@ -0,0 +1,33 @@
+import ast
+import os
+
+import pytest
+
+checker = pytest.importorskip('pyflakes.checker')
+from pyflakes import messages  # noqa: E402
+
+
+PACKAGE_DIRECTORY = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'ncachefactory')
+
+
+def list_undefined_names(filename):
+    with open(filename, 'r') as f:
+        tree = ast.parse(f.read(), filename)
+    results = checker.Checker(tree, filename=filename).messages
+    return [
+        str(message) for message in results
+        if isinstance(message, messages.UndefinedName)]
+
+
+def test_undefined_names():
+    ''' The modules can't be imported out of maya, pyflakes catches the
+    names lost during an import cleanup. '''
+    undefined_names = []
+    for root, _, filenames in os.walk(PACKAGE_DIRECTORY):
+        for filename in filenames:
+            if filename.endswith('.py'):
+                filename = os.path.join(root, filename)
+                undefined_names.extend(list_undefined_names(filename))
+    assert undefined_names == []
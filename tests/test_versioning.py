@@ -0,0 +1,27 @@
+import tempfile
+
+from ncachefactory.versioning import (
+    create_cacheversion, merge_partial_infos, CacheVersion)
+
+
+def test_merge_partial_infos():
+    workspace = tempfile.mkdtemp()
+    cacheversion = create_cacheversion(
+        workspace=workspace, name=None, comment='',
+        nodes=['cloth1', 'cloth2'], start_frame=1, end_frame=100,
+        timespent=0)
+    directory = cacheversion.directory
+    groups = ('_solvers00', 'cloth1', 100), ('_solvers01', 'cloth2', 60)
+    for suffix, node, checkpoint in groups:
+        partial = CacheVersion(directory, partial_suffix=suffix)
+        partial.infos['nodes'][node]['timespent'] = checkpoint
+        partial.set_checkpoint(checkpoint)
+        partial.set_storage_format('mcz')
+        merge_partial_infos(partial, [node])
+        assert partial.partial_infos_path is None
+
+    infos = CacheVersion(directory).infos
+    assert infos['checkpoint'] == 60
+    assert infos['storage'] == 'mcz'
+    assert infos['nodes']['cloth1']['timespent'] == 100
+    assert infos['nodes']['cloth2']['timespent'] == 60
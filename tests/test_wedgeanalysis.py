@@ -0,0 +1,60 @@
+import tempfile
+
+from cachefixtures import write_fake_cache
+from ncachefactory.versioning import create_cacheversion
+from ncachefactory.wedgeanalysis import analyse_wedge, list_representatives
+
+
+def create_wedge_cacheversion(workspace, drop, scale=1):
+    ''' Create a version containing a grid of 4x4 vertices falling of drop
+    by frame and scaled by scale at the last frame. '''
+    cacheversion = create_cacheversion(
+        workspace=workspace, name=None, comment='', nodes=['clothShape'],
+        start_frame=1, end_frame=10, timespent=0)
+    frames_positions = []
+    for frame in range(1, 11):
+        factor = scale if frame == 10 else 1
+        positions = []
+        for i in range(16):
+            positions.extend((i % 4 * factor, -drop * frame, i // 4 * factor))
+        frames_positions.append(positions)
+    write_fake_cache(cacheversion.directory, frames_positions)
+    return cacheversion
+
+
+def test_analyse_wedge():
+    workspace = tempfile.mkdtemp()
+    cacheversions = [
+        create_wedge_cacheversion(workspace, drop=0.1),
+        create_wedge_cacheversion(workspace, drop=0.1),
+        create_wedge_cacheversion(workspace, drop=0.11),
+        create_wedge_cacheversion(workspace, drop=2),
+        create_wedge_cacheversion(workspace, drop=2.1),
+        create_wedge_cacheversion(workspace, drop=0.1, scale=100)]
+    analyses = analyse_wedge(cacheversions, clusters_count=2)
+    names = [cv.name for cv in cacheversions]
+    assert analyses[names[5]]['flags'] == ['exploded']
+    assert analyses[names[5]]['cluster'] is None
+    assert analyses[names[1]]['flags'] == ['duplicate of ' + names[0]]
+    clusters = [analyses[name]['cluster'] for name in names[:5]]
+    assert clusters[0] == clusters[1] == clusters[2] != clusters[3]
+    assert clusters[3] == clusters[4]
+    assert len(list_representatives(analyses)) == 2
+    assert cacheversions[0].infos['wedge_analysis']['cluster_size'] == 3
+
+
+def test_analyse_wedge_with_empty_cache():
+    workspace = tempfile.mkdtemp()
+    cacheversions = [
+        create_wedge_cacheversion(workspace, drop=0.1),
+        create_wedge_cacheversion(workspace, drop=0.2)]
+    # a job killed before his first frame leaves the xml only
+    cacheversion = create_cacheversion(
+        workspace=workspace, name=None, comment='', nodes=['clothShape'],
+        start_frame=1, end_frame=10, timespent=0)
+    write_fake_cache(cacheversion.directory, [])
+    cacheversions.append(cacheversion)
+    analyses = analyse_wedge(cacheversions)
+    assert analyses[cacheversion.name]['flags'] == ['empty']
+    assert analyses[cacheversion.name]['cluster'] is None
+    assert len(list_representatives(analyses)) == 1